@@ -3,9 +3,15 @@ Takes in the api.yaml file from swagger and generates a new one that
 has only the required properties in it for validation.
 Also generates a state_changes.yaml which defines which properties 
 are allowed in Scenes/State
+
+The first line of each generated file is a stamp: a hash of the swagger file and of this
+generator. update() compares the stamps with the current swagger file and only regenerates
+when they differ, so updating when nothing changed doesn't even parse the swagger file.
+Both files are written to temporary files first and then moved into place, so a failed or
+interrupted update never leaves a truncated api file behind.
 '''
 
-import yaml, copy
+import yaml, copy, hashlib, os
 from decouple import config
 from logger import Logger, LogLevel
 
@@ -13,43 +19,109 @@ SWAGGER_YAML = config('SWAGGER_YAML')
 NEW_API = config('API_YAML')
 STATE_CHANGES = config('STATE_YAML')
 
+# bump when the generated files change shape without this file changing
+GENERATOR_VERSION = 1
+
 class ApiGenerator:
     logger = Logger("apiGenerator")
-    api_file = None
     api_yaml = None
-    new_api_file = None
-    new_state_file = None
+    stamp = None
+    _updated_api = None
 
     def __init__(self):
         '''
-        Load in the files
+        Stamps the current swagger file. It is only loaded once the api files need generating.
         '''
-        self.new_api_file = open(NEW_API, 'w')
-        self.new_state_file = open(STATE_CHANGES, 'w')
         try:
-            self.api_file = open(SWAGGER_YAML)
-            self.api_yaml = yaml.load(self.api_file, Loader=yaml.CLoader)
+            self.stamp = self.get_stamp()
         except Exception as e:
             self.logger.log(LogLevel.FATAL, "Error while loading in api yaml. Please check the .env to make sure the location is correct and try again.\n\n" + str(e) + "\n")
 
-    def __del__(self):
+
+    def get_stamp(self):
+        '''
+        Returns the line the generated files start with: a hash of the generator version, this
+        file and the swagger file
+        '''
+        h = hashlib.sha256(str(GENERATOR_VERSION).encode('utf-8'))
+        for path in [__file__, SWAGGER_YAML]:
+            with open(path, 'rb') as f:
+                h.update(f.read())
+            h.update(b'\0')
+        return "# generated from " + SWAGGER_YAML + " by api_files/generator.py, stamp " + h.hexdigest() + "\n"
+
+
+    def is_up_to_date(self):
         '''
-        Basic cleanup: closing the file loaded in on close.
+        Whether both generated files exist and were generated from the current swagger file
+        by this version of the generator
         '''
-        self.logger.log(LogLevel.DEBUG, "Program closing...")
-        if (self.new_api_file):
-            self.new_api_file.close()
-        if (self.api_file):
-            self.api_file.close()
-        if (self.new_state_file):
-            self.new_state_file.close()
+        for path in [NEW_API, STATE_CHANGES]:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    if f.readline() != self.stamp:
+                        return False
+            except OSError:
+                return False
+        return True
+
+
+    def update(self):
+        '''
+        Regenerates both api files unless they are already up to date. Returns whether they were.
+        '''
+        if self.is_up_to_date():
+            self.logger.log(LogLevel.CRITICAL_INFO, "The api files are up to date with " + SWAGGER_YAML + ". Nothing to do.")
+            return False
+        self.generate_new_api()
+        self.generate_state_change_api()
+        return True
+
+
+    def load_api(self):
+        '''
+        Loads the swagger file the first time it is needed
+        '''
+        if self.api_yaml is None:
+            try:
+                with open(SWAGGER_YAML, encoding='utf-8') as api_file:
+                    self.api_yaml = yaml.load(api_file, Loader=yaml.CLoader)
+            except Exception as e:
+                self.logger.log(LogLevel.FATAL, "Error while loading in api yaml. Please check the .env to make sure the location is correct and try again.\n\n" + str(e) + "\n")
+        return self.api_yaml
+
+
+    def write_atomically(self, path, data):
+        '''
+        Writes the stamp and data (as yaml) to a temporary file, then replaces path with it in one step
+        '''
+        tmp_file = path + '.' + str(os.getpid())
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(self.stamp)
+                yaml.dump(data, f, allow_unicode=True)
+            os.replace(tmp_file, path)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+
+    def updated_api(self):
+        '''
+        The swagger api as updated for validation (see update_general_api), computed once
+        and shared by both generated files
+        '''
+        if self._updated_api is None:
+            self._updated_api = self.update_general_api()
+        return self._updated_api
+
     
     def update_general_api(self):
         '''
         Updates properties in the api.yaml file that don't match with
         what we expect during TA1's validation.
         '''
-        new_api = copy.deepcopy(self.api_yaml)
+        new_api = copy.deepcopy(self.load_api())
         # validator requires Scenario/Scenes
         required_scenario = new_api['components']['schemas']['Scenario']['required']
         required_scenario.append('scenes')
@@ -107,9 +179,9 @@ class ApiGenerator:
         Takes the current api.yaml and updates the properties whose required attributes 
         do not match between the validator and the api. Keeps the original api intact.
         '''
-        new_api = self.update_general_api()
+        new_api = self.updated_api()
         # put the updated data into the yaml file
-        yaml.dump(new_api, self.new_api_file, allow_unicode=True)
+        self.write_atomically(NEW_API, new_api)
         self.logger.log(LogLevel.INFO, "Updated validator yaml. Find it at " + NEW_API)
 
 
@@ -118,12 +190,14 @@ class ApiGenerator:
         Takes the current api.yaml and pulls out only the state properties.
         Changes the requirements to match what is expected for state changes.
         '''
-        updated_api = self.update_general_api()
+        updated_api = self.updated_api()
         new_api = {'components': {'schemas': {}}}
         state_type = updated_api['components']['schemas']['State']
         new_api['components']['schemas']['State'] = state_type
         # go through everything required in state and grab it to put in the new api
         new_api['components']['schemas'].update(self.get_required_schemas(state_type, updated_api))
+        # the requirements are changed below; copy only the state schemas, so the shared updated api stays intact
+        new_api = copy.deepcopy(new_api)
 
         # update the api to not require everything
         # state should only require characters; at least one unstructured will be required manually
@@ -145,7 +219,7 @@ class ApiGenerator:
         new_api['components']['schemas']['Aid']['required'] = ['id']
 
         # put the updated data into the yaml file
-        yaml.dump(new_api, self.new_state_file, allow_unicode=True)
+        self.write_atomically(STATE_CHANGES, new_api)
         
         self.logger.log(LogLevel.CRITICAL_INFO, "Updated state change yaml. Find it at " + STATE_CHANGES)
 
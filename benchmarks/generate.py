@@ -0,0 +1,154 @@
+'''
+Generates synthetic scenarios that are valid, in whatever size and shape is needed to
+measure the validator.
+
+A scenario is a chain of scenes, each leading to the next. Its shape is set by:
+    scenes               number of scenes
+    branching            number of later scenes each scene can lead to (1 is a straight line)
+    cycles               number of scenes that can also lead back to an earlier scene
+    characters           characters in each scene
+    persist_density      share of scenes (0 to 1) that keep the characters of the scene before them
+                         instead of listing their own
+    actions              action mappings in each scene
+    seed                 seed of the random choices, so the same parameters give the same scenario
+
+Usage (from the repository root):
+    python -m benchmarks.generate --scenes 40 --branching 2 -o scenario.yaml
+'''
+
+import argparse, random, sys
+import yaml
+
+AVPU = ['ALERT', 'VOICE', 'PAIN', 'UNRESPONSIVE']
+MENTAL_STATUS = ['AGONY', 'CALM', 'CONFUSED', 'SHOCK', 'UPSET', 'UNRESPONSIVE']
+BREATHING = ['NORMAL', 'FAST', 'RESTRICTED']
+HEART_RATE = ['FAINT', 'NORMAL', 'FAST']
+INJURIES = [('Laceration', 'left forearm'), ('Puncture', 'right thigh'), ('Abrasion', 'left calf'), ('Broken Bone', 'right leg')]
+SUPPLIES = [('Hemostatic gauze', 5), ('Tourniquet', 4), ('Pressure bandage', 10), ('Splint', 2)]
+CHARACTER_ACTIONS = ['CHECK_ALL_VITALS', 'CHECK_PULSE', 'CHECK_RESPIRATION', 'SITREP']
+
+
+def scene_id(index):
+    return 'scene_' + str(index)
+
+
+def character_id(scene, index):
+    # characters a scene lists itself are new, so ids never clash with persisted ones
+    return 'casualty_' + str(scene) + '_' + str(index)
+
+
+def make_character(rng, scene, index):
+    injury, location = rng.choice(INJURIES)
+    return {
+        'id': character_id(scene, index),
+        'name': 'Casualty ' + str(scene) + '-' + str(index),
+        'unstructured': 'A synthetic casualty.',
+        'demographics': {
+            'age': rng.randint(18, 60),
+            'sex': rng.choice(['M', 'F']),
+            'race': rng.choice(['White', 'Black', 'Asian', 'Hispanic']),
+            'military_disposition': 'Civilian'
+        },
+        'vitals': {
+            'avpu': rng.choice(AVPU),
+            'ambulatory': rng.choice([True, False]),
+            'mental_status': rng.choice(MENTAL_STATUS),
+            'breathing': rng.choice(BREATHING),
+            'heart_rate': rng.choice(HEART_RATE),
+            'spo2': 'NORMAL'
+        },
+        'injuries': [{'name': injury, 'location': location, 'status': 'visible', 'severity': 'moderate'}]
+    }
+
+
+def generate(scenes=10, branching=1, cycles=0, characters=3, persist_density=0.5, actions=4, seed=0):
+    '''
+    Returns a synthetic scenario (a dict) with the given shape
+    '''
+    rng = random.Random(seed)
+    scenes = max(scenes, 1)
+    # the scenes that lead back to an earlier scene, and where to
+    back_edges = {}
+    for index in rng.sample(range(1, scenes), min(cycles, scenes - 1)):
+        back_edges[index] = rng.randrange(0, index)
+
+    first_characters = [make_character(rng, 0, i) for i in range(characters)]
+    scenario = {
+        'id': 'synthetic-' + str(seed),
+        'name': 'Synthetic scenario',
+        'first_scene': scene_id(0),
+        'state': {
+            'unstructured': 'A synthetic scenario generated to benchmark the validator.',
+            'environment': {'sim_environment': {'type': 'desert'}},
+            'supplies': [{'type': supply, 'quantity': quantity} for supply, quantity in SUPPLIES],
+            'characters': first_characters
+        },
+        'scenes': []
+    }
+    present = [c['id'] for c in first_characters]
+    for index in range(scenes):
+        scene = {'id': scene_id(index), 'end_scene_allowed': index == scenes - 1}
+        if index > 0:
+            scene['state'] = {'unstructured': 'Scene ' + str(index) + ' of the synthetic scenario.'}
+            if rng.random() < persist_density:
+                scene['persist_characters'] = True
+            else:
+                listed = [make_character(rng, index, i) for i in range(characters)]
+                scene['state']['characters'] = listed
+                present = [c['id'] for c in listed]
+        # every later scene this one can lead to, the default one first
+        targets = [scene_id(t) for t in range(index + 1, min(index + 1 + branching, scenes))]
+        if index in back_edges:
+            targets.append(scene_id(back_edges[index]))
+        if index < scenes - 1:
+            scene['next_scene'] = targets[0]
+        probe = 'probe-' + str(index)
+        scene['probe_config'] = [{'probe_id': probe, 'description': 'Probe of scene ' + str(index)}]
+        mappings = []
+        for a in range(max(actions, len(targets))):
+            mapping = {
+                'action_id': 'action-' + str(index) + '-' + str(a),
+                'action_type': rng.choice(CHARACTER_ACTIONS),
+                'unstructured': 'Synthetic action ' + str(a) + ' of scene ' + str(index),
+                'character_id': present[a % len(present)] if present else None,
+                'probe_id': probe,
+                'choice': probe + '-choice' + str(a)
+            }
+            if mapping['character_id'] is None:
+                mapping['action_type'] = 'SITREP'
+                del mapping['character_id']
+            # the first actions branch off to the other scenes this one leads to
+            if 0 < a < len(targets):
+                mapping['next_scene'] = targets[a]
+            mappings.append(mapping)
+        scene['action_mapping'] = mappings
+        scene['transitions'] = {'probes': [probe]}
+        scenario['scenes'].append(scene)
+    return scenario
+
+
+def generate_yaml(**params):
+    '''
+    Returns a synthetic scenario with the given shape as yaml text
+    '''
+    return yaml.dump(generate(**params), Dumper=yaml.CSafeDumper, sort_keys=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='ITM - Synthetic Scenario Generator')
+    parser.add_argument('--scenes', type=int, default=10, help="Number of scenes. Defaults to 10.")
+    parser.add_argument('--branching', type=int, default=1, help="Number of later scenes each scene can lead to. Defaults to 1 (no branching).")
+    parser.add_argument('--cycles', type=int, default=0, help="Number of scenes that can also lead back to an earlier scene. Defaults to 0.")
+    parser.add_argument('--characters', type=int, default=3, help="Characters in each scene. Defaults to 3.")
+    parser.add_argument('--persist-density', dest='persist_density', type=float, default=0.5, help="Share of scenes that keep the characters of the scene before them. Defaults to 0.5.")
+    parser.add_argument('--actions', type=int, default=4, help="Action mappings in each scene. Defaults to 4.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the random choices. Defaults to 0.")
+    parser.add_argument('-o', '--output', dest='output', type=str, default=None, help="The file to write the scenario to. Defaults to printing it.")
+    args = parser.parse_args()
+    text = generate_yaml(scenes=args.scenes, branching=args.branching, cycles=args.cycles, characters=args.characters,
+                         persist_density=args.persist_density, actions=args.actions, seed=args.seed)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as out:
+            out.write(text)
+    else:
+        sys.stdout.write(text)
@@ -0,0 +1,236 @@
+'''
+Times each stage of validating a set of benchmark scenarios and records how much memory each
+stage needs, so that changes which make the validator slower (in particular on branching
+and cyclic scenarios, where the number of walks through the scenes grows exponentially) are
+caught before they ship.
+
+The stages, in the order the validator runs them:
+    parse                   parsing the yaml text
+    setup                   freezing the scenario and indexing its scenes (YamlValidator())
+    validate_field_names    checking the scenario against the api schema
+    prefetch                finding the matches of every dependency rule path
+    scene_analysis          building the scene graph (its strongly connected components) and
+                            propagating the characters, supplies and aid ids that can be in
+                            each scene through it
+    <check>                 each check run by validate_dependencies
+
+The validator computes the scene analyses on first use, inside whichever check needs them
+first. Here they are computed for every scene beforehand, as for concurrent checks, so their
+cost is a stage of its own and the checks only read them. setup builds a scene graph as well;
+scene_analysis builds the one the checks then use.
+
+Each case is validated --repeat times and the fastest time of each stage is kept (the median
+is recorded too). Memory is measured in one more run under tracemalloc, since tracing slows
+everything down: the peak of each stage is how far memory rose above what was allocated when
+the stage started.
+
+Usage (from the repository root):
+    python -m benchmarks.run -o results.json
+    python -m benchmarks.run --baseline results.json
+'''
+
+import argparse, gc, json, os, platform, statistics, sys, time, tracemalloc
+from benchmarks.generate import generate_yaml
+from validator import YamlValidator, ValidationError, load_scenario
+from diagnostics import CollectingSink, ERROR_CATEGORIES
+from logger import LogLevel, Logger
+from profiler import stages
+from scene_graph import SceneGraph
+from scene_state import SceneStateAnalysis
+from scheduler import prepare
+
+logger = Logger("benchmark")
+
+# the scenarios measured: a file, or the parameters of a synthetic scenario (see benchmarks.generate)
+CASES = {
+    'sample': {'file': 'sample.yaml'},
+    'linear': {'scenes': 60},
+    'wide': {'scenes': 15, 'characters': 25, 'actions': 40},
+    'persistent': {'scenes': 60, 'persist_density': 0.9},
+    'branching': {'scenes': 20, 'branching': 2},
+    'cyclic': {'scenes': 14, 'branching': 2, 'cycles': 3}
+}
+
+# a stage is only reported as slower or larger when it changed by more than these as well as by the threshold
+MIN_SECONDS = 0.001
+MIN_BYTES = 64 * 1024
+
+
+def scenario_text(case):
+    if 'file' in case:
+        with open(case['file'], encoding='utf-8') as f:
+            return f.read()
+    return generate_yaml(**case)
+
+
+def analyse_scenes(validator):
+    '''
+    Builds the scene graph of the validator's scenario and computes, for every scene, the
+    analyses its dependency checks share
+    '''
+    validator.scene_graph = SceneGraph(validator.loaded_yaml)
+    validator.scene_states = SceneStateAnalysis(validator.loaded_yaml, validator.scene_graph)
+    prepare(validator, validator.dependency_checks)
+
+
+def run_stages(name, text, measure):
+    '''
+    Validates a scenario once, stage by stage. measure(stage, function) runs a stage and
+    records it. Returns the validator.
+    '''
+    data = measure('parse', lambda: load_scenario(text))
+    validator = measure('setup', lambda: YamlValidator(name, sink=CollectingSink(), document=data))
+    run = stages(validator)
+    # the scene analyses come right before the dependency checks
+    run.insert(len(run) - len(validator.dependency_checks), ('scene_analysis', lambda: analyse_scenes(validator)))
+    for stage, function in run:
+        measure(stage, function)
+    return validator
+
+
+def time_run(name, text):
+    '''
+    Returns the seconds each stage took in one run, and the validator
+    '''
+    seconds = {}
+    def measure(stage, function):
+        start = time.perf_counter()
+        result = function()
+        seconds[stage] = time.perf_counter() - start
+        return result
+    gc.collect()
+    validator = run_stages(name, text, measure)
+    return seconds, validator
+
+
+def memory_run(name, text):
+    '''
+    Returns the peak memory (in bytes) each stage allocated above what it started with, and
+    the peak of the whole run
+    '''
+    peaks = {}
+    total = [0]
+    def measure(stage, function):
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        result = function()
+        peak = tracemalloc.get_traced_memory()[1]
+        peaks[stage] = max(peak - start, 0)
+        total[0] = max(total[0], peak)
+        return result
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run_stages(name, text, measure)
+    finally:
+        tracemalloc.stop()
+    return peaks, total[0]
+
+
+def benchmark(name, case, repeat=5):
+    '''
+    Measures one case. Returns its results as a dict.
+    '''
+    text = scenario_text(case)
+    runs = []
+    for _ in range(repeat):
+        seconds, validator = time_run(name, text)
+        runs.append(seconds)
+    peaks, total_peak = memory_run(name, text)
+    counts = validator.counts()
+    stages = {}
+    for stage in runs[0]:
+        times = [run[stage] for run in runs]
+        stages[stage] = {'seconds': min(times), 'median_seconds': statistics.median(times), 'peak_bytes': peaks[stage]}
+    return {
+        'case': case,
+        'scenes': len(validator.loaded_yaml.get('scenes', [])),
+        'total_errors': sum(counts[c] for c in ERROR_CATEGORIES),
+        'total_seconds': sum(stage['seconds'] for stage in stages.values()),
+        'peak_bytes': total_peak,
+        'stages': stages
+    }
+
+
+def compare(results, baseline, threshold=0.25):
+    '''
+    Returns the stages of results that are slower or need more memory than in baseline by more
+    than threshold (a fraction), as (case, stage, measure, baseline value, current value) tuples
+    '''
+    regressions = []
+    for name, case in results['cases'].items():
+        old_case = baseline.get('cases', {}).get(name)
+        if old_case is None or old_case.get('case') != case['case']:
+            # a new or changed case has nothing to be compared with
+            continue
+        for stage, values in case['stages'].items():
+            old = old_case['stages'].get(stage)
+            if old is None:
+                continue
+            if values['seconds'] > old['seconds'] * (1 + threshold) and values['seconds'] - old['seconds'] > MIN_SECONDS:
+                regressions.append((name, stage, 'seconds', old['seconds'], values['seconds']))
+            if values['peak_bytes'] > old['peak_bytes'] * (1 + threshold) and values['peak_bytes'] - old['peak_bytes'] > MIN_BYTES:
+                regressions.append((name, stage, 'peak_bytes', old['peak_bytes'], values['peak_bytes']))
+    return regressions
+
+
+def change(old, new):
+    return ('+' if new >= old else '') + format((new - old) / old * 100, '.0f') + '%' if old else 'new'
+
+
+def print_case(name, result, old_case=None):
+    print("\033[1m" + name + "\033[0m (" + str(result['scenes']) + " scenes, " + str(result['total_errors']) + " errors)")
+    header = "  {:<36} {:>12} {:>12}".format('stage', 'ms', 'peak KiB')
+    if old_case is not None:
+        header += " {:>12} {:>12}".format('ms change', 'KiB change')
+    print(header)
+    for stage, values in sorted(result['stages'].items(), key=lambda item: -item[1]['seconds']):
+        line = "  {:<36} {:>12.3f} {:>12.1f}".format(stage, values['seconds'] * 1000, values['peak_bytes'] / 1024)
+        old = old_case['stages'].get(stage) if old_case is not None else None
+        if old is not None:
+            line += " {:>12} {:>12}".format(change(old['seconds'], values['seconds']), change(old['peak_bytes'], values['peak_bytes']))
+        print(line)
+    print("  {:<36} {:>12.3f} {:>12.1f}".format('total', result['total_seconds'] * 1000, result['peak_bytes'] / 1024))
+    print("")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='ITM - Validator Benchmarks')
+    parser.add_argument('-c', '--case', dest='cases', type=str, nargs='+', choices=list(CASES), default=list(CASES), help="The cases to measure. Defaults to all of them.")
+    parser.add_argument('-r', '--repeat', dest='repeat', type=int, default=5, help="How many times each case is timed; the fastest time of each stage is kept. Defaults to 5.")
+    parser.add_argument('-o', '--output', dest='output', type=str, default=None, help="The file to save the results to, as JSON.")
+    parser.add_argument('-b', '--baseline', dest='baseline', type=str, default=None, help="Results saved earlier to compare with. Exits with 1 if any stage got slower or needs more memory.")
+    parser.add_argument('--threshold', dest='threshold', type=float, default=0.25, help="How much slower or larger (as a fraction) a stage may get before it counts as a regression. Defaults to 0.25.")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.log(LogLevel.FATAL, "Could not load the baseline '" + args.baseline + "': " + str(e))
+    try:
+        YamlValidator.load_api_files()
+    except ValidationError as e:
+        logger.log(LogLevel.FATAL, str(e))
+
+    results = {'python': platform.python_version(), 'platform': platform.platform(), 'repeat': args.repeat, 'cases': {}}
+    for name in args.cases:
+        results['cases'][name] = benchmark(name, CASES[name], args.repeat)
+        old_case = baseline['cases'].get(name) if baseline is not None else None
+        print_case(name, results['cases'][name], old_case if old_case is not None and old_case.get('case') == CASES[name] else None)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        logger.log(LogLevel.CRITICAL_INFO, "Results saved to " + os.path.abspath(args.output))
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for name, stage, measure, old, new in regressions:
+            unit = (lambda v: format(v * 1000, '.3f') + " ms") if measure == 'seconds' else (lambda v: format(v / 1024, '.1f') + " KiB")
+            logger.log(LogLevel.ERROR, name + ": " + stage + " went from " + unit(old) + " to " + unit(new) + " (" + change(old, new) + ")")
+        if regressions:
+            logger.log(LogLevel.CRITICAL_INFO, "\033[91m" + str(len(regressions)) + " regressions compared to " + args.baseline + ".")
+            sys.exit(1)
+        logger.log(LogLevel.CRITICAL_INFO, "\033[92mNo regressions compared to " + args.baseline + ".")
@@ -0,0 +1,272 @@
+'''
+Findings of the validator as structured records, and the sinks that output them.
+
+Every finding is reported once as a Diagnostic: which rule produced it, how severe it is,
+which summary counter it counts towards, the scene and concrete path it is about (when
+known) and the arguments of its message. The message text itself is only rendered when a
+sink needs it, so a broken file with thousands of findings does not pay to format every
+list of allowed values that nobody reads. Likewise, the line and column a finding is about
+are only looked up (in the file's SourceIndex) when a sink prints them.
+
+Sinks:
+    ConsoleSink       the colored text the validator has always printed
+    NdjsonSink        one JSON object per line, written as soon as each finding is reported
+    JsonSummarySink   one JSON document per file, written once the file is validated
+    CollectingSink    keeps them in memory (used by watch mode to diff runs)
+'''
+
+import json
+from logger import LogLevel
+
+# summary counters findings count towards, in the order they are reported
+MISSING_KEYS = 'missing_keys'
+WRONG_TYPES = 'wrong_types'
+INVALID_KEYS = 'invalid_keys'
+INVALID_VALUES = 'invalid_values'
+OUT_OF_RANGE = 'out_of_range'
+EMPTY_LEVELS = 'empty_levels'
+WARNINGS = 'warnings'
+
+ERROR_CATEGORIES = [MISSING_KEYS, WRONG_TYPES, INVALID_KEYS, INVALID_VALUES, OUT_OF_RANGE, EMPTY_LEVELS]
+
+
+class Diagnostic:
+    '''
+    One finding. template is a str.format template rendered with args on first use.
+    source is the SourceIndex of the file, if it is known, to find the finding's position in.
+    '''
+    rule = None
+    severity = None
+    category = None
+    scene = None
+    path = None
+    file = None
+    template = None
+    args = None
+    source = None
+    _message = None
+    _position = None
+    _located = False
+
+    def __init__(self, rule, severity, category, template, args, scene=None, path=None, file=None, source=None):
+        self.rule = rule
+        self.severity = severity
+        self.category = category
+        self.template = template
+        self.args = args
+        self.scene = scene
+        self.path = path
+        self.file = file
+        self.source = source
+
+    @property
+    def message(self):
+        if self._message is None:
+            self._message = self.template.format(**self.args)
+        return self._message
+
+    @property
+    def position(self):
+        '''
+        The (line, column) in the file that the finding is about, both counted from 1, or None
+        '''
+        if not self._located:
+            self._position = self.source.position(self.path, self.scene) if self.source is not None else None
+            self._located = True
+            # the position is all that is needed from the parsed file
+            self.source = None
+        return self._position
+
+    def where(self):
+        '''
+        Returns file:line:column for the finding, or None if its position is not known
+        '''
+        position = self.position
+        if position is None:
+            return None
+        return str(self.file) + ':' + str(position[0]) + ':' + str(position[1])
+
+    def __getstate__(self):
+        # a finding sent to another process doesn't take the parsed file with it
+        state = dict(self.__dict__)
+        state.pop('source', None)
+        return state
+
+    def to_dict(self):
+        return {
+            'type': 'diagnostic',
+            'file': self.file,
+            'rule': self.rule,
+            'severity': 'warning' if self.severity == LogLevel.WARN else self.severity.name.lower(),
+            'category': self.category,
+            'scene': self.scene,
+            'path': self.path,
+            'line': self.position[0] if self.position is not None else None,
+            'column': self.position[1] if self.position is not None else None,
+            'message': self.message,
+            'args': self.args
+        }
+
+
+def summary_dict(file, counts, fatal=False, stopped=False):
+    '''
+    The totals of a validated file, as written by the machine-readable sinks.
+    A file whose validation stopped on a fatal error is never valid. stopped is set
+    when validation stopped at the error limit, so the file may have more errors.
+    '''
+    total_errors = sum(counts[c] for c in ERROR_CATEGORIES)
+    return {
+        'type': 'summary',
+        'file': file,
+        'valid': total_errors == 0 and not fatal,
+        'fatal': fatal,
+        'stopped': stopped,
+        'total_errors': total_errors,
+        'warnings': counts[WARNINGS],
+        'counts': {c: counts[c] for c in ERROR_CATEGORIES}
+    }
+
+
+class ValidationResult:
+    '''
+    The outcome of validating a scenario: the number of findings in each category and the findings themselves.
+    stopped is set if validation stopped at the error limit, so the scenario may have more findings.
+    '''
+    counts = None
+    diagnostics = None
+    stopped = False
+
+    def __init__(self, counts, diagnostics, stopped=False):
+        self.counts = counts
+        self.diagnostics = diagnostics
+        self.stopped = stopped
+
+    @property
+    def total_errors(self):
+        return sum(self.counts[c] for c in ERROR_CATEGORIES)
+
+    @property
+    def warnings(self):
+        return self.counts[WARNINGS]
+
+    @property
+    def valid(self):
+        return self.total_errors == 0
+
+    def errors(self):
+        '''
+        Returns the findings that make the scenario invalid
+        '''
+        return [d for d in self.diagnostics if d.category in ERROR_CATEGORIES]
+
+    def to_dict(self):
+        return {
+            'valid': self.valid,
+            'stopped': self.stopped,
+            'total_errors': self.total_errors,
+            'warnings': self.warnings,
+            'counts': {c: self.counts[c] for c in ERROR_CATEGORIES},
+            'diagnostics': [d.to_dict() for d in self.diagnostics]
+        }
+
+
+def _to_json(obj):
+    # args may hold types and other values json cannot write; use their text
+    return json.dumps(obj, default=str)
+
+
+class ConsoleSink:
+    '''
+    Prints findings and the summary as colored text through a Logger
+    '''
+    logger = None
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    def emit(self, diagnostic):
+        # skip rendering messages the log level hides
+        if self.logger.enabled(diagnostic.severity):
+            where = diagnostic.where()
+            self.logger.log(diagnostic.severity, diagnostic.message + (" (" + where + ")" if where is not None else ""))
+
+    def summary(self, file, counts, fatal=False, stopped=False):
+        logger = self.logger
+        print("")
+        logger.log(LogLevel.CRITICAL_INFO, ("\033[92m" if counts[MISSING_KEYS] == 0 else "\033[91m") + "Missing Required Keys: " + str(counts[MISSING_KEYS]))
+        logger.log(LogLevel.CRITICAL_INFO, ("\033[92m" if counts[WRONG_TYPES] == 0 else "\033[91m") + "Incorrect Data Type: " + str(counts[WRONG_TYPES]))
+        logger.log(LogLevel.CRITICAL_INFO, ("\033[92m" if counts[INVALID_KEYS] == 0 else "\033[91m") + "Invalid Keys: " + str(counts[INVALID_KEYS]))
+        logger.log(LogLevel.CRITICAL_INFO, ("\033[92m" if counts[INVALID_VALUES] == 0 else "\033[91m") + "Invalid Values (mismatched enum or dependency): " + str(counts[INVALID_VALUES]))
+        logger.log(LogLevel.CRITICAL_INFO, ("\033[92m" if counts[OUT_OF_RANGE] == 0 else "\033[91m") + "Invalid Values (out of range): " + str(counts[OUT_OF_RANGE]))
+        logger.log(LogLevel.CRITICAL_INFO, ("\033[92m" if counts[EMPTY_LEVELS] == 0 else "\033[91m") + "Properties Missing Data (empty level): " + str(counts[EMPTY_LEVELS]))
+        total_errors = sum(counts[c] for c in ERROR_CATEGORIES)
+        print()
+        logger.log(LogLevel.CRITICAL_INFO, ("\033[92m" if total_errors == 0 else "\033[91m") + "Total Errors: " + str(total_errors))
+        logger.log(LogLevel.CRITICAL_INFO, ("\033[92m" if counts[WARNINGS] == 0 else "\033[35m") + "Warnings: " + str(counts[WARNINGS]))
+        if stopped:
+            logger.log(LogLevel.CRITICAL_INFO, "\033[91mStopped after the first " + ("error" if total_errors == 1 else str(total_errors) + " errors") + "; there may be more.")
+        if total_errors == 0:
+            logger.log(LogLevel.CRITICAL_INFO, "\033[92m" + file + " is valid!")
+        else:
+            logger.log(LogLevel.CRITICAL_INFO, "\033[91m" + file + " is not valid.")
+
+
+class NdjsonSink:
+    '''
+    Streams each finding as a line of JSON as soon as it is reported, then a summary line
+    '''
+    stream = None
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def emit(self, diagnostic):
+        self.stream.write(_to_json(diagnostic.to_dict()) + '\n')
+        self.stream.flush()
+
+    def summary(self, file, counts, fatal=False, stopped=False):
+        self.stream.write(_to_json(summary_dict(file, counts, fatal, stopped)) + '\n')
+        self.stream.flush()
+
+
+class JsonSummarySink:
+    '''
+    Collects the findings of a file and writes them with its summary as one JSON document (on one line)
+    '''
+    stream = None
+    diagnostics = None
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.diagnostics = []
+
+    def emit(self, diagnostic):
+        self.diagnostics.append(diagnostic)
+
+    def summary(self, file, counts, fatal=False, stopped=False):
+        document = summary_dict(file, counts, fatal, stopped)
+        document['diagnostics'] = [d.to_dict() for d in self.diagnostics]
+        self.stream.write(_to_json(document) + '\n')
+        self.stream.flush()
+        self.diagnostics = []
+
+
+class CollectingSink:
+    '''
+    Keeps the findings and summary of a file in memory instead of writing them
+    '''
+    diagnostics = None
+    counts = None
+    fatal = False
+    stopped = False
+
+    def __init__(self):
+        self.diagnostics = []
+
+    def emit(self, diagnostic):
+        self.diagnostics.append(diagnostic)
+
+    def summary(self, file, counts, fatal=False, stopped=False):
+        self.counts = counts
+        self.fatal = fatal
+        self.stopped = stopped
@@ -0,0 +1,110 @@
+'''
+Read-only containers for parsed yaml/json documents.
+
+The validator loads each document once and shares it between every check.
+Freezing the document makes accidental in-place edits fail loudly instead of
+leaking from one check into the next, which means the checks no longer need
+to deep copy the whole scenario before reading it.
+'''
+
+import copy, sys
+
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError(f"'{type(self).__name__}' is read-only. Copy it with thaw() before modifying it.")
+
+
+class FrozenDict(dict):
+    '''
+    A dict that cannot be modified after creation. Still passes isinstance(x, dict).
+    '''
+    __setitem__ = _read_only
+    __delitem__ = _read_only
+    __ior__ = _read_only
+    clear = _read_only
+    pop = _read_only
+    popitem = _read_only
+    setdefault = _read_only
+    update = _read_only
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self, memo)
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+class FrozenList(list):
+    '''
+    A list that cannot be modified after creation. Still passes isinstance(x, list).
+    '''
+    __setitem__ = _read_only
+    __delitem__ = _read_only
+    __iadd__ = _read_only
+    __imul__ = _read_only
+    append = _read_only
+    extend = _read_only
+    insert = _read_only
+    pop = _read_only
+    remove = _read_only
+    clear = _read_only
+    sort = _read_only
+    reverse = _read_only
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self, memo)
+
+    def __reduce__(self):
+        return (FrozenList, (list(self),))
+
+
+def freeze(obj, memo=None):
+    '''
+    Recursively converts dicts and lists into their read-only counterparts.
+    Objects shared through yaml anchors stay shared in the frozen copy. Strings are interned,
+    so the keys and ids repeated throughout a document are stored once.
+    '''
+    if memo is None:
+        memo = {}
+    if type(obj) is str:
+        return sys.intern(obj)
+    if isinstance(obj, (FrozenDict, FrozenList)):
+        return obj
+    if isinstance(obj, dict):
+        if id(obj) not in memo:
+            memo[id(obj)] = FrozenDict((freeze(k, memo), freeze(v, memo)) for k, v in obj.items())
+        return memo[id(obj)]
+    if isinstance(obj, list):
+        if id(obj) not in memo:
+            memo[id(obj)] = FrozenList(freeze(v, memo) for v in obj)
+        return memo[id(obj)]
+    return obj
+
+
+def thaw(obj, memo=None):
+    '''
+    Returns a fully mutable deep copy of a (possibly frozen) object.
+    '''
+    if memo is None:
+        memo = {}
+    if id(obj) in memo:
+        return memo[id(obj)]
+    if isinstance(obj, dict):
+        result = {}
+        memo[id(obj)] = result
+        for k, v in obj.items():
+            result[k] = thaw(v, memo)
+        return result
+    if isinstance(obj, list):
+        result = []
+        memo[id(obj)] = result
+        for v in obj:
+            result.append(thaw(v, memo))
+        return result
+    return copy.deepcopy(obj, memo)
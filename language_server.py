@@ -0,0 +1,459 @@
+'''
+Language server for scenario files, so editors show the validator's findings as the author types.
+
+Speaks the Language Server Protocol (JSON-RPC) over stdin/stdout. Editors send the full
+text of an open scenario on every change and get its findings back as diagnostics placed
+on the line and column of the value they are about.
+
+Edits usually touch a single scene, so each document keeps the findings of its previous
+version and only redoes the work an edit can affect:
+    - schema validation of a scene is reused while the scene's text is unchanged
+    - character matching and reachability of a scene are reused while neither the scene
+      nor anything that can lead to it changed (every scene is stamped with a hash of its
+      own text and the stamps of its predecessors, so an edit only invalidates the scenes
+      downstream of it)
+The remaining checks read the whole scenario and run on every change.
+
+Run with: python3 language_server.py [-t]
+'''
+
+import argparse, hashlib, json, os, sys, traceback
+from urllib.parse import unquote, urlparse
+import yaml
+from diagnostics import CollectingSink
+from logger import LogLevel, Logger
+from path_query import parse_location
+from source_index import node_marks
+from validator import YamlValidator, ValidationError, DuplicateKeyError, compose_scenario, FIRST_SCENE_CHARACTERS, SCENE_CHARACTERS
+
+# LSP DiagnosticSeverity
+LSP_SEVERITIES = {LogLevel.FATAL: 1, LogLevel.ERROR: 1, LogLevel.WARN: 2}
+# LSP TextDocumentSyncKind.Full: every change sends the whole document
+FULL_SYNC = 1
+
+
+def read_message(stream):
+    '''
+    Reads one JSON-RPC message (headers, a blank line, then the body). Returns None at end of input.
+    '''
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            if length is not None:
+                break
+            continue
+        name, _, value = line.decode('ascii').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value.strip())
+    return json.loads(stream.read(length).decode('utf-8'))
+
+
+def write_message(stream, message):
+    body = json.dumps(message).encode('utf-8')
+    stream.write(b'Content-Length: ' + str(len(body)).encode('ascii') + b'\r\n\r\n' + body)
+    stream.flush()
+
+
+def uri_to_path(uri):
+    parsed = urlparse(uri)
+    return unquote(parsed.path) if parsed.scheme == 'file' else uri
+
+
+class Document:
+    '''
+    An open scenario: its text, and the findings of its previous version by scene
+    '''
+    uri = None
+    path = None
+    version = None
+    text = None
+    data = None
+    root = None
+    _lines = None
+    cache = None
+
+    def __init__(self, uri):
+        self.uri = uri
+        self.path = uri_to_path(uri)
+        self.cache = {'schema': {}, 'characters': {}, 'reachable': {}}
+
+
+    def update(self, text, version):
+        self.text = text
+        self.version = version
+        self.data = None
+        self.root = None
+        self._lines = None
+
+
+    def position(self, mark):
+        '''
+        Converts a yaml mark into an LSP position, whose character offset counts UTF-16 code units
+        '''
+        if self._lines is None:
+            self._lines = self.text.split('\n')
+        line = min(mark.line, len(self._lines) - 1)
+        return {'line': line, 'character': len(self._lines[line][:mark.column].encode('utf-16-le')) // 2}
+
+
+    def scene_location(self, scene_id):
+        '''
+        Returns the location of the id of the scene with the given id, if there is one
+        '''
+        scenes = self.data.get('scenes') if isinstance(self.data, dict) else None
+        for i, scene in enumerate(scenes if isinstance(scenes, list) else []):
+            if isinstance(scene, dict) and scene.get('id') == scene_id:
+                return ('scenes', i, 'id')
+        return ()
+
+
+    def range(self, location):
+        if self.root is None:
+            start = {'line': 0, 'character': 0}
+            return {'start': start, 'end': start}
+        start, end = node_marks(self.root, location)
+        return {'start': self.position(start), 'end': self.position(end)}
+
+
+class IncrementalValidator(YamlValidator):
+    '''
+    Validates the current version of a Document, reusing the findings its previous
+    version had for scenes that nothing in the edit can affect
+    '''
+    document = None
+    scene_texts = None
+    scene_index = None
+    _upstream = None
+
+    def __init__(self, document, data, train_mode=False, sink=None):
+        super().__init__(document.path, train_mode, sink, document=data)
+        self.document = document
+        self.scene_texts = self.find_scene_texts()
+        self.scene_index = self.index_scenes()
+        if self.scene_texts is not None:
+            # forget scenes that were removed
+            cache = document.cache['schema']
+            for index in list(cache):
+                if index >= len(self.scene_texts):
+                    del cache[index]
+
+
+    def find_scene_texts(self):
+        '''
+        The source text of every scene, or None if a scene's text does not determine its
+        contents (yaml anchors can pull in values from elsewhere in the file)
+        '''
+        scenes = self.loaded_yaml.get('scenes') if isinstance(self.loaded_yaml, dict) else None
+        if not isinstance(scenes, list) or '&' in self.document.text:
+            return None
+        for k, v in self.document.root.value:
+            if k.value == 'scenes' and isinstance(v, yaml.SequenceNode) and len(v.value) == len(scenes):
+                return [self.document.text[n.start_mark.index:n.end_mark.index] for n in v.value]
+        return None
+
+
+    def index_scenes(self):
+        '''
+        Maps scene ids to their index, or returns None unless every scene has its own id
+        '''
+        if self.scene_texts is None:
+            return None
+        index = {}
+        for i, scene in enumerate(self.loaded_yaml['scenes']):
+            scene_id = scene.get('id') if isinstance(scene, dict) else None
+            if scene_id is None or not isinstance(scene_id, (str, int)) or scene_id in index:
+                return None
+            index[scene_id] = i
+        return index
+
+
+    def upstream_stamps(self):
+        '''
+        Stamps every scene with a hash of its own text and the stamps of the scenes leading to it.
+        Scenes that can reach each other (a cycle) share one stamp.
+        '''
+        if self._upstream is None:
+            graph = self.scene_graph
+            stamps = {}
+            # components come in topological order, so predecessors are stamped first
+            for component in graph.components:
+                members = set(component)
+                h = hashlib.sha1()
+                for scene_id in sorted(component, key=self.scene_index.get):
+                    h.update(self.scene_texts[self.scene_index[scene_id]].encode('utf-8') + b'\0')
+                for stamp in sorted({stamps[p] for s in component for p in graph.predecessors[s] if p not in members}):
+                    h.update(stamp.encode('ascii'))
+                for scene_id in component:
+                    stamps[scene_id] = h.hexdigest()
+            self._upstream = stamps
+        return self._upstream
+
+
+    def recording(self, run):
+        '''
+        Runs a check and returns the findings it reported (they are reported as usual too)
+        '''
+        sink = self.sink
+        recorder = CollectingSink()
+        self.sink = _Tee(sink, recorder)
+        try:
+            run()
+        finally:
+            self.sink = sink
+        return recorder.diagnostics
+
+
+    def reuse_by_scene(self, cache, stamps, run):
+        '''
+        Reports the cached findings of every scene whose stamp is unchanged, and runs the check
+        (given the indices of the scenes to check) for the rest
+        '''
+        stale = []
+        for scene_id, stamp in stamps.items():
+            entry = cache.get(scene_id)
+            if entry is not None and entry[0] == stamp:
+                for diagnostic in entry[1]:
+                    self.record(diagnostic)
+            else:
+                stale.append(scene_id)
+        for scene_id in list(cache):
+            if scene_id not in stamps:
+                del cache[scene_id]
+        if len(stale) == 0:
+            return
+        found = {scene_id: [] for scene_id in stale}
+        for diagnostic in self.recording(lambda: run({self.scene_index[scene_id] for scene_id in stale})):
+            if diagnostic.scene in found:
+                found[diagnostic.scene].append(diagnostic)
+        for scene_id in stale:
+            cache[scene_id] = (stamps[scene_id], found[scene_id])
+
+
+    def validate_object(self, item, ref_node, key, level, ref_name, override_required=False, location=()):
+        run = lambda: YamlValidator.validate_object(self, item, ref_node, key, level, ref_name, override_required, location)
+        if self.scene_texts is None or len(location) != 2 or location[0] != 'scenes':
+            return run()
+        # a scene's schema findings only depend on its own text (and position, which is in its paths)
+        index = location[1]
+        cache = self.document.cache['schema']
+        stamp = self.scene_texts[index]
+        entry = cache.get(index)
+        if entry is not None and entry[0] == stamp:
+            for diagnostic in entry[1]:
+                self.record(diagnostic)
+        else:
+            cache[index] = (stamp, self.recording(run))
+
+
+    def character_matching(self, scenes=None):
+        if self.scene_index is None:
+            return super().character_matching(scenes)
+        data = self.loaded_yaml
+        # what every scene is checked against: the first scene, its characters and every character id defined
+        all_characters = frozenset(repr(m.value) for path in [FIRST_SCENE_CHARACTERS, SCENE_CHARACTERS] for m in self.property_meets_conditions(path, data))
+        shared = (repr(self.scene_graph.first_scene_id()), repr(data.get('state')), tuple(sorted(all_characters)))
+        upstream = self.upstream_stamps()
+        stamps = {scene_id: (index, self.scene_texts[index], upstream[scene_id], shared) for scene_id, index in self.scene_index.items()}
+        self.reuse_by_scene(self.document.cache['characters'], stamps, lambda stale: YamlValidator.character_matching(self, stale))
+
+
+    def are_all_scenes_reachable(self, scenes=None):
+        if self.scene_index is None:
+            return super().are_all_scenes_reachable(scenes)
+        upstream = self.upstream_stamps()
+        first_scene = repr(self.scene_graph.first_scene_id())
+        stamps = {scene_id: (upstream[scene_id], first_scene) for scene_id in self.scene_index}
+        self.reuse_by_scene(self.document.cache['reachable'], stamps, lambda stale: YamlValidator.are_all_scenes_reachable(self, stale))
+
+
+class _Tee:
+    # hands every finding to two sinks
+    def __init__(self, first, second):
+        self.first = first
+        self.second = second
+
+    def emit(self, diagnostic):
+        self.first.emit(diagnostic)
+        self.second.emit(diagnostic)
+
+
+class LanguageServer:
+    '''
+    Answers LSP messages read from input, writing responses and diagnostics to output
+    '''
+    logger = Logger("languageServer")
+    input = None
+    output = None
+    train_mode = False
+    documents = None
+    shutdown_requested = False
+
+    def __init__(self, input, output, train_mode=False):
+        self.input = input
+        self.output = output
+        self.train_mode = train_mode
+        self.documents = {}
+
+
+    def run(self):
+        '''
+        Serves messages until the client sends exit. Returns the exit code.
+        '''
+        while True:
+            message = read_message(self.input)
+            if message is None or message.get('method') == 'exit':
+                return 0 if self.shutdown_requested else 1
+            self.handle(message)
+
+
+    def handle(self, message):
+        method = message.get('method')
+        params = message.get('params') or {}
+        is_request = 'id' in message
+        handler = getattr(self, 'on_' + method.replace('/', '_').replace('$', ''), None) if method else None
+        if handler is None:
+            if is_request:
+                self.send({'jsonrpc': '2.0', 'id': message['id'], 'error': {'code': -32601, 'message': "Method not found: " + str(method)}})
+            return
+        try:
+            result = handler(params)
+        except Exception as e:
+            self.logger.log(LogLevel.ERROR, "Could not handle '" + method + "':\n" + traceback.format_exc())
+            if is_request:
+                self.send({'jsonrpc': '2.0', 'id': message['id'], 'error': {'code': -32603, 'message': str(e)}})
+            return
+        if is_request:
+            self.send({'jsonrpc': '2.0', 'id': message['id'], 'result': result})
+
+
+    def send(self, message):
+        write_message(self.output, message)
+
+
+    def on_initialize(self, params):
+        # load the api files now rather than on the first keystroke
+        YamlValidator.load_api_files()
+        return {
+            'capabilities': {'textDocumentSync': {'openClose': True, 'change': FULL_SYNC}},
+            'serverInfo': {'name': 'itm-scenario-validator'}
+        }
+
+
+    def on_initialized(self, params):
+        return None
+
+
+    def on_shutdown(self, params):
+        self.shutdown_requested = True
+        return None
+
+
+    def on_textDocument_didOpen(self, params):
+        item = params['textDocument']
+        document = Document(item['uri'])
+        self.documents[item['uri']] = document
+        document.update(item['text'], item.get('version'))
+        self.publish(document)
+
+
+    def on_textDocument_didChange(self, params):
+        document = self.documents.get(params['textDocument']['uri'])
+        changes = params.get('contentChanges', [])
+        if document is None or len(changes) == 0:
+            return
+        document.update(changes[-1]['text'], params['textDocument'].get('version'))
+        self.publish(document)
+
+
+    def on_textDocument_didClose(self, params):
+        document = self.documents.pop(params['textDocument']['uri'], None)
+        if document is not None:
+            self.send({'jsonrpc': '2.0', 'method': 'textDocument/publishDiagnostics', 'params': {'uri': document.uri, 'diagnostics': []}})
+
+
+    def publish(self, document):
+        self.send({'jsonrpc': '2.0', 'method': 'textDocument/publishDiagnostics', 'params': {
+            'uri': document.uri,
+            'version': document.version,
+            'diagnostics': self.validate(document)
+        }})
+
+
+    def validate(self, document):
+        '''
+        Validates the current text of a document and returns its LSP diagnostics
+        '''
+        fatal = None
+        try:
+            data, document.root = compose_scenario(document.text)
+        except DuplicateKeyError as e:
+            return [self.problem(document, "Error while loading in yaml file -- " + str(e), e.mark)]
+        except yaml.YAMLError as e:
+            return [self.problem(document, "Error while loading in yaml file. Please ensure the file is a valid yaml format and try again.\n\n" + str(e), getattr(e, 'problem_mark', None))]
+        if data is None:
+            return [self.problem(document, "The yaml file is empty.", None)]
+        document.data = data
+        sink = CollectingSink()
+        try:
+            validator = IncrementalValidator(document, data, self.train_mode, sink)
+            validator.validate_field_names()
+            validator.validate_dependencies()
+        except ValidationError as e:
+            # validation stopped; show why along with what was found before it
+            fatal = self.problem(document, str(e), None)
+        except Exception:
+            self.logger.log(LogLevel.ERROR, "Could not validate '" + document.path + "':\n" + traceback.format_exc())
+            return [self.problem(document, "The validator could not check this file:\n\n" + traceback.format_exc(), None)]
+        diagnostics = [self.to_lsp(document, d) for d in sink.diagnostics]
+        return diagnostics + [fatal] if fatal is not None else diagnostics
+
+
+    def problem(self, document, message, mark):
+        '''
+        A diagnostic for a file that could not be fully checked, at mark (or the start of the file)
+        '''
+        if mark is not None:
+            start = document.position(mark)
+            end = {'line': start['line'], 'character': start['character'] + 1}
+        else:
+            start = end = {'line': 0, 'character': 0}
+        return {'range': {'start': start, 'end': end}, 'severity': 1, 'source': 'yamlValidator', 'code': 'fatal', 'message': message}
+
+
+    def to_lsp(self, document, diagnostic):
+        location = ()
+        if diagnostic.path:
+            try:
+                location = parse_location(diagnostic.path)
+            except ValueError:
+                location = ()
+        elif diagnostic.scene is not None:
+            # no path; point at the scene's id
+            location = document.scene_location(diagnostic.scene)
+        return {
+            'range': document.range(location),
+            'severity': LSP_SEVERITIES.get(diagnostic.severity, 3),
+            'source': 'yamlValidator',
+            'code': diagnostic.rule,
+            'message': diagnostic.message
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ITM - YAML Validator language server (LSP over stdio)')
+    parser.add_argument('-t', '--train', dest='train', action='store_true', help="Validate training scenario yamls")
+    args = parser.parse_args()
+    # the api file locations in .env are relative to the validator
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    output = sys.stdout.buffer
+    # stdout carries the protocol; anything else printed goes to stderr, which editors log
+    sys.stdout = sys.stderr
+    exit(LanguageServer(sys.stdin.buffer, output, args.train).run())
+
+
+if __name__ == '__main__':
+    main()
@@ -14,12 +14,18 @@ class Logger:
     def __init__(self, caller):
         self.calling_class = caller
 
+    def enabled(self, log_level):
+        '''
+        Whether messages of the log level are printed with the global config for logging
+        '''
+        return log_level.value >= int(config('LOG_LEVEL'))
+
     def log(self, log_level, msg):
         '''
         If the log level is equal to or greater than the global config for logging, 
         print the message with an appropriate prefix
         '''
-        if log_level.value >= int(config('LOG_LEVEL')):
+        if self.enabled(log_level):
             premsg = ''
             if (log_level == LogLevel.DEBUG):
                 premsg = "\033[90mDebug (" + self.calling_class + "):\t"
@@ -0,0 +1,273 @@
+'''
+Compiled queries over the dependency rule paths, such as scenes[].state.characters[].id
+
+A path is parsed once into a tuple of steps. Running a query walks the document a single
+time and returns every matching node together with its concrete location: a tuple of keys
+and list indices like ('scenes', 3, 'state', 'characters', 1, 'id'). Locations are only
+turned back into dotted strings (scenes[3].state.characters[1].id) when a message needs them.
+
+The scenario is read-only, so the matches of each path are computed once per document and
+shared by every check that asks for them.
+'''
+
+_compiled = {}
+
+
+def compile_path(path):
+    '''
+    Returns the compiled query for a dotted path, compiling it the first time it is seen
+    '''
+    query = _compiled.get(path)
+    if query is None:
+        query = PathQuery(path)
+        _compiled[path] = query
+    return query
+
+
+def parse_location(path):
+    '''
+    Converts a concrete dotted path (scenes[3].state.characters[1].id) into a location tuple.
+    An array without an index (characters[]) is recorded with None as its index.
+    '''
+    location = []
+    for segment in path.split('.'):
+        if '[' in segment:
+            key = segment.split('[')[0]
+            inside_brackets = segment.split('[')[1].split(']')[0]
+            location.append(key)
+            location.append(int(inside_brackets) if inside_brackets != '' else None)
+        else:
+            location.append(segment)
+    return tuple(location)
+
+
+def format_location(location):
+    '''
+    Converts a location tuple back into the dotted path used in messages
+    '''
+    path = ''
+    for part in location:
+        if isinstance(part, str):
+            path += ('.' if path != '' else '') + part
+        else:
+            path += '[' + (str(part) if part is not None else '') + ']'
+    return path
+
+
+def lookup(data, location):
+    '''
+    Follows a location from data. Returns None if any part of it does not exist,
+    or if it contains an array without an index.
+    '''
+    for part in location:
+        if part is None:
+            return None
+        if isinstance(part, str):
+            if not isinstance(data, dict) or part not in data:
+                return None
+        elif not isinstance(data, (list, dict)) or (isinstance(data, list) and part >= len(data)) or (isinstance(data, dict) and part not in data):
+            return None
+        data = data[part]
+    return data
+
+
+def _indices(items):
+    # arrays may have been loaded as dicts keyed by index
+    return [j for j in range(len(items)) if j in items] if isinstance(items, dict) else range(len(items))
+
+
+class Match:
+    '''
+    A node found by a query and the location where it was found
+    '''
+    location = None
+    node = None
+
+    def __init__(self, location, node):
+        self.location = location
+        self.node = node
+
+    @property
+    def path(self):
+        return format_location(self.location)
+
+    @property
+    def is_indexed(self):
+        '''
+        False for the match of a whole array (characters[]) rather than one of its elements
+        '''
+        return None not in self.location
+
+    @property
+    def value(self):
+        '''
+        The value at the location; a whole array has no single value
+        '''
+        return self.node if self.is_indexed else None
+
+
+class PathQuery:
+    '''
+    A dotted path compiled into (key, is_array) steps
+    '''
+    path = None
+    steps = None
+
+    def __init__(self, path):
+        self.path = path
+        self.steps = tuple((k.split('[]')[0], '[]' in k) for k in path.split('.'))
+
+    def ends_at_key(self, location):
+        '''
+        Whether a location is the final key of the path itself. For paths ending in an array,
+        the locations of the array's elements are not.
+        '''
+        return not self.steps[-1][1] or location[-1] is None
+
+    def run(self, data):
+        '''
+        Walks data once. Returns (found, missing): found holds a Match for every location the
+        path exists at, and missing holds the locations where the path stops existing and
+        every array along it already has an index.
+        '''
+        found = []
+        missing = []
+        self._walk(data, 0, (), found, missing)
+        return found, missing
+
+    def _walk(self, node, i, location, found, missing):
+        steps = self.steps
+        while i < len(steps):
+            key, is_array = steps[i]
+            if not isinstance(node, dict) or key not in node:
+                # key is not here, don't keep searching
+                if not any(a for _, a in steps[i:]):
+                    missing.append(location + tuple(k for k, _ in steps[i:]))
+                return
+            node = node[key]
+            location += (key,)
+            i += 1
+            if is_array:
+                items = node if node is not None else []
+                for j in _indices(items):
+                    self._walk(items[j], i, location + (j,), found, missing)
+                if i == len(steps):
+                    # the array as a whole also matches when it is the last key
+                    found.append(Match(location + (None,), items))
+                return
+        found.append(Match(location, node))
+
+
+class QuerySet:
+    '''
+    Several compiled queries answered by a single walk. The paths are merged into a trie on
+    their steps, so a prefix shared by many rules (scenes[].action_mapping[]...) is walked once
+    and each node is handed to every query that reaches it. Each query gets exactly the
+    results (and in the same order) that running it alone would give.
+    '''
+    queries = None
+    _root = None
+
+    def __init__(self, paths):
+        self.queries = [compile_path(path) for path in dict.fromkeys(paths)]
+        self._root = _TrieNode()
+        for query in self.queries:
+            trie = self._root
+            trie.below.append(query)
+            for step in query.steps:
+                trie = trie.children.setdefault(step, _TrieNode())
+                trie.below.append(query)
+            trie.ends.append(query)
+
+    def run(self, data):
+        '''
+        Walks data once. Returns {path: (found, missing)} as PathQuery.run would for each path.
+        '''
+        results = {query.path: ([], []) for query in self.queries}
+        self._walk(self._root, 0, data, (), results)
+        return results
+
+    def _walk(self, trie, depth, node, location, results):
+        for (key, is_array), child in trie.children.items():
+            if not isinstance(node, dict) or key not in node:
+                # key is not here, don't keep searching
+                for query in child.below:
+                    rest = query.steps[depth:]
+                    if not any(a for _, a in rest):
+                        results[query.path][1].append(location + tuple(k for k, _ in rest))
+                continue
+            value = node[key]
+            if is_array:
+                items = value if value is not None else []
+                for j in _indices(items):
+                    for query in child.ends:
+                        results[query.path][0].append(Match(location + (key, j), items[j]))
+                    self._walk(child, depth + 1, items[j], location + (key, j), results)
+                for query in child.ends:
+                    # the array as a whole also matches when it is the last key
+                    results[query.path][0].append(Match(location + (key, None), items))
+            else:
+                for query in child.ends:
+                    results[query.path][0].append(Match(location + (key,), value))
+                self._walk(child, depth + 1, value, location + (key,), results)
+
+
+class _TrieNode:
+    '''
+    One step of the merged paths: the queries that pass through it and the ones that end at it
+    '''
+    children = None
+    below = None
+    ends = None
+
+    def __init__(self):
+        self.children = {}
+        self.below = []
+        self.ends = []
+
+
+class DocumentQueries:
+    '''
+    Runs compiled queries against one (read-only) document, remembering the result of each path
+    '''
+    document = None
+    _results = None
+
+    def __init__(self, document):
+        self.document = document
+        self._results = {}
+
+    def run(self, path):
+        if path not in self._results:
+            self._results[path] = compile_path(path).run(self.document)
+        return self._results[path]
+
+    def prefetch(self, paths):
+        '''
+        Finds the matches of every path not already known in a single walk of the document
+        '''
+        pending = [path for path in paths if path not in self._results]
+        if len(pending) > 0:
+            self._results.update(QuerySet(pending).run(self.document))
+
+    def find(self, path, value='', length=-1, exists=True):
+        '''
+        Returns the matches of path whose node equals value (when given) and has at least
+        length elements (when given). With exists=False, returns a Match with no node for
+        every location where the path is missing instead.
+        '''
+        found, missing = self.run(path)
+        if not exists:
+            return [Match(location, None) for location in missing]
+        if value == '' and length < 0:
+            return list(found)
+        return [m for m in found if self._meets(m.node, value, length)]
+
+    def _meets(self, node, value, length):
+        # check for specific value
+        if value != '' and str(node) != str(value):
+            return False
+        # check for array length
+        if length > -1 and len(node) < length:
+            return False
+        return True
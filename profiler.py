@@ -0,0 +1,135 @@
+'''
+Profiles validating a scenario check by check, to find which check makes a scenario slow.
+
+For validate_field_names, the rule path prefetch and every check of validate_dependencies this
+records the wall time, how often the check looked up a scene (get_scene_by_id) or the
+characters of a scene (get_characters_in_scene), how many deep copies it made, and the
+peak memory it allocated. Nothing is wrapped or traced unless a validator is profiled.
+'''
+
+import copy, sys, time, tracemalloc
+import frozen
+from diagnostics import CollectingSink
+
+# validator methods whose calls are counted for every stage
+COUNTED_METHODS = ['get_characters_in_scene', 'get_scene_by_id']
+
+
+def stages(validator):
+    '''
+    Returns the stages of validating a scenario once it is loaded, as (name, function) pairs
+    in the order they run: the schema check, finding the matches of the dependency rule
+    paths and then each dependency check. Only what validation itself runs is profiled.
+    '''
+    return [
+        ('validate_field_names', validator.validate_field_names),
+        ('prefetch', lambda: validator.queries.prefetch(validator.dependency_paths()))
+    ] + [(check, getattr(validator, check)) for check in validator.dependency_checks]
+
+
+class Profiler:
+    '''
+    Runs the stages of a validator, recording what each of them costs
+    '''
+    validator = None
+    rows = None
+    counts = None
+    _copy_depth = 0
+
+    def __init__(self, validator):
+        self.validator = validator
+        self.rows = {}
+
+
+    def run(self):
+        '''
+        Runs every stage of the validator, timing them and counting their calls, then measures
+        the memory of each stage in a second, traced validation of the same scenario (tracing
+        slows everything down, so it would distort the times). Findings of the second one are
+        discarded. Returns the rows of the profile, slowest first.
+        '''
+        originals = self.count_calls()
+        try:
+            for name, function in stages(self.validator):
+                self.counts = dict.fromkeys(COUNTED_METHODS + ['deepcopy'], 0)
+                start = time.perf_counter()
+                function()
+                self.rows[name] = {'stage': name, 'seconds': time.perf_counter() - start, 'calls': self.counts}
+        finally:
+            self.restore(originals)
+        self.measure_memory()
+        return sorted(self.rows.values(), key=lambda row: -row['seconds'])
+
+
+    def count_calls(self):
+        '''
+        Counts calls to the counted validator methods and to deep copies (copy.deepcopy and thaw,
+        counting only the outermost call of a copy). Returns what is needed to undo it.
+        '''
+        validator = self.validator
+        for method in COUNTED_METHODS:
+            setattr(validator, method, self.counting(method, getattr(validator, method)))
+        originals = (copy.deepcopy, frozen.thaw)
+        copy.deepcopy = self.copying(copy.deepcopy)
+        frozen.thaw = self.copying(frozen.thaw)
+        return originals
+
+
+    def restore(self, originals):
+        for method in COUNTED_METHODS:
+            delattr(self.validator, method)
+        copy.deepcopy, frozen.thaw = originals
+
+
+    def counting(self, name, method):
+        def counted(*args, **kwargs):
+            self.counts[name] += 1
+            return method(*args, **kwargs)
+        return counted
+
+
+    def copying(self, function):
+        def counted(*args, **kwargs):
+            if self._copy_depth == 0:
+                self.counts['deepcopy'] += 1
+            self._copy_depth += 1
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._copy_depth -= 1
+        return counted
+
+
+    def measure_memory(self):
+        '''
+        Records the peak memory each stage allocated above what was allocated when it started
+        '''
+        original = self.validator
+        traced = type(original)(original.filename, original.train_mode, CollectingSink(), document=original.loaded_yaml)
+        tracemalloc.start()
+        try:
+            for name, function in stages(traced):
+                tracemalloc.reset_peak()
+                start = tracemalloc.get_traced_memory()[0]
+                function()
+                self.rows[name]['peak_bytes'] = max(tracemalloc.get_traced_memory()[1] - start, 0)
+        finally:
+            tracemalloc.stop()
+
+
+def print_profile(rows, stream=None):
+    '''
+    Prints the rows of a profile as a table
+    '''
+    stream = stream if stream is not None else sys.stderr
+    total = sum(row['seconds'] for row in rows)
+    line = "{:<36} {:>10} {:>6} {:>24} {:>16} {:>9} {:>10}"
+    print("", file=stream)
+    print("\033[1m" + line.format('check', 'ms', '%', 'get_characters_in_scene', 'get_scene_by_id', 'deepcopy', 'peak KiB') + "\033[0m", file=stream)
+    for row in rows:
+        calls = row['calls']
+        print(line.format(row['stage'], format(row['seconds'] * 1000, '.3f'), format(row['seconds'] / total * 100 if total else 0, '.1f'),
+                          calls['get_characters_in_scene'], calls['get_scene_by_id'], calls['deepcopy'],
+                          format(row.get('peak_bytes', 0) / 1024, '.1f')), file=stream)
+    print(line.format('total', format(total * 1000, '.3f'), '', sum(row['calls']['get_characters_in_scene'] for row in rows),
+                      sum(row['calls']['get_scene_by_id'] for row in rows), sum(row['calls']['deepcopy'] for row in rows), ''), file=stream, flush=True)
@@ -0,0 +1,235 @@
+'''
+Normalized view of the scenes in a scenario and the transitions between them.
+Built once per scenario so that checks can look up scenes and their successors
+without rescanning the scenes list, and answer branching questions
+(reachability, routes into a scene) without enumerating every path.
+
+A walk through the scenario starts at the first scene and follows transitions.
+A scene leading back to itself is not a transition.
+'''
+
+from collections import deque
+
+
+class SceneGraph:
+    scenario = None
+    scenes = None
+    first_scene = None
+    default_next = None
+    action_next = None
+    next_scenes = None
+    edges = None
+    predecessors = None
+    components = None
+    component_of = None
+    _reachable = None
+
+    def __init__(self, scenario):
+        '''
+        Index the scenes by id and resolve where every action leads
+        '''
+        self.scenario = scenario
+        self.scenes = {}
+        for scene in scenario.get('scenes', []) or []:
+            # keep the first scene with a given id, matching a linear search
+            if scene.get('id') not in self.scenes:
+                self.scenes[scene.get('id')] = scene
+
+        first_scene_id = scenario['first_scene'] if 'first_scene' in scenario else None
+        if first_scene_id is None:
+            self.first_scene = scenario['scenes'][0] if scenario.get('scenes') else None
+        else:
+            self.first_scene = self.scenes.get(first_scene_id)
+
+        self.default_next = {}
+        self.action_next = {}
+        self.next_scenes = {}
+        for scene_id, scene in self.scenes.items():
+            # integer ids implicitly continue to the next integer id, if that scene exists
+            implicit_next = None
+            if type(scene_id) is int and scene_id >= 0 and (scene_id + 1) in self.scenes:
+                implicit_next = scene_id + 1
+            default_next = scene.get('next_scene', implicit_next)
+            self.default_next[scene_id] = default_next
+            self.action_next[scene_id] = [a.get('next_scene', default_next) for a in scene.get('action_mapping', []) or []]
+            # unique destinations in action order; None means the scenario can end here
+            self.next_scenes[scene_id] = list(dict.fromkeys(self.action_next[scene_id]))
+
+        self.edges = {}
+        self.predecessors = {scene_id: [] for scene_id in self.scenes}
+        for scene_id in self.scenes:
+            self.edges[scene_id] = [s for s in self.next_scenes[scene_id] if s is not None and s != scene_id and s in self.scenes]
+            for s in self.edges[scene_id]:
+                self.predecessors[s].append(scene_id)
+        self.components = self.strongly_connected_components()
+        self.component_of = {}
+        for i in range(len(self.components)):
+            for scene_id in self.components[i]:
+                self.component_of[scene_id] = i
+
+    def get_scene(self, scene_id):
+        '''
+        Returns the scene with the given id, or None if it does not exist
+        '''
+        return self.scenes.get(scene_id)
+
+    def has_scene(self, scene_id):
+        return scene_id in self.scenes
+
+    def first_scene_id(self):
+        return self.first_scene['id'] if self.first_scene is not None else None
+
+    def successors(self, scene_id):
+        '''
+        Returns the existing scenes (other than itself) that can directly follow the given scene
+        '''
+        return self.edges.get(scene_id, [])
+
+    def strongly_connected_components(self):
+        '''
+        Groups scenes that can all reach each other using Tarjan's algorithm. Iterative, 
+        so long chains of scenes do not hit the recursion limit. Components are returned 
+        in topological order: every transition stays in its component or moves to a later one.
+        '''
+        index = {}
+        lowlink = {}
+        on_stack = set()
+        stack = []
+        components = []
+        counter = 0
+        for root in self.scenes:
+            if root in index:
+                continue
+            work = [(root, iter(self.edges[root]))]
+            index[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, children = work[-1]
+                child = next(children, None)
+                if child is not None:
+                    if child not in index:
+                        index[child] = lowlink[child] = counter
+                        counter += 1
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(self.edges[child])))
+                    elif child in on_stack:
+                        lowlink[node] = min(lowlink[node], index[child])
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+        # Tarjan finds components in reverse topological order
+        components.reverse()
+        return components
+
+    def is_cyclic(self, scene_id):
+        '''
+        Returns whether the scene can be revisited after leaving it
+        '''
+        return len(self.components[self.component_of[scene_id]]) > 1
+
+    def reachable(self):
+        '''
+        Returns the set of scene ids that can be reached from the first scene
+        '''
+        if self._reachable is None:
+            start = self.first_scene_id()
+            self._reachable = set()
+            if start in self.scenes:
+                self._reachable.add(start)
+                queue = deque([start])
+                while queue:
+                    for s in self.edges[queue.popleft()]:
+                        if s not in self._reachable:
+                            self._reachable.add(s)
+                            queue.append(s)
+        return self._reachable
+
+    def ancestors(self, scene_id):
+        '''
+        Returns the set of scene ids that can lead to the given scene, including itself
+        '''
+        found = {scene_id}
+        queue = deque([scene_id])
+        while queue:
+            for s in self.predecessors.get(queue.popleft(), []):
+                if s not in found:
+                    found.add(s)
+                    queue.append(s)
+        return found
+
+    def propagate(self, transfer, initial, key=None, scenes=None):
+        '''
+        Forward dataflow over the scene graph. Starts a walk at the first scene with the initial 
+        state and pushes every state through transfer(scene_id, state) into the following scenes 
+        until no new states arrive. Components are visited in topological order, so only scenes 
+        inside a cycle are ever revisited. States are told apart by key(state) (the state itself 
+        by default). Optionally restricted to the given set of scenes.
+        Returns {scene_id: [distinct states a walk can enter the scene with]}.
+        '''
+        if key is None:
+            key = lambda state: state
+        start = self.first_scene_id()
+        incoming = {}
+        if start not in self.scenes or (scenes is not None and start not in scenes):
+            return incoming
+        known = {start: {key(initial)}}
+        incoming[start] = [initial]
+        pending = {start: [initial]}
+        for i in range(len(self.components)):
+            queue = deque(s for s in self.components[i] if s in pending)
+            while queue:
+                scene_id = queue.popleft()
+                for state in pending.pop(scene_id, []):
+                    result = transfer(scene_id, state)
+                    result_key = key(result)
+                    for s in self.edges[scene_id]:
+                        if scenes is not None and s not in scenes:
+                            continue
+                        if result_key in known.setdefault(s, set()):
+                            continue
+                        known[s].add(result_key)
+                        incoming.setdefault(s, []).append(result)
+                        if s not in pending:
+                            pending[s] = []
+                            if self.component_of[s] == i:
+                                queue.append(s)
+                        pending[s].append(result)
+        return incoming
+
+    def unique_route(self, scene_id):
+        '''
+        If every walk from the first scene arrives at the given scene the same way, 
+        returns that route as a list of scene ids. Otherwise returns None.
+        '''
+        start = self.first_scene_id()
+        if scene_id not in self.scenes or start not in self.scenes:
+            return None
+        relevant = self.ancestors(scene_id)
+        if start not in relevant:
+            return None
+        route = [start]
+        seen = {start}
+        current = start
+        while current != scene_id:
+            options = [s for s in self.edges[current] if s in relevant]
+            # a second way forward (or a loop before arriving) means more than one route
+            if len(options) != 1 or options[0] in seen:
+                return None
+            current = options[0]
+            seen.add(current)
+            route.append(current)
+        return route
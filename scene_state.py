@@ -0,0 +1,402 @@
+'''
+Works out which characters, supplies and aid ids a scene can start with.
+
+Scenes that persist characters (or don't redefine supplies or aids) inherit them from
+whatever scene came before, so the answer depends on every walk into the scene.
+Instead of replaying each walk, one forward dataflow pass over the scene graph
+collects the distinct states that can reach each scene. Results are cached, so every
+check shares the same pass.
+
+Character ids are interned to bit positions (in the order a walk meets them), so a
+set of characters is an int: joining, removing and testing characters are single integer
+operations however many characters a scenario has.
+'''
+
+from scene_graph import SceneGraph
+
+
+def _basic_chars(scene):
+    return [(c['id'], c.get('unseen', False)) for c in scene.get('state', {}).get('characters', [])]
+
+
+def _aid_ids(scene):
+    aid = scene.get('state', {}).get('environment', {}).get('decision_environment', {}).get('aid', None)
+    return [x['id'] for x in aid] if aid is not None else None
+
+
+def _override_supplies(cur, new):
+    '''
+    Only supplies defined in the supplies array are overwritten.
+    All supplies left undefined are left unchanged
+    '''
+    if len(cur) == 0:
+        return tuple(new)
+    cur = list(cur)
+    for x in new:
+        matching = [i for i in range(len(cur)) if cur[i]['type'] == x['type']]
+        if len(matching) > 0:
+            cur[matching[0]] = x
+        else:
+            cur.append(x)
+    return tuple(cur)
+
+
+class CharacterSets:
+    '''
+    The characters of a scene as bitmasks over the interned character ids: 'possible' holds
+    one mask per group, 'any' and 'all' the characters in any and in every group.
+    '''
+    possible = None
+    any = 0
+    all = 0
+    removed = 0
+    seen = 0
+    unseen = 0
+
+    def __init__(self, possible, removed, seen, unseen):
+        self.possible = possible
+        self.removed = removed
+        self.seen = seen
+        self.unseen = unseen
+        self.all = -1
+        for group in possible:
+            self.any |= group
+            self.all &= group
+        if len(possible) == 0:
+            self.all = 0
+
+
+class SceneStateAnalysis:
+    scenario = None
+    graph = None
+    first_scene_id = None
+    _char_bits = None
+    _char_ids = None
+    _char_masks = None
+    _scenario_masks = None
+    _char_sets = None
+    _char_states = None
+    _supply_states = None
+    _aid_states = None
+    _characters = None
+    _supplies = None
+    _aid_ids = None
+    _removed = None
+
+    def __init__(self, scenario, graph=None):
+        self.scenario = scenario
+        self.graph = graph if graph is not None else SceneGraph(scenario)
+        self.first_scene_id = self.graph.first_scene_id()
+        self._characters = {}
+        self._supplies = {}
+        self._aid_ids = {}
+        self._char_sets = {}
+        self._char_masks = {}
+        # every character id gets the next bit in the order a walk from the first scene meets it:
+        # the scenario's characters, then the scenes' in topological order (in file order within
+        # a cycle), then scenes no walk reaches, then ids that are only ever removed
+        self._char_bits = {}
+        self._char_ids = []
+        for cid, _ in _basic_chars(scenario):
+            self._intern(cid)
+        position = {id(scene): i for i, scene in enumerate(scenario.get('scenes', []))}
+        for component in self.graph.components:
+            for scene in sorted((self.graph.get_scene(sid) for sid in component), key=lambda scene: position[id(scene)]):
+                for cid, _ in _basic_chars(scene):
+                    self._intern(cid)
+        for scene in scenario.get('scenes', []):
+            for cid, _ in _basic_chars(scene):
+                self._intern(cid)
+        for scene in scenario.get('scenes', []):
+            removed = scene.get('removed_characters', [])
+            for cid in removed if isinstance(removed, list) else []:
+                if isinstance(cid, str):
+                    self._intern(cid)
+        self._scenario_masks = self._source_masks(scenario, False)
+
+
+    def _intern(self, cid):
+        if cid not in self._char_bits:
+            self._char_bits[cid] = 1 << len(self._char_ids)
+            self._char_ids.append(cid)
+
+
+    def character_bit(self, cid):
+        '''
+        Returns the bit of a character id, or 0 for an id no scene defines or removes
+        '''
+        try:
+            return self._char_bits.get(cid, 0)
+        except TypeError:
+            # not a valid id (a list or mapping), so not any character's
+            return 0
+
+
+    def _mask(self, ids):
+        mask = 0
+        for cid in ids:
+            self._intern(cid)
+            mask |= self._char_bits[cid]
+        return mask
+
+
+    def _ordered(self, mask):
+        '''
+        Returns the ids of the characters in a mask, in the order a walk meets them
+        '''
+        ids = []
+        while mask:
+            low = mask & -mask
+            ids.append(self._char_ids[low.bit_length() - 1])
+            mask ^= low
+        return ids
+
+
+    def _scene_char_masks(self, scene_id):
+        if scene_id not in self._char_masks:
+            scene = self.graph.get_scene(scene_id)
+            # only a scene that persists characters removes any
+            self._char_masks[scene_id] = self._source_masks(scene, scene.get('persist_characters', False))
+        return self._char_masks[scene_id]
+
+
+    def _source_masks(self, source, removes):
+        '''
+        Returns (added, seen, unseen, removed) masks of the characters source (a scene or the
+        scenario) defines and, if removes is set, removes. seen and unseen hold each added
+        character as its last definition in source marks it.
+        '''
+        added = seen = unseen = 0
+        for cid, is_unseen in _basic_chars(source):
+            bit = self._char_bits[cid]
+            added |= bit
+            if is_unseen:
+                seen &= ~bit
+                unseen |= bit
+            else:
+                unseen &= ~bit
+                seen |= bit
+        removed = self._mask(source.get('removed_characters', [])) if removes else 0
+        return (added, seen, unseen, removed)
+
+
+    def _char_transfer(self, scene_id, state, keep_removed=False):
+        '''
+        Character state (ids, seen ids, unseen ids, as masks) after a walk passes through scene_id.
+        The scene's own removed_characters are skipped when keep_removed is set, since a scene's
+        removals only take effect once the walk moves on.
+        '''
+        chars, seen, unseen = state
+        removed = 0
+        if scene_id == self.first_scene_id and chars == 0:
+            # scenario characters are available at the start
+            added, added_seen, added_unseen, _ = self._scenario_masks
+        else:
+            scene = self.graph.get_scene(scene_id)
+            added, added_seen, added_unseen, scene_removed = self._scene_char_masks(scene_id)
+            if not scene.get('persist_characters', False):
+                # if persist characters is false at any point in the path, start fresh!
+                chars, seen, unseen = 0, 0, 0
+            elif not keep_removed:
+                removed = scene_removed
+        seen = (seen & ~added) | added_seen
+        unseen = (unseen & ~added) | added_unseen
+        chars = (chars | added) & ~removed
+        return (chars, seen, unseen)
+
+
+    def _route_state(self, route, transfer, initial):
+        state = initial
+        for scene_id in route:
+            state = transfer(scene_id, state)
+        return state
+
+
+    def characters_in_scene(self, scene_id):
+        '''
+        Gets all characters that could possibly be allowed in a scene:
+        'possible' is a list of character id groups (one per distinct way into the scene),
+        'removed', 'seen' and 'unseen' collect ids across every way into the scene.
+        '''
+        if scene_id in self._characters:
+            return self._characters[scene_id]
+        this_scene = self.graph.get_scene(scene_id)
+        chars = {'possible': [], 'removed': [], 'seen': [], 'unseen': []}
+        sets = self.character_sets(scene_id)
+        if this_scene.get('persist_characters', False):
+            chars['possible'] = [self._ordered(group) for group in sets.possible]
+            chars['seen'] = self._ordered(sets.seen)
+            chars['unseen'] = self._ordered(sets.unseen)
+            chars['removed'] = self._ordered(sets.removed)
+        else:
+            source = this_scene if scene_id != self.first_scene_id else self.scenario
+            chars['possible'] = [[c for c, _ in _basic_chars(source)]]
+            chars['seen'] = self._ordered(sets.seen)
+            chars['unseen'] = self._ordered(sets.unseen)
+        self._characters[scene_id] = chars
+        return chars
+
+
+    def character_sets(self, scene_id):
+        '''
+        The characters that could possibly be allowed in a scene (see characters_in_scene),
+        as a CharacterSets of masks
+        '''
+        if scene_id in self._char_sets:
+            return self._char_sets[scene_id]
+        this_scene = self.graph.get_scene(scene_id)
+        if this_scene.get('persist_characters', False):
+            empty = (0, 0, 0)
+            at_scene = lambda sid, state: self._char_transfer(sid, state, keep_removed=(sid == scene_id))
+            if self.graph.is_cyclic(scene_id) and this_scene.get('removed_characters'):
+                # this scene's removals never apply on the way back into it, so the shared pass can't be reused
+                incoming = self.graph.propagate(at_scene, empty, scenes=self.graph.ancestors(scene_id)).get(scene_id, [])
+            else:
+                if self._char_states is None:
+                    self._char_states = self.graph.propagate(self._char_transfer, empty)
+                incoming = self._char_states.get(scene_id, [])
+            states = list(dict.fromkeys(at_scene(scene_id, state) for state in incoming))
+
+            possible = [state[0] for state in states]
+            if self.graph.is_cyclic(scene_id):
+                # when every walk arrives the same way, coming back around a loop doesn't add options
+                route = self.graph.unique_route(scene_id)
+                if route is not None:
+                    possible = [self._route_state(route, at_scene, empty)[0]]
+            seen = 0
+            unseen = 0
+            for state in states:
+                seen |= state[1]
+                unseen |= state[2]
+            sets = CharacterSets([group for group in possible if group], self._removed_before(scene_id), seen, unseen)
+        else:
+            source = this_scene if scene_id != self.first_scene_id else self.scenario
+            added, seen, unseen, _ = self._source_masks(source, False)
+            sets = CharacterSets([added], 0, seen, unseen)
+        self._char_sets[scene_id] = sets
+        return sets
+
+
+    def _removed_before(self, scene_id):
+        '''
+        Every character removed by a persisting scene on some walk into scene_id (other than by scene_id itself)
+        '''
+        if self._removed is None:
+            self._removed = self._collect_removed()
+        return self._removed.get(scene_id, 0)
+
+
+    def _collect_removed(self):
+        '''
+        One pass over the components in topological order. A scene inherits every removal made before
+        each of its predecessors; inside a cycle, every other scene of the cycle also comes before it.
+        '''
+        reachable = self.graph.reachable()
+        revisited = any(state[0] for state in self._first_scene_revisits())
+        removes = {}
+        for sid in reachable:
+            scene = self.graph.get_scene(sid)
+            # the first scene only removes characters when a walk comes back to it with characters in hand
+            if scene.get('persist_characters', False) and (sid != self.first_scene_id or revisited):
+                removes[sid] = self._scene_char_masks(sid)[3]
+            else:
+                removes[sid] = 0
+        removed = {}
+        for component in self.graph.components:
+            members = [sid for sid in component if sid in reachable]
+            if len(members) == 0:
+                continue
+            inherited = 0
+            for sid in members:
+                for p in self.graph.predecessors[sid]:
+                    if p in reachable and p not in component:
+                        inherited |= removed[p] | removes[p]
+            if len(component) == 1:
+                removed[members[0]] = inherited
+                continue
+            # each member inherits the removals of every other member: those before it and those after it
+            after = [0] * (len(members) + 1)
+            for i in range(len(members) - 1, -1, -1):
+                after[i] = after[i + 1] | removes[members[i]]
+            before = 0
+            for i, sid in enumerate(members):
+                removed[sid] = inherited | before | after[i + 1]
+                before |= removes[sid]
+        return removed
+
+
+    def _first_scene_revisits(self):
+        if self._char_states is None:
+            self._char_states = self.graph.propagate(self._char_transfer, (0, 0, 0))
+        return self._char_states.get(self.first_scene_id, [])[1:]
+
+
+    def _supply_transfer(self, scene_id, state):
+        if scene_id == self.first_scene_id and len(state) == 0:
+            # get scenario supplies for first scene
+            return _override_supplies(state, self.scenario.get('state', {}).get('supplies', []))
+        # new supplies always overwrites previous supplies
+        return _override_supplies(state, self.graph.get_scene(scene_id).get('state', {}).get('supplies', []))
+
+
+    def supplies_in_scene(self, scene_id):
+        '''
+        Gets the supplies that could be allowed in a scene, one list per distinct way into the scene
+        '''
+        if scene_id in self._supplies:
+            return self._supplies[scene_id]
+        this_scene = self.graph.get_scene(scene_id)
+        if this_scene.get('supplies', None) is None:
+            # supplies are dicts, so tell states apart by which supply entries they hold
+            key = lambda state: tuple(id(s) for s in state)
+            if self._supply_states is None:
+                self._supply_states = self.graph.propagate(self._supply_transfer, (), key=key)
+            states = {}
+            for state in self._supply_states.get(scene_id, []):
+                result = self._supply_transfer(scene_id, state)
+                states.setdefault(key(result), result)
+            possible = list(states.values())
+            if self.graph.is_cyclic(scene_id):
+                route = self.graph.unique_route(scene_id)
+                if route is not None:
+                    possible = [self._route_state(route, self._supply_transfer, ())]
+            possible_supplies = [list(state) for state in possible if len(state) > 0]
+        elif scene_id != self.first_scene_id:
+            possible_supplies = [this_scene.get('state', {}).get('supplies', [])]
+        else:
+            possible_supplies = [self.scenario.get('state', {}).get('supplies', [])]
+        self._supplies[scene_id] = possible_supplies
+        return possible_supplies
+
+
+    def _aid_transfer(self, scene_id, state):
+        if scene_id == self.first_scene_id and len(state) == 0:
+            # get evac ids for the first scene from scenario state
+            ids = _aid_ids(self.scenario)
+            return tuple(ids) if ids is not None else ()
+        # new aid_delays always overwrites old aid_ids
+        ids = _aid_ids(self.graph.get_scene(scene_id))
+        return tuple(ids) if ids is not None else state
+
+
+    def aid_ids_in_scene(self, scene_id):
+        '''
+        Gets the aid_ids that could be allowed in a scene, one list per distinct way into the scene
+        '''
+        if scene_id in self._aid_ids:
+            return self._aid_ids[scene_id]
+        this_scene = self.graph.get_scene(scene_id)
+        if _aid_ids(this_scene) is None:
+            if self._aid_states is None:
+                self._aid_states = self.graph.propagate(self._aid_transfer, ())
+            possible = list(dict.fromkeys(self._aid_transfer(scene_id, state) for state in self._aid_states.get(scene_id, [])))
+            if self.graph.is_cyclic(scene_id):
+                route = self.graph.unique_route(scene_id)
+                if route is not None:
+                    possible = [self._route_state(route, self._aid_transfer, ())]
+            possible_ids = [list(ids) for ids in possible if len(ids) > 0]
+        else:
+            ids = _aid_ids(this_scene if scene_id != self.first_scene_id else self.scenario)
+            possible_ids = [ids] if ids is not None else []
+        self._aid_ids[scene_id] = possible_ids
+        return possible_ids
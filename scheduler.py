@@ -0,0 +1,83 @@
+'''
+Runs the dependency checks of one scenario concurrently.
+
+Most checks only read the scenario. Those that share an analysis (the characters, supplies
+or aid ids that can be in each scene) have it computed once, before the checks are spread
+over forked worker processes, so every worker inherits the finished analysis instead of
+computing it again. Each worker collects the findings of the checks it runs; they are then
+reported in the order the checks are listed, so the output is the same as running the checks
+one after another.
+
+Worker processes are forked, so they share the loaded scenario and api files without copying
+them. Where fork is not available the checks run one after another.
+'''
+
+import multiprocessing
+from diagnostics import CollectingSink
+
+# the shared analyses each dependency check reads; checks not listed need none
+CHECK_ANALYSES = {
+    'character_matching': ['characters'],
+    'validate_unseen_character_actions': ['characters'],
+    'validate_events': ['characters'],
+    'validate_messages': ['characters'],
+    'is_pulse_oximeter_configured': ['supplies'],
+    'validate_aid_ids': ['aid_ids']
+}
+
+# how each shared analysis is computed for every scene
+ANALYSES = {
+    'characters': lambda validator, scene_id: validator.scene_states.characters_in_scene(scene_id),
+    'supplies': lambda validator, scene_id: validator.scene_states.supplies_in_scene(scene_id),
+    'aid_ids': lambda validator, scene_id: validator.scene_states.aid_ids_in_scene(scene_id)
+}
+
+# the validator whose checks a forked worker runs
+_validator = None
+
+
+def can_run_concurrently():
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def prepare(validator, checks):
+    '''
+    Computes the shared analyses the given checks need, for every scene
+    '''
+    needed = []
+    for check in checks:
+        needed += [a for a in CHECK_ANALYSES.get(check, []) if a not in needed]
+    for analysis in needed:
+        for scene_id in validator.scene_graph.scenes:
+            ANALYSES[analysis](validator, scene_id)
+
+
+def _run_check(check):
+    # runs in a worker: the findings are returned instead of reported
+    sink = CollectingSink()
+    _validator.sink = sink
+    getattr(_validator, check)()
+    return sink.diagnostics
+
+
+def run_checks(validator, checks, jobs):
+    '''
+    Runs the checks over up to jobs worker processes, then reports their findings to the
+    validator in the order of checks
+    '''
+    global _validator
+    prepare(validator, checks)
+    _validator = validator
+    pool = multiprocessing.get_context('fork').Pool(min(jobs, len(checks)))
+    try:
+        # imap yields the findings of each check in the order of checks, whichever finishes first
+        results = list(pool.imap(_run_check, checks))
+    finally:
+        pool.close()
+        pool.join()
+        _validator = None
+    for diagnostics in results:
+        for diagnostic in diagnostics:
+            # findings come back without the parsed file they are positioned in
+            diagnostic.source = validator.source
+            validator.record(diagnostic)
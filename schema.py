@@ -0,0 +1,140 @@
+'''
+Compiled form of the api schemas (validator_api.yaml and state_changes.yaml).
+
+Each definition is turned into a SchemaNode once, with its $ref already resolved to the
+node it points at, enums stored as sets and the messages that list allowed keys built
+ahead of time. Validation then follows nodes directly instead of splitting and walking
+$ref strings for every key (and every array element) of the scenario.
+
+Problems in a definition (no type or $ref, an unhandled type, ...) are kept on the node
+rather than raised here, so they are still only reported if the scenario uses that key.
+
+Every enum under components/schemas is also listed by name in the schema's enums, so checks
+that need one enum (the injury locations, the entity types, ...) test membership against
+its set instead of scanning the list in the api document. Enum values are interned, as are
+the strings of a frozen scenario, so a matching value is usually the very same object.
+'''
+
+import sys
+
+
+def contains(values, value):
+    '''
+    Whether value is in the set values. A value that can't be hashed (a list or mapping where
+    a string is expected) is never in it.
+    '''
+    try:
+        return value in values
+    except TypeError:
+        return False
+
+
+def _interned(values):
+    return [sys.intern(v) if type(v) is str else v for v in values]
+
+
+class SchemaNode:
+    '''
+    One schema definition (a type, a property or the items of an array) with its $ref resolved
+    '''
+    type = None
+    ref = None
+    ref_name = None
+    target = None
+    properties = None
+    required = None
+    required_keys = None
+    allowed_keys = None
+    additional = None
+    items = None
+    enum = None
+    enum_values = None
+    minimum = None
+    maximum = None
+
+    def __init__(self):
+        self.required = []
+        self.required_keys = frozenset()
+
+    def __setstate__(self, state):
+        # unpickled (from the schema cache) strings are new objects; intern the enum again
+        self.__dict__.update(state)
+        if self.enum is not None:
+            self.enum = _interned(self.enum)
+            self.enum_values = frozenset(self.enum)
+
+    def allows(self, value):
+        '''
+        Whether value is one of the values of this enum
+        '''
+        return contains(self.enum_values, value)
+
+
+class CompiledSchema:
+    '''
+    Every definition of one schema document, compiled on construction
+    '''
+    document = None
+    enums = None
+    _refs = None
+
+    def __init__(self, document):
+        self.document = document
+        self._refs = {}
+        # the node of every enum schema, by name
+        self.enums = {}
+        for name in document['components']['schemas']:
+            node = self.resolve('#/components/schemas/' + name)
+            if node.enum is not None:
+                self.enums[name] = node
+
+
+    def schema(self, name):
+        '''
+        Returns the compiled node of a schema under components/schemas
+        '''
+        return self.resolve('#/components/schemas/' + name)
+
+
+    def resolve(self, ref):
+        '''
+        Returns the compiled node a $ref points at. Nodes are shared, so recursive
+        definitions (and the many keys that reference the same type) are compiled once.
+        '''
+        node = self._refs.get(ref)
+        if node is None:
+            # get the ref type and look up that location (skip starting hashtag)
+            definition = self.document
+            for x in ref.split('/')[1:]:
+                definition = definition[x]
+            node = SchemaNode()
+            # register before compiling so references back to this definition find it
+            self._refs[ref] = node
+            self._compile(definition, node)
+        return node
+
+
+    def _compile(self, definition, node=None):
+        if node is None:
+            node = SchemaNode()
+        node.type = definition.get('type', None)
+        if '$ref' in definition:
+            node.ref = definition['$ref']
+            node.ref_name = node.ref.split('/')[-1]
+            node.target = self.resolve(node.ref)
+        if 'properties' in definition:
+            node.properties = {key: self._compile(value) for key, value in definition['properties'].items()}
+            node.allowed_keys = str(list(definition['properties'].keys()))
+        if 'required' in definition:
+            node.required = list(definition['required'])
+            node.required_keys = frozenset(node.required)
+        if 'additionalProperties' in definition:
+            node.additional = self._compile(definition['additionalProperties'])
+        if 'items' in definition:
+            node.items = self._compile(definition['items'])
+        if 'enum' in definition:
+            node.enum = _interned(definition['enum'])
+            node.enum_values = frozenset(node.enum)
+        node.minimum = definition.get('minimum', None)
+        node.maximum = definition.get('maximum', None)
+        return node
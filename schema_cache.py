@@ -0,0 +1,97 @@
+'''
+On-disk cache of the loaded api schemas and dependency rules.
+
+Parsing validator_api.yaml, state_changes.yaml and dependencies.json (and compiling the
+schemas) costs more than validating a typical scenario, and the validator is often run once
+per file. The results are pickled to a cache file stamped with a hash of those inputs and
+of the modules that build them, so a changed (or regenerated) api file, or a newer
+validator, simply misses the cache and rebuilds it.
+
+Unpickling runs code named in the file, so the cache is only read if nobody else could have
+written it: it lives in the user's own cache directory by default, and a cache file (or a
+directory holding it) that belongs to another user or that others may write to is ignored.
+The stamp is a header line in front of the pickled contents, so a stale cache is recognized
+without unpickling anything.
+'''
+
+import hashlib, os, pickle, stat
+import frozen, schema
+from logger import LogLevel, Logger
+
+# bump when the cached contents change shape without frozen.py or schema.py changing
+CACHE_VERSION = 2
+
+# starts the header line of a cache file, followed by the key
+MAGIC = b'itm-validator-schema-cache '
+
+logger = Logger("schemaCache")
+
+
+def default_cache_file():
+    '''
+    Returns the cache file in the user's cache directory ($XDG_CACHE_HOME, or ~/.cache)
+    '''
+    cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_dir, 'itm-scenario-validator', 'schema_cache')
+
+
+def digest(paths):
+    '''
+    Hashes the given input files together with the cache version and the modules
+    whose classes end up in the cache
+    '''
+    h = hashlib.sha256(str(CACHE_VERSION).encode('utf-8'))
+    for path in [frozen.__file__, schema.__file__] + list(paths):
+        with open(path, 'rb') as f:
+            h.update(f.read())
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def is_private(st):
+    '''
+    Whether a file (given its stat) belongs to the current user and nobody else may write to it
+    '''
+    if not hasattr(os, 'getuid'):
+        # no owners to compare (Windows); the file is only as safe as its directory
+        return True
+    return st.st_uid == os.getuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def load(cache_file, key):
+    '''
+    Returns the cached contents if the cache file was written for key, otherwise None
+    '''
+    try:
+        with open(cache_file, 'rb') as f:
+            if not is_private(os.fstat(f.fileno())) or not is_private(os.stat(os.path.dirname(os.path.abspath(cache_file)))):
+                logger.log(LogLevel.WARN, "Not using schema cache '" + cache_file + "': it, or its directory, may be written by other users.")
+                return None
+            if f.readline(len(MAGIC) + 128) != MAGIC + key.encode('utf-8') + b'\n':
+                logger.log(LogLevel.DEBUG, "Schema cache '" + cache_file + "' is out of date.")
+                return None
+            return pickle.load(f)
+    except Exception as e:
+        # missing, unreadable or from an incompatible validator; rebuild it
+        logger.log(LogLevel.DEBUG, "Not using schema cache '" + cache_file + "': " + str(e))
+        return None
+
+
+def save(cache_file, key, contents):
+    '''
+    Writes contents to the cache file for key. Failing to write the cache is not an error.
+    '''
+    tmp_file = cache_file + '.' + str(os.getpid())
+    try:
+        cache_dir = os.path.dirname(os.path.abspath(cache_file))
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        # only the user can read or write the cache
+        with os.fdopen(os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb') as f:
+            f.write(MAGIC + key.encode('utf-8') + b'\n')
+            pickle.dump(contents, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # replace in one step so concurrent runs never read a partial cache
+        os.replace(tmp_file, cache_file)
+    except Exception as e:
+        logger.log(LogLevel.DEBUG, "Could not write schema cache '" + cache_file + "': " + str(e))
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
@@ -0,0 +1,135 @@
+'''
+Where each part of a scenario is in its file, so findings can point at a line and column.
+
+The nodes composed while parsing a scenario hold the position of every key and value, but
+also their tags, styles, end marks and a copy of every scalar: several times the memory of the
+loaded scenario. A SourceIndex records just the (line, column) each location (a tuple like
+('scenes', 3, 'action_mapping', 7, 'parameters', 'treatment')) starts at, so the nodes can be
+dropped once the scenario is loaded, before any check runs.
+'''
+
+import sys
+import yaml
+from path_query import parse_location
+
+
+def node_marks(root, location):
+    '''
+    Returns the start and end marks of the value at a location (tuple) in a composed
+    document, or of the deepest part of the location that exists. A key whose value is a
+    mapping or list is marked by the key alone, so the whole subtree is not underlined.
+    '''
+    node = root
+    key_node = None
+    for part in location:
+        child = None
+        if isinstance(node, yaml.MappingNode):
+            for k, v in node.value:
+                if isinstance(k, yaml.ScalarNode) and k.value == str(part):
+                    key_node, child = k, v
+                    break
+        elif isinstance(node, yaml.SequenceNode) and isinstance(part, int) and part < len(node.value):
+            key_node, child = None, node.value[part]
+        if child is None:
+            break
+        node = child
+    if key_node is not None:
+        if isinstance(node, yaml.ScalarNode):
+            return key_node.start_mark, node.end_mark
+        return key_node.start_mark, key_node.end_mark
+    return node.start_mark, node.end_mark
+
+
+class SourceIndex:
+    '''
+    The (line, column), both counted from 1, that each location in a scenario starts at: the
+    key for the value of a key, the value itself for an item of a list
+    '''
+    positions = None
+    scenes = None
+
+    def __init__(self, root=None, release=False):
+        '''
+        Indexes the composed nodes of a scenario (root), if given. If release is set, the nodes
+        are emptied as they are indexed, so the memory they hold is freed while the index grows.
+        '''
+        self.positions = {}
+        # the index of the first scene with each id
+        self.scenes = {}
+        if root is not None:
+            self.add(root, (), release=release)
+
+
+    def add(self, node, location, mark=None, release=False):
+        '''
+        Records where node (at location) and every part of it start. mark is where the location
+        starts, if not where node does (the mark of its key). If release is set, the parts of node
+        are dropped from it once they are recorded.
+        '''
+        self.record(location, mark if mark is not None else node.start_mark, node)
+        if isinstance(node, yaml.MappingNode):
+            for key_node, value_node in node.value:
+                if isinstance(key_node, yaml.ScalarNode):
+                    self.add(value_node, location + (sys.intern(key_node.value),), key_node.start_mark, release)
+            if release:
+                node.value = []
+        elif isinstance(node, yaml.SequenceNode):
+            for i, item in enumerate(node.value):
+                self.add(item, location + (i,), release=release)
+                if release:
+                    node.value[i] = None
+            if release:
+                node.value = []
+
+
+    def record(self, location, mark, node=None):
+        '''
+        Records that location starts at mark. node is the composed node there, if there is one.
+        '''
+        self.positions[location] = (mark.line + 1, mark.column + 1)
+        if len(location) == 3 and location[0] == 'scenes' and location[2] == 'id' and isinstance(node, yaml.ScalarNode):
+            self.scenes.setdefault(node.value, location[1])
+
+
+    def remove(self, count):
+        '''
+        Forgets the positions recorded after the first count, in the reverse order they were added
+        '''
+        while len(self.positions) > count:
+            self.positions.popitem()
+
+
+    def scene_location(self, scene_id):
+        '''
+        Returns the location of the id of the scene with the given id, if there is one
+        '''
+        index = self.scenes.get(str(scene_id))
+        return ('scenes', index, 'id') if index is not None else None
+
+
+    def position(self, path=None, scene=None):
+        '''
+        Returns the (line, column), both counted from 1, of the value at a concrete dotted path
+        (or of the deepest part of it in the file), or else of the id of the scene with the given
+        id. Returns None if neither is known.
+        '''
+        location = None
+        if path:
+            try:
+                location = parse_location(path)
+            except ValueError:
+                location = None
+        if location is None and scene is not None:
+            location = self.scene_location(scene)
+        if location is None or () not in self.positions:
+            return None
+        found = ()
+        for part in location:
+            # a key is matched as text, the way it is written in the file
+            if found + (part,) in self.positions:
+                found += (part,)
+            elif not isinstance(part, str) and found + (str(part),) in self.positions:
+                found += (str(part),)
+            else:
+                break
+        return self.positions[found]
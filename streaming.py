@@ -0,0 +1,258 @@
+'''
+Reads a scenario from its parse events one scene at a time, for scenarios too large to load whole.
+
+The top-level values of a scenario are small and are loaded as they are read. The scenes are
+loaded one at a time: each is handed to the caller (to check it against the schema) and then
+only its projection is kept, the parts of it that the dependency checks read:
+    - every path a dependency rule searches for or requires (dependencies.json)
+    - the paths listed in SCENE_PATHS, read by the other checks and the scene analyses
+Everything else (names, vitals, probe descriptions, ...) is dropped as soon as the scene has
+been checked, so memory grows with the largest scene and the projections, not with the file.
+Where each part of a projection starts in the file is kept as well, so findings still point at
+a line and column; a finding about a part of a scene that was dropped points at the nearest part
+that was kept.
+
+A projection is compiled from dotted paths into a tree of keys. '[]' stands for the items of a
+list and '*' for any key of a mapping; the value at the end of a path is kept whole. A value
+whose shape doesn't match the tree (a list where a mapping is expected, ...) is kept whole too,
+so the checks see it exactly as it was written.
+'''
+
+import sys
+from yaml.composer import Composer, ComposerError
+from yaml.events import MappingEndEvent, MappingStartEvent, SequenceEndEvent, SequenceStartEvent, StreamEndEvent
+from yaml.nodes import MappingNode, ScalarNode, SequenceNode
+from frozen import freeze
+from path_query import compile_path
+from source_index import SourceIndex
+
+# the parts of a scene (besides the dependency rule paths) that checks and scene analyses read
+SCENE_PATHS = [
+    'id',
+    'next_scene',
+    'persist_characters',
+    'removed_characters',
+    'restricted_actions',
+    'supplies',
+    'characters',
+    'action_mapping[].action_id',
+    'action_mapping[].action_type',
+    'action_mapping[].character_id',
+    'action_mapping[].intent_action',
+    'action_mapping[].next_scene',
+    'action_mapping[].parameters',
+    'state.characters[].id',
+    'state.characters[].unseen',
+    'state.characters[].demographics',
+    'state.characters[].injuries',
+    'state.supplies',
+    'state.events',
+    'state.mission.character_importance',
+    'state.environment.sim_environment.type',
+    'state.environment.decision_environment.aid',
+    # require_unstructured looks for 'unstructured' in state and the mappings nested in it
+    'state.unstructured',
+    'state.*.unstructured',
+    'state.*.*.unstructured'
+]
+
+# marks the end of a path in a projection: the value there is kept whole
+KEEP = True
+
+
+def dependency_scene_paths(dep_json):
+    '''
+    Returns every path inside a scene (relative to the scene) that the dependency rules search
+    for, test or require
+    '''
+    paths = []
+    for rule in ['simpleRequired', 'conditionalRequired', 'conditionalForbid', 'simpleAllowedValues', 'deepLinks', 'valueMatch', 'unique']:
+        paths += list(dep_json[rule])
+    for required in dep_json['simpleRequired'].values():
+        paths += list(required)
+    for entries in dep_json['conditionalRequired'].values():
+        for entry in entries:
+            paths += list(entry['required'])
+    for entries in dep_json['conditionalForbid'].values():
+        for entry in entries:
+            paths += list(entry['forbid'])
+    for values in dep_json['simpleAllowedValues'].values():
+        for keys in values.values():
+            paths += list(keys)
+    paths += list(dep_json['valueMatch'].values())
+    paths += list(dep_json['characterMatching'])
+    # the scopes of unique values (a whole scene, say) are only walked, not read, so they are left out
+    return [path[len('scenes[].'):] for path in paths if path.startswith('scenes[].')]
+
+
+def compile_projection(paths):
+    '''
+    Compiles dotted paths into the tree of keys of a projection
+    '''
+    root = {}
+    for path in paths:
+        keys = []
+        for key, is_array in compile_path(path).steps:
+            keys += [key, '[]'] if is_array else [key]
+        node = root
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+            if node is KEEP:
+                # a shorter path already keeps all of this
+                break
+        else:
+            node[keys[-1]] = KEEP
+    return root
+
+
+def scene_projection(dep_json):
+    '''
+    Returns the projection of a scene that the dependency checks need
+    '''
+    return compile_projection(dependency_scene_paths(dep_json) + SCENE_PATHS)
+
+
+def project(value, nodes):
+    '''
+    Returns the parts of value kept by any of the given projection nodes
+    '''
+    if any(node is KEEP for node in nodes):
+        return value
+    if isinstance(value, dict) and any(key != '[]' for node in nodes for key in node):
+        kept = {}
+        for key, item in value.items():
+            children = [node[k] for node in nodes for k in (key, '*') if k in node]
+            if children:
+                kept[key] = project(item, children)
+        return kept
+    if isinstance(value, list) and any('[]' in node for node in nodes):
+        children = [node['[]'] for node in nodes if '[]' in node]
+        return [project(item, children) for item in value]
+    return value
+
+
+def project_positions(source, node, nodes, location, mark=None):
+    '''
+    Records in a SourceIndex where the parts of a composed node (at location) kept by any of
+    the given projection nodes start
+    '''
+    if any(n is KEEP for n in nodes):
+        source.add(node, location, mark)
+        return
+    source.record(location, mark if mark is not None else node.start_mark, node)
+    if isinstance(node, MappingNode):
+        for key_node, value_node in node.value:
+            if isinstance(key_node, ScalarNode):
+                children = [n[k] for n in nodes for k in (key_node.value, '*') if k in n]
+                if children:
+                    project_positions(source, value_node, children, location + (sys.intern(key_node.value),), key_node.start_mark)
+    elif isinstance(node, SequenceNode):
+        children = [n['[]'] for n in nodes if '[]' in n]
+        if children:
+            for i, item in enumerate(node.value):
+                project_positions(source, item, children, location + (i,))
+
+
+_loaders = {}
+
+
+def streaming_loader(loader_class):
+    '''
+    Returns a loader class that also composes single nodes from the events of its parser
+    '''
+    if loader_class not in _loaders:
+        _loaders[loader_class] = type('Streaming' + loader_class.__name__, (loader_class, Composer), {})
+    return _loaders[loader_class]
+
+
+class ScenarioReader:
+    '''
+    Reads a scenario from a stream, loading the items of one top-level list (the scenes) one
+    at a time. read() hands out each item as it is loaded; document holds the scenario read so
+    far, with the projection of every item handed out in place of the item. source is the
+    SourceIndex of document, with only the positions of the projections, but those of the item
+    being handed out whole.
+    '''
+    loader = None
+    key = None
+    projection = None
+    document = None
+    source = None
+    streamed = False
+
+    def __init__(self, stream, loader_class, projection, key='scenes'):
+        '''
+        Items are loaded with loader_class, which also reports duplicate keys. If key is None,
+        or its value isn't a list, the scenario is loaded whole.
+        '''
+        self.loader = streaming_loader(loader_class)(stream)
+        self.loader.anchors = {}
+        self.projection = projection
+        self.key = key
+
+
+    def read(self):
+        '''
+        Reads the scenario, yielding (index, item) for every item of the list as it is loaded
+        '''
+        loader = self.loader
+        try:
+            loader.get_event()
+            if loader.check_event(StreamEndEvent):
+                # an empty file
+                return
+            document_start = loader.get_event()
+            if self.key is not None and loader.check_event(MappingStartEvent):
+                yield from self.read_mapping()
+            else:
+                node = loader.compose_node(None, None)
+                self.document = loader.construct_document(node)
+                self.source = SourceIndex(node)
+            loader.get_event()
+            if not loader.check_event(StreamEndEvent):
+                raise ComposerError("expected a single document in the stream", document_start.start_mark, "but found another document", loader.get_event().start_mark)
+        finally:
+            loader.dispose()
+
+
+    def read_mapping(self):
+        loader = self.loader
+        start = loader.get_event()
+        self.document = {}
+        self.source = SourceIndex()
+        self.source.record((), start.start_mark)
+        keys = []
+        while not loader.check_event(MappingEndEvent):
+            key_node = loader.compose_node(None, None)
+            # the loader reports duplicate (and unhashable) keys the same way as for a whole document
+            keys.append((key_node, ScalarNode('tag:yaml.org,2002:null', '')))
+            loader.construct_document(MappingNode('tag:yaml.org,2002:map', keys))
+            key = loader.construct_document(key_node)
+            if key == self.key and loader.check_event(SequenceStartEvent) and loader.peek_event().anchor is None:
+                self.streamed = True
+                self.document[key] = []
+                self.source.record((key,), key_node.start_mark)
+                yield from self.read_items(self.document[key], (key,))
+            else:
+                value_node = loader.compose_node(None, None)
+                self.document[key] = loader.construct_document(value_node)
+                self.source.add(value_node, (key,), key_node.start_mark)
+        loader.get_event()
+
+
+    def read_items(self, kept, location):
+        loader = self.loader
+        loader.get_event()
+        index = 0
+        while not loader.check_event(SequenceEndEvent):
+            node = loader.compose_node(None, None)
+            item = loader.construct_document(node)
+            kept.append(freeze(project(item, [self.projection])))
+            # the item is whole while it is handed out, then only its projection is kept
+            count = len(self.source.positions)
+            self.source.add(node, location + (index,))
+            yield index, item
+            self.source.remove(count)
+            project_positions(self.source, node, [self.projection], location + (index,))
+            index += 1
+        loader.get_event()
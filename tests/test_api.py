@@ -0,0 +1,106 @@
+'''
+The in-memory validate() API.
+'''
+
+import json, os, shutil, subprocess, sys, tempfile, unittest
+import yaml
+from diagnostics import ValidationResult
+from validator import ValidationError, validate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def read_sample():
+    with open(os.path.join(ROOT, 'sample.yaml'), encoding='utf-8') as f:
+        return f.read()
+
+
+def broken_sample():
+    '''
+    The sample with two errors: a scene state without characters and an unknown key
+    '''
+    scenario = yaml.safe_load(read_sample())
+    justify = [s for s in scenario['scenes'] if s['id'] == 'justify'][0]
+    del justify['persist_characters']
+    justify['state']['not_a_key'] = 1
+    return scenario
+
+
+class TestValidate(unittest.TestCase):
+
+    def test_valid_text(self):
+        result = validate(read_sample())
+        self.assertIsInstance(result, ValidationResult)
+        self.assertTrue(result.valid)
+        self.assertEqual(result.total_errors, 0)
+        self.assertEqual(result.errors(), [])
+
+    def test_invalid_mapping(self):
+        result = validate(broken_sample(), name='broken.yaml')
+        self.assertFalse(result.valid)
+        self.assertEqual(result.total_errors, 2)
+        self.assertEqual(result.counts['missing_keys'], 1)
+        self.assertEqual(result.counts['invalid_keys'], 1)
+        self.assertEqual(sorted(d.rule for d in result.errors()), ['invalid-key', 'missing-required-key'])
+        for d in result.errors():
+            self.assertEqual(d.file, 'broken.yaml')
+            self.assertEqual(d.scene, 'justify')
+        summary = result.to_dict()
+        self.assertFalse(summary['valid'])
+        self.assertEqual(len(summary['diagnostics']), len(result.diagnostics))
+
+    def test_text_and_mapping_agree(self):
+        scenario = broken_sample()
+        from_text = validate(yaml.safe_dump(scenario))
+        from_mapping = validate(scenario)
+        self.assertEqual(from_text.counts, from_mapping.counts)
+        self.assertEqual([d.message for d in from_text.diagnostics], [d.message for d in from_mapping.diagnostics])
+
+    def test_mapping_is_left_alone(self):
+        scenario = broken_sample()
+        before = yaml.safe_dump(scenario)
+        validate(scenario)
+        self.assertEqual(yaml.safe_dump(scenario), before)
+        scenario['id'] = 'still mutable'
+
+    def test_unloadable_scenarios(self):
+        for text in ['id: [', 'id: one\nid: two\n', '- a list\n', '']:
+            with self.subTest(text=text):
+                with self.assertRaises(ValidationError):
+                    validate(text)
+
+
+class TestErrorLimit(unittest.TestCase):
+
+    def test_stops_at_limit(self):
+        for max_errors in [1, 2]:
+            with self.subTest(max_errors=max_errors):
+                result = validate(broken_sample(), max_errors=max_errors)
+                self.assertTrue(result.stopped)
+                self.assertFalse(result.valid)
+                self.assertEqual(result.total_errors, max_errors)
+                self.assertEqual(len(result.errors()), max_errors)
+                self.assertTrue(result.to_dict()['stopped'])
+
+    def test_limit_not_reached(self):
+        for max_errors in [None, 3]:
+            with self.subTest(max_errors=max_errors):
+                result = validate(broken_sample(), max_errors=max_errors)
+                self.assertFalse(result.stopped)
+                self.assertEqual(result.total_errors, 2)
+        self.assertFalse(validate(read_sample(), max_errors=1).stopped)
+
+    def test_fail_fast(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'broken.yaml')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(yaml.safe_dump(broken_sample()))
+        process = subprocess.run([sys.executable, 'validator.py', '-f', path, '--fail-fast', '--format', 'json'], cwd=ROOT, capture_output=True, text=True)
+        summary = json.loads(process.stdout)
+        self.assertTrue(summary['stopped'])
+        self.assertEqual(len(summary['diagnostics']), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
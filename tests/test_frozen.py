@@ -0,0 +1,50 @@
+'''
+The read-only containers the validator shares between its checks.
+'''
+
+import copy, pickle, unittest
+from frozen import freeze, thaw, FrozenDict, FrozenList
+
+
+class TestFreeze(unittest.TestCase):
+
+    def test_cannot_be_modified(self):
+        doc = freeze({'scenes': [{'id': 'a', 'state': {'characters': []}}]})
+        self.assertIsInstance(doc, dict)
+        self.assertIsInstance(doc['scenes'], list)
+        with self.assertRaises(TypeError):
+            doc['id'] = 'b'
+        with self.assertRaises(TypeError):
+            doc['scenes'].append({})
+        with self.assertRaises(TypeError):
+            doc['scenes'][0]['state']['characters'].remove('x')
+        with self.assertRaises(TypeError):
+            doc.pop('scenes')
+
+    def test_keeps_shared_objects_shared(self):
+        shared = {'id': 'x'}
+        doc = freeze({'a': shared, 'b': [shared]})
+        self.assertIs(doc['a'], doc['b'][0])
+        self.assertIs(freeze(doc), doc)
+
+    def test_thaw_and_copies_are_mutable(self):
+        doc = freeze({'scenes': [{'id': 'a'}]})
+        for thawed in [thaw(doc), copy.deepcopy(doc)]:
+            self.assertNotIsInstance(thawed, FrozenDict)
+            self.assertNotIsInstance(thawed['scenes'], FrozenList)
+            thawed['scenes'][0]['id'] = 'b'
+            self.assertEqual(doc['scenes'][0]['id'], 'a')
+        shallow = copy.copy(doc['scenes'])
+        shallow.append({})
+        self.assertEqual(len(doc['scenes']), 1)
+
+    def test_pickles(self):
+        doc = freeze({'scenes': [{'id': 'a'}]})
+        loaded = pickle.loads(pickle.dumps(doc))
+        self.assertEqual(loaded, doc)
+        self.assertIsInstance(loaded, FrozenDict)
+        self.assertIsInstance(loaded['scenes'], FrozenList)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+'''
+SceneGraph against following the transitions of small random scenarios by brute force.
+'''
+
+import random, unittest
+from scene_graph import SceneGraph
+
+
+def random_scenario(rng, size):
+    '''
+    A scenario of size scenes, where each scene's actions lead to random scenes (itself, earlier
+    scenes and scenes that don't exist included) or end the scenario
+    '''
+    ids = ['s' + str(i) for i in range(size)]
+    scenes = []
+    for scene_id in ids:
+        actions = []
+        for i in range(rng.randint(0, 3)):
+            action = {'action_id': scene_id + '-a' + str(i)}
+            if rng.random() < 0.8:
+                action['next_scene'] = rng.choice(ids + ['missing'])
+            actions.append(action)
+        scene = {'id': scene_id, 'action_mapping': actions}
+        if rng.random() < 0.3:
+            scene['next_scene'] = rng.choice(ids)
+        scenes.append(scene)
+    return {'id': 'random', 'first_scene': rng.choice(ids), 'scenes': scenes}
+
+
+def random_graphs(count):
+    for seed in range(count):
+        rng = random.Random(seed)
+        yield seed, rng, SceneGraph(random_scenario(rng, rng.randint(1, 6)))
+
+
+def leads_to(graph):
+    '''
+    {scene_id: every scene a walk of one or more transitions from it can arrive at}
+    '''
+    after = {scene_id: set(graph.successors(scene_id)) for scene_id in graph.scenes}
+    changed = True
+    while changed:
+        changed = False
+        for scene_id in graph.scenes:
+            more = set().union(*[after[s] for s in after[scene_id]]) - after[scene_id]
+            if more:
+                after[scene_id] |= more
+                changed = True
+    return after
+
+
+def first_arrivals(graph, scene_id, limit):
+    '''
+    Every walk of at most limit scenes from the first scene that ends at its first arrival at scene_id
+    '''
+    found = []
+    walks = [[graph.first_scene_id()]]
+    while walks:
+        walk = walks.pop()
+        if walk[-1] == scene_id:
+            found.append(walk)
+        elif len(walk) < limit:
+            walks += [walk + [s] for s in graph.successors(walk[-1])]
+    return found
+
+
+def walk_states(graph, transfer, initial):
+    '''
+    Follows every walk from the first scene, passing the state through each scene on the way.
+    A walk stops when it comes back to a scene with a state it already had there, since
+    nothing new can happen after that. Returns {scene_id: set of states a walk enters it with}.
+    '''
+    found = {}
+
+    def walk(scene_id, state, visited):
+        found.setdefault(scene_id, set()).add(state)
+        result = transfer(scene_id, state)
+        for s in graph.successors(scene_id):
+            if (s, result) not in visited:
+                walk(s, result, visited | {(s, result)})
+
+    start = graph.first_scene_id()
+    walk(start, initial, {(start, initial)})
+    return found
+
+
+class TestSceneGraph(unittest.TestCase):
+
+    def test_transitions(self):
+        scenario = {'id': 'x', 'scenes': [
+            {'id': 'a', 'next_scene': 'b', 'action_mapping': [{'action_id': 'a1'}, {'action_id': 'a2', 'next_scene': 'c'}, {'action_id': 'a3', 'next_scene': 'a'}]},
+            {'id': 'b', 'action_mapping': [{'action_id': 'b1', 'next_scene': 'nowhere'}]},
+            {'id': 'c', 'end_scene_allowed': True}
+        ]}
+        graph = SceneGraph(scenario)
+        self.assertEqual(graph.first_scene_id(), 'a')
+        # a scene leading back to itself, or to a scene that doesn't exist, is not a transition
+        self.assertEqual(graph.successors('a'), ['b', 'c'])
+        self.assertEqual(graph.successors('b'), [])
+        self.assertEqual(graph.successors('c'), [])
+
+    def test_reachability_and_cycles(self):
+        for seed, rng, graph in random_graphs(300):
+            after = leads_to(graph)
+            start = graph.first_scene_id()
+            with self.subTest(seed=seed):
+                self.assertEqual(graph.reachable(), {start} | after[start])
+                for scene_id in graph.scenes:
+                    self.assertEqual(graph.is_cyclic(scene_id), scene_id in after[scene_id])
+                    self.assertEqual(graph.ancestors(scene_id), {scene_id} | {s for s in graph.scenes if scene_id in after[s]})
+
+    def test_components_in_topological_order(self):
+        for seed, rng, graph in random_graphs(300):
+            after = leads_to(graph)
+            order = {}
+            for i, component in enumerate(graph.components):
+                for scene_id in component:
+                    order[scene_id] = i
+            with self.subTest(seed=seed):
+                self.assertEqual(sorted(order), sorted(graph.scenes))
+                for scene_id in graph.scenes:
+                    for s in graph.successors(scene_id):
+                        self.assertLessEqual(order[scene_id], order[s])
+                    for s in graph.scenes:
+                        same = s == scene_id or (s in after[scene_id] and scene_id in after[s])
+                        self.assertEqual(order[s] == order[scene_id], same)
+
+    def test_unique_route(self):
+        for seed, rng, graph in random_graphs(300):
+            with self.subTest(seed=seed):
+                for scene_id in graph.scenes:
+                    # a loop on the way would give walks up to twice as long as the scenario
+                    walks = first_arrivals(graph, scene_id, 2 * len(graph.scenes) + 1)
+                    self.assertEqual(graph.unique_route(scene_id), walks[0] if len(walks) == 1 else None)
+
+
+class TestPropagate(unittest.TestCase):
+
+    def test_matches_every_walk(self):
+        for seed, rng, graph in random_graphs(300):
+            # each scene adds some of a few items to the state and takes others away
+            adds = {scene_id: frozenset(rng.sample(range(4), rng.randint(0, 2))) for scene_id in graph.scenes}
+            removes = {scene_id: frozenset(rng.sample(range(4), rng.randint(0, 2))) for scene_id in graph.scenes}
+            transfer = lambda scene_id, state: (state | adds[scene_id]) - removes[scene_id]
+
+            incoming = graph.propagate(transfer, frozenset())
+            expected = walk_states(graph, transfer, frozenset())
+            with self.subTest(seed=seed):
+                self.assertEqual({s: set(states) for s, states in incoming.items()}, expected)
+                for states in incoming.values():
+                    self.assertEqual(len(states), len(set(states)))
+
+    def test_restricted_to_scenes(self):
+        scenario = {'id': 'line', 'scenes': [
+            {'id': 'a', 'action_mapping': [{'action_id': 'a1', 'next_scene': 'b'}, {'action_id': 'a2', 'next_scene': 'c'}]},
+            {'id': 'b', 'action_mapping': [{'action_id': 'b1', 'next_scene': 'c'}]},
+            {'id': 'c', 'end_scene_allowed': True}
+        ]}
+        graph = SceneGraph(scenario)
+        transfer = lambda scene_id, state: state + (scene_id,)
+        self.assertEqual(graph.propagate(transfer, ()), {'a': [()], 'b': [('a',)], 'c': [('a',), ('a', 'b')]})
+        self.assertEqual(graph.propagate(transfer, (), scenes={'a', 'c'}), {'a': [()], 'c': [('a',)]})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+'''
+The on-disk cache of the loaded api files and dependency rules.
+'''
+
+import os, pickle, shutil, stat, tempfile, unittest
+import schema_cache
+
+# what unpickling a Marker has done
+unpickled = []
+
+
+def record(value):
+    unpickled.append(value)
+
+
+class Marker:
+    # unpickling it calls record, as unpickling a crafted cache file could call anything
+    def __reduce__(self):
+        return (record, ('unpickled',))
+
+
+class TestSchemaCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.cache_file = os.path.join(self.dir, 'cache')
+
+    def write(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def test_round_trip(self):
+        contents = ({'components': {'schemas': {}}}, ['rules'])
+        schema_cache.save(self.cache_file, 'key', contents)
+        self.assertEqual(schema_cache.load(self.cache_file, 'key'), contents)
+
+    def test_other_key_is_a_miss(self):
+        schema_cache.save(self.cache_file, 'old key', 'contents')
+        self.assertIsNone(schema_cache.load(self.cache_file, 'new key'))
+
+    def test_missing_or_broken_cache_is_a_miss(self):
+        self.assertIsNone(schema_cache.load(self.cache_file, 'key'))
+        with open(self.cache_file, 'wb') as f:
+            f.write(b'not a cache')
+        self.assertIsNone(schema_cache.load(self.cache_file, 'key'))
+
+    def test_failing_to_write_is_not_an_error(self):
+        # the cache would go in a directory that is a file
+        cache_file = os.path.join(self.write('file', ''), 'cache')
+        schema_cache.save(cache_file, 'key', 'contents')
+        self.assertIsNone(schema_cache.load(cache_file, 'key'))
+        self.assertEqual(os.listdir(self.dir), ['file'])
+
+    def test_digest_changes_with_any_input(self):
+        api = self.write('api.yaml', 'a: 1\n')
+        rules = self.write('rules.json', '{}')
+        key = schema_cache.digest([api, rules])
+        self.assertEqual(schema_cache.digest([api, rules]), key)
+        self.write('rules.json', '{"unique": {}}')
+        self.assertNotEqual(schema_cache.digest([api, rules]), key)
+        self.write('rules.json', '{}')
+        self.write('api.yaml', 'a: 2\n')
+        self.assertNotEqual(schema_cache.digest([api, rules]), key)
+
+    def write_cache(self, key, contents):
+        with open(self.cache_file, 'wb') as f:
+            f.write(schema_cache.MAGIC + key.encode('utf-8') + b'\n')
+            pickle.dump(contents, f)
+        os.chmod(self.cache_file, 0o600)
+
+    def test_stale_cache_is_not_unpickled(self):
+        del unpickled[:]
+        self.write_cache('old key', Marker())
+        self.assertIsNone(schema_cache.load(self.cache_file, 'new key'))
+        self.assertEqual(unpickled, [])
+        self.write_cache('new key', Marker())
+        schema_cache.load(self.cache_file, 'new key')
+        self.assertEqual(unpickled, ['unpickled'])
+
+    def test_only_the_user_can_write_it(self):
+        cache_file = os.path.join(self.dir, 'new', 'cache')
+        schema_cache.save(cache_file, 'key', 'contents')
+        self.assertEqual(stat.S_IMODE(os.stat(cache_file).st_mode), 0o600)
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.dirname(cache_file)).st_mode), 0o700)
+
+    @unittest.skipUnless(hasattr(os, 'getuid'), "files have no owners")
+    def test_cache_others_can_write_is_ignored(self):
+        schema_cache.save(self.cache_file, 'key', 'contents')
+        os.chmod(self.cache_file, 0o666)
+        self.assertIsNone(schema_cache.load(self.cache_file, 'key'))
+        os.chmod(self.cache_file, 0o600)
+        os.chmod(self.dir, 0o777)
+        self.assertIsNone(schema_cache.load(self.cache_file, 'key'))
+        os.chmod(self.dir, 0o700)
+        self.assertEqual(schema_cache.load(self.cache_file, 'key'), 'contents')
+
+    def test_default_location(self):
+        home = os.environ.get('XDG_CACHE_HOME')
+        try:
+            os.environ['XDG_CACHE_HOME'] = self.dir
+            self.assertEqual(schema_cache.default_cache_file(), os.path.join(self.dir, 'itm-scenario-validator', 'schema_cache'))
+        finally:
+            if home is None:
+                del os.environ['XDG_CACHE_HOME']
+            else:
+                os.environ['XDG_CACHE_HOME'] = home
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+'''
+Finding positions through a SourceIndex.
+'''
+
+import unittest
+import yaml
+from source_index import SourceIndex, node_marks
+from path_query import format_location
+from validator import compose_scenario, parse_scenario
+
+TEXT = '''\
+id: one
+scenes:
+- id: first
+  state:
+    characters:
+    - id: casualty
+      injuries: [burn, laceration]
+- id: second
+  '3': numeric
+  next_scene: first
+'''
+
+
+class TestSourceIndex(unittest.TestCase):
+
+    def setUp(self):
+        _, self.source = parse_scenario(TEXT)
+
+    def test_positions(self):
+        positions = {
+            'scenes': (2, 1),
+            'scenes[0]': (3, 3),
+            'scenes[0].state.characters[0].id': (6, 7),
+            'scenes[0].state.characters[0].injuries[1]': (7, 24),
+            'scenes[1].next_scene': (10, 3),
+            'scenes[1].3': (9, 3)
+        }
+        for path, position in positions.items():
+            with self.subTest(path):
+                self.assertEqual(self.source.position(path), position)
+
+    def test_deepest_part_in_the_file(self):
+        self.assertEqual(self.source.position('scenes[0].state.characters[0].vitals.breathing'), (6, 7))
+        self.assertEqual(self.source.position('scenes[0].state.characters[3].id'), (5, 5))
+        self.assertEqual(self.source.position('unknown'), (1, 1))
+
+    def test_scene(self):
+        self.assertEqual(self.source.position(scene='second'), (8, 3))
+        self.assertEqual(self.source.position('scenes[x]', scene='second'), (8, 3))
+        self.assertIsNone(self.source.position(scene='missing'))
+        self.assertIsNone(self.source.position())
+        self.assertIsNone(SourceIndex().position('id'))
+
+    def test_same_as_nodes(self):
+        _, root = compose_scenario(TEXT)
+        index = SourceIndex(root)
+        for location in index.positions:
+            with self.subTest(location=location):
+                start, _ = node_marks(root, location)
+                self.assertEqual(index.position(format_location(location)) if location else index.positions[()], (start.line + 1, start.column + 1))
+
+    def test_nodes_released(self):
+        _, root = compose_scenario(TEXT)
+        SourceIndex(root, release=True)
+        self.assertEqual(root.value, [])
+        _, root = compose_scenario(TEXT)
+        SourceIndex(root)
+        self.assertIsInstance(root.value[1][1], yaml.SequenceNode)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+'''
+The --stream mode against loading the scenario whole.
+'''
+
+import os, shutil, tempfile, unittest
+import yaml
+from benchmarks.generate import generate
+from diagnostics import CollectingSink
+from streaming import KEEP, compile_projection, project
+from validator import StreamingValidator, YamlValidator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_sample():
+    with open(os.path.join(ROOT, 'sample.yaml'), encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+
+def scene(scenario, scene_id):
+    return [s for s in scenario['scenes'] if s['id'] == scene_id][0]
+
+
+def without_persist(scenario):
+    del scene(scenario, 'justify')['persist_characters']
+
+
+def unknown_key(scenario):
+    scene(scenario, 'justify')['state']['not_a_key'] = 1
+    scenario['not_a_key'] = 1
+
+
+def wrong_type(scenario):
+    scenario['scenes'][0]['end_scene_allowed'] = 'yes'
+
+
+def missing_next_scene(scenario):
+    scenario['scenes'][0]['action_mapping'][0]['next_scene'] = 'missing'
+
+
+def duplicate_character(scenario):
+    characters = scenario['state']['characters']
+    characters.append(dict(characters[0]))
+
+
+def unknown_character(scenario):
+    for action in scenario['scenes'][1]['action_mapping']:
+        if 'character_id' in action:
+            action['character_id'] = 'nobody'
+
+
+class TestStreamingValidator(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def run_validator(self, validator_class, path):
+        sink = CollectingSink()
+        validator = validator_class(path, False, sink)
+        validator.validate_field_names()
+        validator.validate_dependencies()
+        # scene schema findings come first in stream mode, so only the set of findings is compared
+        return sorted((d.rule, d.message, str(d.path), str(d.scene), d.position) for d in sink.diagnostics), validator.counts()
+
+    def assert_same_findings(self, scenario):
+        path = os.path.join(self.dir, 'scenario.yaml')
+        with open(path, 'w', encoding='utf-8') as f:
+            yaml.safe_dump(scenario, f)
+        findings, counts = self.run_validator(YamlValidator, path)
+        # the same line and column too, and every finding has one
+        self.assertNotIn(None, [f[-1] for f in findings])
+        self.assertEqual(self.run_validator(StreamingValidator, path), (findings, counts))
+        return findings
+
+    def test_sample(self):
+        self.assertEqual(self.assert_same_findings(load_sample()), [])
+
+    def test_broken_samples(self):
+        for mutation in [without_persist, unknown_key, wrong_type, missing_next_scene, duplicate_character, unknown_character]:
+            with self.subTest(mutation.__name__):
+                scenario = load_sample()
+                mutation(scenario)
+                self.assertNotEqual(self.assert_same_findings(scenario), [])
+
+    def test_generated(self):
+        for seed in range(3):
+            with self.subTest(seed=seed):
+                self.assert_same_findings(generate(scenes=12, branching=2, cycles=2, seed=seed))
+
+
+class TestProjection(unittest.TestCase):
+
+    def test_compile(self):
+        projection = compile_projection(['id', 'state.characters[].id', 'state.characters', 'action_mapping[].next_scene', 'state.*.unstructured'])
+        self.assertEqual(projection, {
+            'id': KEEP,
+            'state': {'characters': KEEP, '*': {'unstructured': KEEP}},
+            'action_mapping': {'[]': {'next_scene': KEEP}}
+        })
+
+    def test_project(self):
+        projection = compile_projection(['id', 'action_mapping[].next_scene', 'state.characters[].id', 'state.*.unstructured'])
+        value = {
+            'id': 'a',
+            'name': 'dropped',
+            'action_mapping': [{'action_id': 'x', 'next_scene': 'b'}, {'action_id': 'y'}],
+            'state': {
+                'characters': [{'id': 'c', 'name': 'dropped'}],
+                'environment': {'unstructured': 'kept', 'other': 'dropped'}
+            }
+        }
+        self.assertEqual(project(value, [projection]), {
+            'id': 'a',
+            'action_mapping': [{'next_scene': 'b'}, {}],
+            'state': {'characters': [{'id': 'c'}], 'environment': {'unstructured': 'kept'}}
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+'''
+Regression tests for the validator. Run them from the root of the repository, where the .env
+file points at the api files.
+'''
+
+import json, os, shutil, subprocess, sys, tempfile, unittest
+import yaml
+from validator import YamlValidator, validate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE = os.path.join(ROOT, 'sample.yaml')
+ERROR_COUNTERS = ['missing_keys', 'wrong_types', 'invalid_keys', 'invalid_values', 'out_of_range', 'empty_levels']
+
+
+def read_sample():
+    with open(SAMPLE, encoding='utf-8') as f:
+        return f.read()
+
+
+def load_sample():
+    return yaml.safe_load(read_sample())
+
+
+def scene(scenario, scene_id):
+    return [s for s in scenario['scenes'] if s['id'] == scene_id][0]
+
+
+class TestPersistCharacters(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def validator(self, scenario):
+        path = os.path.join(self.dir, 'scenario.yaml')
+        with open(path, 'w', encoding='utf-8') as f:
+            yaml.safe_dump(scenario, f)
+        validator = YamlValidator(path)
+        validator.validate_field_names()
+        return validator
+
+    def errors(self, validator):
+        return {counter: getattr(validator, counter) for counter in ERROR_COUNTERS if getattr(validator, counter) > 0}
+
+    def test_sample_is_valid(self):
+        validator = self.validator(load_sample())
+        validator.validate_dependencies()
+        self.assertEqual(self.errors(validator), {})
+
+    def test_persisting_scene_does_not_relax_later_scenes(self):
+        # evac_decision and revisit_civilian persist characters, so their states need no characters;
+        # the scene after them doesn't, so its state still needs them
+        scenario = load_sample()
+        del scene(scenario, 'justify')['persist_characters']
+        self.assertEqual(self.errors(self.validator(scenario)), {'missing_keys': 1})
+
+    def test_persisting_scene_needs_no_characters(self):
+        scenario = load_sample()
+        self.assertNotIn('characters', scene(scenario, 'justify')['state'])
+        self.assertEqual(self.errors(self.validator(scenario)), {})
+
+
+class TestUniqueness(unittest.TestCase):
+
+    def unique_findings(self, scenario):
+        return [(d.path, d.scene) for d in validate(scenario).diagnostics if d.rule == 'unique']
+
+    def test_every_repeat_within_its_scope(self):
+        scenario = load_sample()
+        first, second = scenario['scenes'][0], scenario['scenes'][1]
+        # the same action ids in two scenes are fine; a repeat within one scene is not
+        second['action_mapping'][0]['action_id'] = first['action_mapping'][0]['action_id']
+        for i, original in enumerate([0, 1, 0]):
+            first['action_mapping'].append(dict(first['action_mapping'][original], unstructured='Repeat ' + str(i)))
+        count = len(first['action_mapping'])
+        self.assertEqual(self.unique_findings(scenario), [
+            ('scenes[0].action_mapping[' + str(i) + '].action_id', first['id']) for i in range(count - 3, count)
+        ])
+
+    def test_repeated_scene_id(self):
+        scenario = load_sample()
+        scenario['scenes'].append(dict(scenario['scenes'][1]))
+        self.assertEqual(self.unique_findings(scenario), [('scenes[' + str(len(scenario['scenes']) - 1) + '].id', scenario['scenes'][1]['id'])])
+
+    def test_values_that_are_not_hashable(self):
+        scenario = load_sample()
+        actions = scenario['scenes'][0]['action_mapping']
+        actions[0]['action_id'] = {'a': 1}
+        actions[1]['action_id'] = {'a': 1}
+        self.assertIn(('scenes[0].action_mapping[1].action_id', scenario['scenes'][0]['id']), self.unique_findings(scenario))
+
+
+class TestBatchMatchesSingleFile(unittest.TestCase):
+    '''
+    A file validated on its own and as part of a batch has the same findings and exit code
+    '''
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        invalid = load_sample()
+        del scene(invalid, 'justify')['persist_characters']
+        self.files = {
+            'valid': self.write('valid.yaml', read_sample()),
+            'invalid': self.write('invalid.yaml', yaml.safe_dump(invalid)),
+            'fatal': self.write('fatal.yaml', 'id: one\nid: two\n')
+        }
+
+    def write(self, name, text):
+        # each file in a directory of its own, so a batch of just that file can be given
+        os.makedirs(os.path.join(self.dir, os.path.splitext(name)[0]))
+        path = os.path.join(self.dir, os.path.splitext(name)[0], name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def run_validator(self, paths):
+        process = subprocess.run([sys.executable, 'validator.py', '-f'] + paths + ['--format', 'ndjson'], cwd=ROOT, capture_output=True, text=True)
+        records = [json.loads(line) for line in process.stdout.splitlines()]
+        return process.returncode, [r for r in records if r['type'] != 'batch-summary']
+
+    def test_same_findings_and_exit_code(self):
+        for name, path in self.files.items():
+            with self.subTest(name):
+                single_code, single = self.run_validator([path])
+                batch_code, batch = self.run_validator([os.path.dirname(path)])
+                self.assertEqual(single, batch)
+                self.assertEqual(single_code, batch_code)
+                self.assertEqual(single_code, 0 if name == 'valid' else 1)
+                self.assertEqual(single[-1]['type'], 'summary')
+                self.assertEqual(single[-1]['valid'], name == 'valid')
+                self.assertEqual(single[-1]['fatal'], name == 'fatal')
+
+    def test_batch_of_several(self):
+        batch_code, batch = self.run_validator([self.dir])
+        self.assertEqual(batch_code, 1)
+        for name, path in self.files.items():
+            with self.subTest(name):
+                _, single = self.run_validator([path])
+                self.assertEqual([r for r in batch if r['file'] == path], single)
+
+
+if __name__ == '__main__':
+    unittest.main()
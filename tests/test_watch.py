@@ -0,0 +1,123 @@
+'''
+Watch mode: which findings appeared or were resolved, and which files are revalidated.
+'''
+
+import contextlib, io, os, shutil, tempfile, unittest
+from diagnostics import CollectingSink, Diagnostic, ERROR_CATEGORIES, INVALID_VALUES, WARNINGS
+from logger import LogLevel
+from watch import Watcher, diff_findings
+
+
+def finding(rule, scene='a', severity=LogLevel.ERROR, category=INVALID_VALUES):
+    return Diagnostic(rule, severity, category, "{rule} in {scene}", {'rule': rule, 'scene': scene}, scene=scene, path='scenes[0].id')
+
+
+def result(findings, fatal=False):
+    sink = CollectingSink()
+    counts = {c: 0 for c in ERROR_CATEGORIES + [WARNINGS]}
+    for d in findings:
+        sink.emit(d)
+        if d.category is not None:
+            counts[d.category] += 1
+    sink.summary('file', counts, fatal)
+    return sink
+
+
+class TestDiffFindings(unittest.TestCase):
+
+    def test_appeared_and_resolved(self):
+        old = [finding('a'), finding('b')]
+        new = [finding('b'), finding('c')]
+        appeared, resolved = diff_findings(old, new)
+        self.assertEqual([d.rule for d in appeared], ['c'])
+        self.assertEqual([d.rule for d in resolved], ['a'])
+
+    def test_equal_findings_of_different_runs_match(self):
+        appeared, resolved = diff_findings([finding('a'), finding('b', scene='x')], [finding('b', scene='x'), finding('a')])
+        self.assertEqual((appeared, resolved), ([], []))
+
+    def test_repeated_findings_count_each_time(self):
+        appeared, resolved = diff_findings([finding('a')], [finding('a'), finding('a')])
+        self.assertEqual(len(appeared), 1)
+        self.assertEqual(resolved, [])
+        appeared, resolved = diff_findings([finding('a'), finding('a')], [finding('a')])
+        self.assertEqual(appeared, [])
+        self.assertEqual(len(resolved), 1)
+
+    def test_same_rule_in_another_scene_is_another_finding(self):
+        appeared, resolved = diff_findings([finding('a', scene='x')], [finding('a', scene='y')])
+        self.assertEqual([d.scene for d in appeared], ['y'])
+        self.assertEqual([d.scene for d in resolved], ['x'])
+
+
+class TestWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.files = []
+        self.results = {}
+        self.validated = []
+        self.watcher = Watcher(lambda: list(self.files), self.validate)
+
+    def validate(self, file):
+        self.validated.append(file)
+        return self.results[file]
+
+    def save(self, name, text, findings, fatal=False):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        if path not in self.files:
+            self.files.append(path)
+        self.results[path] = result(findings, fatal)
+        return path
+
+    def poll(self):
+        self.validated = []
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.watcher.poll()
+        return output.getvalue()
+
+    def test_revalidates_only_changed_files(self):
+        a = self.save('a.yaml', 'id: a\n', [])
+        b = self.save('b.yaml', 'id: b\n', [finding('x')])
+        self.poll()
+        self.assertEqual(self.validated, [a, b])
+        self.poll()
+        self.assertEqual(self.validated, [])
+        self.save('b.yaml', 'id: bb\n', [finding('y')])
+        output = self.poll()
+        self.assertEqual(self.validated, [b])
+        self.assertIn('  - Error: x in a', output)
+        self.assertIn('  + Error: y in a', output)
+
+    def test_unchanged_findings(self):
+        self.save('a.yaml', 'id: a\n', [finding('x')])
+        self.poll()
+        self.save('a.yaml', 'id: aa\n', [finding('x')])
+        self.assertIn('no change in findings', self.poll())
+
+    def test_fatal_run_keeps_the_last_findings(self):
+        self.save('a.yaml', 'id: a\n', [finding('x')])
+        self.poll()
+        self.save('a.yaml', 'id: [\n', [finding('fatal', severity=LogLevel.FATAL, category=None)], fatal=True)
+        output = self.poll()
+        self.assertIn('stopped early', output)
+        self.assertNotIn('  - ', output)
+        self.save('a.yaml', 'id: aaa\n', [finding('x')])
+        self.assertIn('no change in findings', self.poll())
+
+    def test_removed_file_is_forgotten(self):
+        a = self.save('a.yaml', 'id: a\n', [])
+        self.poll()
+        self.files.remove(a)
+        self.assertIn('removed', self.poll())
+        self.files.append(a)
+        self.poll()
+        self.assertEqual(self.validated, [a])
+
+
+if __name__ == '__main__':
+    unittest.main()
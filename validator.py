@@ -1,24 +1,118 @@
-import yaml, argparse, json, copy
+import yaml, argparse, json, glob, os, sys, re, io, contextlib, functools, multiprocessing, traceback
 from api_files.generator import ApiGenerator
+from frozen import freeze, FrozenDict, FrozenList
+from path_query import DocumentQueries, Match, compile_path, format_location, lookup, parse_location
+from schema import CompiledSchema, contains
+import schema_cache
+from scene_graph import SceneGraph
+from scene_state import SceneStateAnalysis
 from logger import LogLevel, Logger
+from diagnostics import Diagnostic, ValidationResult, ConsoleSink, NdjsonSink, JsonSummarySink, CollectingSink, MISSING_KEYS, WRONG_TYPES, INVALID_KEYS, INVALID_VALUES, OUT_OF_RANGE, EMPTY_LEVELS, WARNINGS, ERROR_CATEGORIES
+from watch import Watcher
+from profiler import Profiler, print_profile
+import scheduler
+from streaming import ScenarioReader, scene_projection
+from source_index import SourceIndex
 from decouple import config
+from collections.abc import Hashable
 
 API_YAML = config('API_YAML')
 STATE_YAML = config('STATE_YAML')
 DEP_JSON = config('DEP_JSON')
+CACHE_FILE = config('CACHE_FILE', default='') or schema_cache.default_cache_file()
+
+# general locations of character ids used by character matching
+FIRST_SCENE_CHARACTERS = "state.characters[].id"
+SCENE_CHARACTERS = "scenes[].state.characters[].id"
+REMOVED_CHARACTERS = "scenes[].removed_characters[]"
+
+class ValidationError(Exception):
+    '''
+    Raised when a scenario can't be validated at all: it can't be loaded, or the api files
+    it is checked against are missing or broken
+    '''
+    pass
+
+
+class ErrorLimitReached(Exception):
+    '''
+    Raised when a validator has reported as many errors as it is allowed to. It ends the check
+    (and any traversal) in progress, so the checks that remain are skipped.
+    '''
+    pass
+
+
+class DuplicateKeyError(ValueError):
+    mark = None
+
+    def __init__(self, message, mark=None):
+        super().__init__(message)
+        # where the repeated key is in the yaml file
+        self.mark = mark
+
 
 # special loader with duplicate key checking (https://gist.github.com/pypt/94d747fe5180851196eb)
-class UniqueKeyLoader(yaml.SafeLoader):
+# parses with libyaml, so the scenario is only parsed once to both load it and check for duplicates
+class UniqueKeyLoader(yaml.CSafeLoader):
     def construct_mapping(self, node, deep=False):
-        mapping = []
+        mapping = set()
         for key_node, value_node in node.value:
             key = self.construct_object(key_node, deep=deep)
+            if not isinstance(key, Hashable):
+                # let the constructor report unhashable keys
+                continue
             if key in mapping:
-                raise ValueError(f"Duplicate key {key!r} found in YAML.")
-            mapping.append(key)
+                raise DuplicateKeyError(f"Duplicate key {key!r} found in YAML.", key_node.start_mark)
+            mapping.add(key)
         return super().construct_mapping(node, deep)
 
 
+def compose_scenario(text):
+    '''
+    Parses scenario text with duplicate key checking. Returns the loaded document and its
+    root node, which holds the source position of every key and value.
+    '''
+    loader = UniqueKeyLoader(text)
+    try:
+        node = loader.get_single_node()
+        return (loader.construct_document(node) if node is not None else None), node
+    finally:
+        loader.dispose()
+
+
+def parse_scenario(source):
+    '''
+    Loads scenario yaml (text or an open file) with duplicate key checking, keeping where each
+    part of it is in the text. Returns the loaded document and its SourceIndex (None if the
+    text is empty); the composed nodes are not kept. Raises ValidationError if it can't be loaded.
+    '''
+    try:
+        data, root = compose_scenario(source)
+    except Exception as e:
+        raise loading_error(e) from e
+    return data, (SourceIndex(root, release=True) if root is not None else None)
+
+
+def load_scenario(source):
+    '''
+    Loads scenario yaml (text or an open file) with duplicate key checking.
+    Raises ValidationError if it can't be loaded.
+    '''
+    try:
+        return yaml.load(source, Loader=UniqueKeyLoader)
+    except Exception as e:
+        raise loading_error(e) from e
+
+
+def loading_error(e):
+    '''
+    Returns the ValidationError to raise when a scenario can't be loaded because of e
+    '''
+    if isinstance(e, (DuplicateKeyError, yaml.constructor.ConstructorError)):
+        return ValidationError("Error while loading in yaml file -- " + str(e))
+    return ValidationError("Error while loading in yaml file. Please ensure the file is a valid yaml format and try again.\n\n" + str(e) + "\n")
+
+
 PRIMITIVE_TYPE_MAP = {
     'string': str,
     'boolean': bool,
@@ -31,13 +125,11 @@ PRIMITIVE_TYPE_MAP = {
 class YamlValidator:
     logger = Logger("yamlValidator")
     file = None
-    dup_check_file = None
-    api_file = None
-    dep_file = None
-    state_change_file = None
     loaded_yaml = None
     api_yaml = None
     state_changes_yaml = None
+    api_schema = None
+    state_schema = None
     dep_json = None
     missing_keys = 0
     wrong_types = 0
@@ -48,49 +140,137 @@ class YamlValidator:
     warning_count = 0
     train_mode = False
     allowed_supplies = []
+    allowed_supply_values = frozenset()
+    scene_graph = None
+    scene_states = None
+    queries = None
+    filename = None
+    sink = None
+    source = None
+    max_errors = None
+    stopped = False
+    # the checks run by validate_dependencies, in order
+    dependency_checks = [
+        'simple_requirements',
+        'conditional_requirements',
+        'conditional_forbid',
+        'simple_value_matching',
+        'deep_links',
+        'value_follows_list',
+        'require_unstructured',
+        'scenes_with_state',
+        'validate_action_params',
+        'validate_mission_importance',
+        'character_matching',
+        'verify_uniqueness',
+        'verify_allowed_actions',
+        'check_first_scene',
+        'is_pulse_oximeter_configured',
+        'check_scene_env_type',
+        'validate_pretreated_injuries',
+        'validate_unseen_character_actions',
+        'validate_aid_ids',
+        'validate_events',
+        'validate_messages',
+        'are_all_scenes_reachable',
+        'validate_quantized_support',
+    ]
+
+    def __init__(self, filename, train_mode=False, sink=None, document=None, max_errors=None, source=None):
+        '''
+        Load in the file and parse the yaml. Findings are reported to sink, which
+        defaults to printing them to the console. A document that is already loaded
+        can be given instead of reading the file; filename then only names it, and
+        source (its SourceIndex, if it was parsed from text) places findings in it.
+        If max_errors is given, reporting that many errors raises ErrorLimitReached
+        and sets stopped.
+        Raises ValidationError if the scenario can't be validated.
+        '''
+        self.missing_keys = self.wrong_types = self.invalid_values = self.out_of_range = 0
+        self.invalid_keys = self.empty_levels = self.warning_count = 0
+        self.filename = filename
+        self.sink = sink if sink is not None else ConsoleSink(self.logger)
+        self.max_errors = max_errors
+        self.stopped = False
+        self.source = source
+        if document is None:
+            self.file = self.validate_file_location(filename)
+        self.load_api_files()
+        self.train_mode = train_mode
+        self.allowed_supplies = list(self.api_schema.enums['SupplyTypeEnum'].enum)
+        if not self.train_mode:
+            for x in self.dep_json['trainingOnlySupplies']:
+                self.allowed_supplies.remove(x)
+        self.allowed_supply_values = frozenset(self.allowed_supplies)
+        if document is not None:
+            self.loaded_yaml = freeze(document)
+        else:
+            # the scenario is shared read-only by every check; copy only where a check needs to modify it
+            self.loaded_yaml = freeze(self.read_scenario(self.file))
 
-    def __init__(self, filename, train_mode=False):
-        '''
-        Load in the file and parse the yaml
-        '''
-        self.file = self.validate_file_location(filename)
         try:
-            self.api_file = open(API_YAML, encoding='utf-8')
-            self.api_yaml = yaml.load(self.api_file, Loader=yaml.CLoader)
-        except Exception as e:
-            self.logger.log(LogLevel.FATAL, "Error while loading in api yaml. Please check the .env to make sure the location is correct and try again.\n\n" + str(e) + "\n")
+            for character in self.loaded_yaml.get('state', {'characters': []}).get('characters', []):
+                if character.get('has_blanket', False):
+                    self.report('blanket-at-startup', LogLevel.ERROR, INVALID_KEYS, "Blankets can't appear on characters at startup but '{character}' has 'has_blanket' set to True.", character=character.get('id'))
+        except ErrorLimitReached:
+            # stopped is set; the checks will be skipped
+            pass
+
+        # index the scenes and their transitions once; every check queries this graph
+        self.scene_graph = SceneGraph(self.loaded_yaml)
+        # characters, supplies and aid ids available per scene, computed on first use and shared by all checks
+        self.scene_states = SceneStateAnalysis(self.loaded_yaml, self.scene_graph)
+        # matches of every dependency rule path, found on first use and shared by all checks
+        self.queries = DocumentQueries(self.loaded_yaml)
+
+
+    @classmethod
+    def load_api_files(cls):
+        '''
+        Loads the api yaml, state api yaml and json dependency file and compiles the schemas.
+        They are loaded once per process and shared (read-only) by every validator; the result
+        is also cached on disk and reused for as long as none of those files change.
+        Raises ValidationError if any of them can't be loaded.
+        '''
+        if cls.dep_json is not None:
+            return
+        try:
+            cache_key = schema_cache.digest([API_YAML, STATE_YAML, DEP_JSON])
+        except Exception:
+            # a file is missing; load below to report which one
+            cache_key = None
+        cached = schema_cache.load(CACHE_FILE, cache_key) if cache_key is not None else None
+        if cached is not None:
+            cls.api_yaml, cls.api_schema, cls.state_changes_yaml, cls.state_schema, cls.dep_json = cached
+            return
         try:
-            self.state_change_file = open(STATE_YAML, encoding='utf-8')
-            self.state_changes_yaml = yaml.load(self.state_change_file, Loader=yaml.CLoader)
+            with open(API_YAML, encoding='utf-8') as api_file:
+                api_yaml = freeze(yaml.load(api_file, Loader=yaml.CLoader))
+            api_schema = CompiledSchema(api_yaml)
         except Exception as e:
-            self.logger.log(LogLevel.FATAL, "Error while loading in state api yaml. Please check the .env to make sure the location is correct and try again.\n\n" + str(e) + "\n")
+            raise ValidationError("Error while loading in api yaml. Please check the .env to make sure the location is correct and try again.\n\n" + str(e) + "\n") from e
         try:
-            self.loaded_yaml = yaml.load(self.file, Loader=yaml.CLoader)
-            try:
-                dup_check_file = open(filename, 'r', encoding='utf-8')
-                yaml.load(dup_check_file, Loader=UniqueKeyLoader)
-            except Exception as e:
-                self.logger.log(LogLevel.FATAL, "Error while loading in yaml file -- " + str(e))
+            with open(STATE_YAML, encoding='utf-8') as state_change_file:
+                state_changes_yaml = freeze(yaml.load(state_change_file, Loader=yaml.CLoader))
+            state_schema = CompiledSchema(state_changes_yaml)
         except Exception as e:
-            self.logger.log(LogLevel.FATAL, "Error while loading in yaml file. Please ensure the file is a valid yaml format and try again.\n\n" + str(e) + "\n")
+            raise ValidationError("Error while loading in state api yaml. Please check the .env to make sure the location is correct and try again.\n\n" + str(e) + "\n") from e
         try:
-            self.dep_file = open(DEP_JSON, encoding='utf-8')
-            self.dep_json = json.load(self.dep_file)
+            with open(DEP_JSON, encoding='utf-8') as dep_file:
+                dep_json = freeze(json.load(dep_file))
         except Exception as e:
-            self.logger.log(LogLevel.FATAL, "Error while loading in json dependency file. Please check the .env to make sure the location is correct and try again.\n\n" + str(e) + "\n")
-        self.train_mode = train_mode
-        api = copy.deepcopy(self.api_yaml)
-        self.allowed_supplies = copy.deepcopy(api['components']['schemas']['SupplyTypeEnum']['enum'])
-        if not self.train_mode:
-            for x in self.dep_json['trainingOnlySupplies']:
-                self.allowed_supplies.remove(x)
+            raise ValidationError("Error while loading in json dependency file. Please check the .env to make sure the location is correct and try again.\n\n" + str(e) + "\n") from e
+        cls.api_yaml, cls.api_schema, cls.state_changes_yaml, cls.state_schema, cls.dep_json = api_yaml, api_schema, state_changes_yaml, state_schema, dep_json
+        if cache_key is not None:
+            schema_cache.save(CACHE_FILE, cache_key, (api_yaml, api_schema, state_changes_yaml, state_schema, dep_json))
 
-        for character in self.loaded_yaml.get('state', {'characters': []}).get('characters', []):
-            if character.get('has_blanket', False):
-                self.invalid_keys += 1 
-                self.logger.log(LogLevel.ERROR, f"Blankets can't appear on characters at startup but '{character.get('id')}' has 'has_blanket' set to True.")
 
-        self.branches = self.find_all_branch_segments(copy.deepcopy(self.loaded_yaml))
+    def read_scenario(self, file):
+        '''
+        Loads the scenario from its open file, keeping where each part of it is for the findings
+        '''
+        document, self.source = parse_scenario(file)
+        return document
 
 
     def __del__(self):
@@ -100,225 +280,148 @@ class YamlValidator:
         self.logger.log(LogLevel.DEBUG, "Program closing...")
         if (self.file):
             self.file.close()
-        if (self.api_file):
-            self.api_file.close()
-        if (self.state_change_file):
-            self.state_change_file.close()
-        if (self.dep_file):
-            self.dep_file.close()
-        if (self.dup_check_file):
-            self.dup_check_file.close()
-
-
-    def remove_duplicate_sublists(self, lst_of_lsts):
-        '''
-        Given a list of lists, reduces it to only one of each sublist (same length, same order, same elements)
-        '''
-        def find_el_in_list(lst, el):
-            inds_where_found = []
-            for ind in range(len(lst)):
-                x = lst[ind]
-                if len(x) == len(el):
-                    found_match = True
-                    for i in range(len(x)):
-                        if x[i] != el[i]:
-                            found_match = False
-                            break
-                    if found_match:
-                        inds_where_found.append(ind)
-            return inds_where_found
-        
-        new_lst_of_lsts = []
-        for p in lst_of_lsts:
-            if len(p) > 0:
-                inds = find_el_in_list(lst_of_lsts, p)
-                try:
-                    new_lst_of_lsts.index(lst_of_lsts[inds[0]])
-                except:
-                    new_lst_of_lsts.append(lst_of_lsts[inds[0]])
 
-        return new_lst_of_lsts
-    
 
-    def do_lists_match(self, lst1, lst2):
+    def report(self, rule, severity, category, template, scene=None, path=None, at=None, **args):
         '''
-        Check if two lists have the same elements in the same order
+        Reports a finding: counts it towards its category (if it has one) and hands it to the sink.
+        The message is the template formatted with args, and is only rendered if the sink needs it.
+        The scene and path can be given as the location (tuple) the finding is at instead.
         '''
-        if len(lst1) == len(lst2):
-            for i in range(len(lst1)):
-                if lst1[i] != lst2[i]:
-                    return False
-            return True
-        return False
+        if at is not None:
+            scene = self.scene_at(at)
+            path = format_location(at)
+        self.record(Diagnostic(rule, severity, category, template, args, scene=scene, path=path, file=self.filename, source=self.source))
 
 
-    def remove_covered_sublists(self, list_of_lists):
+    def record(self, diagnostic):
         '''
-        We don't need every possible sublist in our branches. This function looks through all the branching lists
-        and removes any sublist that is already covered by a bigger list. This will also remove any duplicate branch paths
+        Counts a finding towards its category (if it has one) and hands it to the sink.
+        Raises ErrorLimitReached once the error limit (if any) is reached.
         '''
-        list_of_lists.sort(key=len, reverse=True)        
-        result = []
-        # go through the branches in descending length order
-        for sublist in list_of_lists:
-            # see if the list is already recorded in result. If not, add it!
-            if not any(self.do_lists_match(sublist, sublist_covered[:len(sublist)]) for sublist_covered in result):
-                result.append(sublist)
-        
-        return result
+        if diagnostic.category is not None:
+            counter = 'warning_count' if diagnostic.category == WARNINGS else diagnostic.category
+            setattr(self, counter, getattr(self, counter) + 1)
+        self.sink.emit(diagnostic)
+        if self.max_errors is not None and diagnostic.category in ERROR_CATEGORIES:
+            if sum(getattr(self, c) for c in ERROR_CATEGORIES) >= self.max_errors:
+                self.stopped = True
+                raise ErrorLimitReached()
 
 
-    def find_all_branch_segments(self, data):
+    def counts(self):
         '''
-        Creates and returns a list of all scene branches.
+        Returns the number of findings in each category
         '''
-        paths = self.get_branches_from_scene(data, self.determine_first_scene(data)['id'])
-        scenes = data['scenes']
-        if len(scenes) == 1:
-            paths.append([scenes[0]['id']])
-        # remove duplicates (same order, same elements)
-        return self.remove_covered_sublists(paths)
+        return {
+            MISSING_KEYS: self.missing_keys,
+            WRONG_TYPES: self.wrong_types,
+            INVALID_KEYS: self.invalid_keys,
+            INVALID_VALUES: self.invalid_values,
+            OUT_OF_RANGE: self.out_of_range,
+            EMPTY_LEVELS: self.empty_levels,
+            WARNINGS: self.warning_count
+        }
 
 
-    def get_branches_from_scene(self, data, scene_id, path=[]):
+    def scene_at(self, location):
         '''
-        Given a starting scene_id, updates the path with branches
-        that can be taken from that scene
+        Returns the id of the scene a location (tuple) is inside of, if any
         '''
-        paths = []
-        scene = self.get_scene_by_id(scene_id)
-        next_scene_id = None
-        if type(scene_id) is int and int(scene_id) >= 0:
-            next_scene_id = int(scene_id) + 1
-            if self.get_scene_by_id(next_scene_id) is None:
-                next_scene_id = None
-        default_next = scene.get('next_scene', next_scene_id) 
-        scenes_to_investigate = []
-        for a in scene['action_mapping']:
-            next_scene = a.get('next_scene', default_next)
-            scenes_to_investigate.append(next_scene)
-        scenes_to_investigate = list(set(scenes_to_investigate))
-        for next_scene in scenes_to_investigate:
-            action_path = copy.deepcopy(path)
-            if action_path.count(next_scene) < 2 and (len(action_path) == 0 or action_path[-1] != next_scene):
-                if len(action_path) == 0:
-                    # no two of the same scene in a row (doesn't affect anything logically)
-                    if next_scene != scene_id:
-                        action_path = [scene_id, next_scene]
-                    else:
-                        action_path = [scene_id]
-                else:
-                    if action_path[-1] != next_scene:
-                        action_path.append(next_scene)
-                paths.append(path)
-                if next_scene is not None:
-                    paths += self.get_branches_from_scene(data, next_scene, action_path)
-            else:
-                paths.append(path)
-        if len(scenes_to_investigate) == 0:
-            paths.append(path)
-        return paths
-    
+        if len(location) > 1 and location[0] == 'scenes' and isinstance(location[1], int):
+            scene = lookup(self.loaded_yaml, location[:2])
+            if isinstance(scene, dict):
+                return scene.get('id')
+        return None
+
 
     def validate_field_names(self):
         '''
         Ensures all fields are supported by the API
         '''
         # start by checking the top level
-        schema = self.api_yaml['components']['schemas']
-        top_level = schema['Scenario']['properties']
-        required = schema['Scenario']['required'] if 'required' in schema['Scenario'] else []
-        self.validate_one_level('top', self.loaded_yaml, top_level, required, self.api_yaml)
+        self.validate_one_level('top', self.loaded_yaml, self.api_schema.schema('Scenario'), location=())
 
 
-    def validate_one_level(self, level_name, to_validate, type_obj, required, api_yaml, persist_characters=False, override_required=False):
+    def validate_one_level(self, level_name, to_validate, type_node, persist_characters=False, override_required=False, location=()):
         '''
-        Takes in an object to validate (to_validate) and the yaml schema describing the 
-        expected types (type_obj)
+        Takes in an object to validate (to_validate) and the compiled schema node describing the 
+        expected types (type_node). location is where to_validate is in the yaml file.
         '''
-        found_keys = []
+        found_keys = set()
+        properties = type_node.properties
+        required = type_node.required_keys
         
         # do not require characters if persist_characters is true
         if level_name == 'scenes':
             persist_characters = to_validate.get('persist_characters')
         if level_name == 'Scenes/State' and persist_characters:
-            if 'characters' in required:
-                required.remove('characters')
+            required = required - {'characters'}
 
         if level_name == 'supplies':
-            if to_validate.get('type') not in self.allowed_supplies and to_validate.get('quantity') > 0:
-                self.logger.log(LogLevel.ERROR, f"Since eval mode is true, supplies must only be one of {self.allowed_supplies}, but '{to_validate.get('type')}' was found.")
-                self.invalid_values += 1
+            if not contains(self.allowed_supply_values, to_validate.get('type')) and to_validate.get('quantity') > 0:
+                self.report('eval-supply', LogLevel.ERROR, INVALID_VALUES, "Since eval mode is true, supplies must only be one of {allowed}, but '{supply}' was found.", at=location + ('type',), allowed=self.allowed_supplies, supply=to_validate.get('type'))
 
         # see if an object is empty (and if it's allowed to be)
         if to_validate == None and len(required) == 0:
             return True
         elif to_validate == None and len(required) > 0:
-            self.logger.log(LogLevel.ERROR, "Level '" + level_name + "' is empty but must contain keys " + str(required))
-            self.empty_levels += 1
+            self.report('empty-level', LogLevel.ERROR, EMPTY_LEVELS, "Level '{level}' is empty but must contain keys {required}", at=location, level=level_name, required=[r for r in type_node.required if r in required])
             return False
         
         # loop through keys to check each value against expectations
         for key in to_validate:
+            key_location = location + (key,)
             # make sure it is a valid key
-            if key not in type_obj:
-                self.logger.log(LogLevel.ERROR, "'" + key + "' is not a valid key at the '" + level_name + "' level of the yaml file. Allowed keys are " + str(list(type_obj.keys())))
-                self.invalid_keys += 1
+            if key not in properties:
+                self.report('invalid-key', LogLevel.ERROR, INVALID_KEYS, "'{key}' is not a valid key at the '{level}' level of the yaml file. Allowed keys are {allowed}", at=key_location, key=key, level=level_name, allowed=type_node.allowed_keys)
             else:
                 # begin type-checking
-                this_key_data = type_obj[key]
+                key_node = properties[key]
                 # check for the 'type' property - otherwise it might only have a $ref
-                if 'type' in this_key_data:
-                    key_type = type_obj[key]['type']
+                if key_node.type is not None:
+                    key_type = key_node.type
                     # Basic types listed in PRIMITIVE_TYPE_MAP
                     if key_type in PRIMITIVE_TYPE_MAP:
-                        self.validate_primitive(to_validate[key], key_type, key, level_name, type_obj[key], override_required=override_required)
+                        self.validate_primitive(to_validate[key], key_type, key, level_name, key_node, override_required=override_required, location=key_location)
                     # check for objects (key:value pairs)
                     elif key_type == 'object':
-                        if 'additionalProperties' in type_obj[key]:
-                            self.validate_additional_properties(type_obj[key], to_validate[key], key, level_name, api_yaml)
+                        if key_node.additional is not None:
+                            self.validate_additional_properties(key_node, to_validate[key], key, level_name, location=key_location)
                         else:
-                            self.logger.log(LogLevel.FATAL, "API error: Missing additionalProperties on '" + key + "' object at the '" + level_name + "' level. Please contact TA3 for assistance.")
-                            return False
+                            raise ValidationError("API error: Missing additionalProperties on '" + key + "' object at the '" + level_name + "' level. Please contact TA3 for assistance.")
                         
                     elif key_type == 'array':
-                        self.validate_array(to_validate[key], key, level_name, key_type, type_obj, api_yaml)
+                        self.validate_array(to_validate[key], key, level_name, key_type, key_node, location=key_location)
                     else:
-                        self.logger.log(LogLevel.FATAL, "API error: Unhandled validation for type '" +  key_type + "' at the " + level_name + "' level. Please contact TA3 for assistance.")
-                        return False
+                        raise ValidationError("API error: Unhandled validation for type '" +  key_type + "' at the " + level_name + "' level. Please contact TA3 for assistance.")
                         
                 # check deep objects (more than simple key-value)
-                elif '$ref' in this_key_data:
-                    # get the ref type and check that location (skip starting hashtag)
-                    location = type_obj[key]['$ref'].split('/')[1:]
-                    if level_name == 'scenes' and location[len(location)-1] == 'State':
+                elif key_node.ref is not None:
+                    if level_name == 'scenes' and key_node.ref_name == 'State':
                         # state at the scenes level should follow state_changes.yaml
-                        self.validate_state_change(to_validate[key], persist_characters)
+                        self.validate_state_change(to_validate[key], persist_characters, location=key_location)
                     else:
-                        ref_loc = api_yaml
-                        # access the currect location to get the type map
-                        for x in location:
-                            ref_loc = ref_loc[x]
-                        if 'enum' in ref_loc:
-                            self.validate_enum(ref_loc, key, level_name, to_validate[key], override_required=override_required)
+                        # the ref was resolved when the schema was compiled
+                        ref_node = key_node.target
+                        if ref_node.enum is not None:
+                            self.validate_enum(ref_node, key, level_name, to_validate[key], override_required=override_required, location=key_location)
                         elif isinstance(to_validate[key], dict):
                             # if character's unseen property is True, vitals are not required
                             override_req_properties = False
                             if key == 'vitals':
                                 override_req_properties = to_validate.get('unseen', False)
-                            self.validate_object(to_validate[key], ref_loc, key, level_name, type_obj[key]['$ref'], api_yaml, override_req_properties)
+                            self.validate_object(to_validate[key], ref_node, key, level_name, key_node.ref, override_req_properties, location=key_location)
                         else:
-                            self.log_wrong_type(key, level_name, location[len(location)-1], type(to_validate[key]))
+                            self.log_wrong_type(key, level_name, key_node.ref_name, type(to_validate[key]), location=key_location)
                 else:
-                    self.logger.log(LogLevel.FATAL, "API Error: Key '" + key + "' at level '" + level_name + "' has no defined type or reference. Please contact TA3 for assistance.")
-                    return False
-            found_keys.append(key)
+                    raise ValidationError("API Error: Key '" + key + "' at level '" + level_name + "' has no defined type or reference. Please contact TA3 for assistance.")
+            found_keys.add(key)
         # check for missing keys
-        for key in type_obj:
+        for key in properties:
             if key not in found_keys:
                 if not override_required and (key in required):
-                    self.logger.log(LogLevel.ERROR, "Required key '" + key + "' at level '" + level_name + "' is missing in the yaml file.")
-                    self.missing_keys += 1
+                    self.report('missing-required-key', LogLevel.ERROR, MISSING_KEYS, "Required key '{key}' at level '{level}' is missing in the yaml file.", at=location, key=key, level=level_name)
                 else:
                     self.logger.log(LogLevel.DEBUG, "Optional key '" + key + "' at level '" + level_name + "' is missing in the yaml file.")
         
@@ -326,43 +429,31 @@ class YamlValidator:
             if 'injuries' in to_validate:
                 injury_count = sum(1 for injury in to_validate['injuries'] if injury['name'] not in ['Ear Bleed', 'Asthmatic', 'Internal'] and 'Broken' not in injury['name'])
                 if injury_count > 8 and not self.train_mode:
-                    self.logger.log(LogLevel.ERROR, f"Character '{to_validate.get('name')}' has {injury_count} 'masked' injuries (punctures, lacerations, burns), which exceeds the maximum of 8 allowed in the simulation.")
+                    self.report('too-many-masked-injuries', LogLevel.ERROR, None, "Character '{character}' has {count} 'masked' injuries (punctures, lacerations, burns), which exceeds the maximum of 8 allowed in the simulation.", at=location + ('injuries',), character=to_validate.get('name'), count=injury_count)
     
 
     def determine_first_scene(self, data):
         '''
         Determine the first scene, either from 'first_scene' or the first in the scenes list.
         '''
-        scenes = data.get('scenes', [])
-        first_scene_id = data['first_scene'] if 'first_scene' in data else None
-        
-        if first_scene_id is None:
-            return scenes[0]
-        else:
-            return self.get_scene_by_id(first_scene_id)
+        if data is self.loaded_yaml:
+            return self.scene_graph.first_scene
+        return SceneGraph(data).first_scene
         
 
     def get_scene_by_id(self, scene_id):
-        data = copy.deepcopy(self.loaded_yaml)
-        scenes = data.get('scenes', [])
-        for x in scenes:
-            if x['id'] == scene_id:
-                return x
-        return None
+        return self.scene_graph.get_scene(scene_id)
 
 
-    def validate_state_change(self, obj_to_validate, persist_characters=False):
+    def validate_state_change(self, obj_to_validate, persist_characters=False, location=()):
         '''
         Under Scenes in the API, state should be defined slightly differently.
         Use state_changes.yaml and perform as before.
         '''
-        schema = self.state_changes_yaml['components']['schemas']
-        top_level = schema['State']['properties']
-        required = schema['State']['required'] if 'required' in schema['State'] else []
-        return self.validate_one_level('Scenes/State', obj_to_validate, top_level, required, self.state_changes_yaml, persist_characters)
+        return self.validate_one_level('Scenes/State', obj_to_validate, self.state_schema.schema('State'), persist_characters, location=location)
 
 
-    def validate_enum(self, type_obj, key, level, item, override_required=False):
+    def validate_enum(self, type_node, key, level, item, override_required=False, location=()):
         '''
         Accepts as parameters the object that describes expected types, 
         the key of the object, the level we're looking at, and the value 
@@ -371,128 +462,116 @@ class YamlValidator:
         is_valid = True
         # we are expecting a string here (will this ever be an int/float?)
         if isinstance(item, str):
-                allowed = type_obj['enum']
-                if item not in allowed:
-                    self.logger.log(LogLevel.ERROR, "Key '" + key + "' at level '" + level + "' must be one of the following values: " + str(allowed) + " but is '" + item + "' instead.")
-                    self.invalid_values += 1
+                allowed = type_node.enum
+                if item not in type_node.enum_values:
+                    self.report('enum-value', LogLevel.ERROR, INVALID_VALUES, "Key '{key}' at level '{level}' must be one of the following values: {allowed} but is '{value}' instead.", at=location, key=key, level=level, allowed=allowed, value=item)
                     is_valid = False
         else:
             if not (override_required and type(item) == type(None)):
-                self.log_wrong_type(key, level, str(str), type(item))
+                self.log_wrong_type(key, level, str(str), type(item), location=location)
                 is_valid = False 
         return is_valid
 
 
-    def validate_object(self, item, location, key, level, ref_name, api_yaml, override_required=False):
+    def validate_object(self, item, ref_node, key, level, ref_name, override_required=False, location=()):
         '''
-        Checks if an item matches the reference location. The reference location
-        may reference a full object, small object, or enum. Checks all 3 possibilities.
+        Checks if an item matches the referenced schema node. The reference
+        may be a full object, small object, or enum. Checks all 3 possibilities.
         '''
         # check large object
-        if 'properties' in location:
-            self.validate_one_level(key, item, location['properties'], location['required'] if 'required' in location else [], api_yaml, override_required=override_required)
+        if ref_node.properties is not None:
+            self.validate_one_level(key, item, ref_node, override_required=override_required, location=location)
         # check small object
-        elif 'additionalProperties' in location:
-            self.validate_additional_properties(location, item, key, level, api_yaml)
+        elif ref_node.additional is not None:
+            self.validate_additional_properties(ref_node, item, key, level, location=location)
         # check enum
-        elif 'enum' in location:
-            self.validate_enum(location, key, level, item)
+        elif ref_node.enum is not None:
+            self.validate_enum(ref_node, key, level, item, location=location)
         else:
-            self.logger.log(LogLevel.FATAL, "API missing enum, property, or additional properties for '" + ref_name + "'. Cannot parse. Please contact TA3 for assistance.")
+            raise ValidationError("API missing enum, property, or additional properties for '" + ref_name + "'. Cannot parse. Please contact TA3 for assistance.")
     
 
-    def validate_additional_properties(self, type_obj, item, key, level, api_yaml):
+    def validate_additional_properties(self, type_node, item, key, level, location=()):
         '''
-        Accepts an object that describes the type we're looking for and an item to validate
+        Accepts a schema node that describes the type we're looking for and an item to validate
         '''
-        if 'type' in type_obj['additionalProperties']:
-            val_type = type_obj['additionalProperties']['type']
+        additional = type_node.additional
+        if additional.type is not None:
+            val_type = additional.type
             # two types of objects exist: 1. list of key-value 
             if isinstance(item, list):
-                for pair_set in item:
+                for i, pair_set in enumerate(item):
                     for k in pair_set:
                         if not self.do_types_match(pair_set[k], PRIMITIVE_TYPE_MAP[val_type]):
-                            self.log_wrong_type(k, level, val_type, type(pair_set[k]))
+                            self.log_wrong_type(k, level, val_type, type(pair_set[k]), location=location + (i, k))
             # 2. object with key-value
             else:
                 if isinstance(item, dict):
                     for k in item:
                         if not self.do_types_match(item[k], PRIMITIVE_TYPE_MAP[val_type]):
-                            self.log_wrong_type(k, level, val_type, type(item[k]))
+                            self.log_wrong_type(k, level, val_type, type(item[k]), location=location + (k,))
                 else:
-                    self.log_wrong_type(key, level, 'object', type(item))
-        elif '$ref' in type_obj['additionalProperties']:
-            location = type_obj['additionalProperties']['$ref'].split('/')[1:]
-            ref_loc = api_yaml
-            for x in location:
-                ref_loc = ref_loc[x]
+                    self.log_wrong_type(key, level, 'object', type(item), location=location)
+        elif additional.ref is not None:
             if isinstance(item, list):
-                for pair_set in item:
+                for i, pair_set in enumerate(item):
                     for k in pair_set:
-                        self.validate_object(pair_set[k], ref_loc, key, level, type_obj['additionalProperties']['$ref'], api_yaml)
+                        self.validate_object(pair_set[k], additional.target, key, level, additional.ref, location=location + (i, k))
             else:
                 if isinstance(item, dict):
                     for k in item:
-                        self.validate_object(item[k], ref_loc, key, level, type_obj['additionalProperties']['$ref'], api_yaml)
+                        self.validate_object(item[k], additional.target, key, level, additional.ref, location=location + (k,))
                 else:
-                    self.log_wrong_type(key, level, 'object', type(item))
+                    self.log_wrong_type(key, level, 'object', type(item), location=location)
         else:
-            self.logger.log(LogLevel.FATAL, "API Error: Additional Properties must either have a type or ref, but at level '" + level + "' for property '" + key + "' it does not. Please contact TA3 for assistance.")
-            return 
+            raise ValidationError("API Error: Additional Properties must either have a type or ref, but at level '" + level + "' for property '" + key + "' it does not. Please contact TA3 for assistance.")
 
 
-    def validate_array(self, item, key, level, key_type, typed_keys, api_yaml):
+    def validate_array(self, item, key, level, key_type, array_node, location=()):
         '''
         Looks at an array and ensures that each item in the array matches expectations
         '''
         if not isinstance(item, list):
-            self.log_wrong_type(key, level, key_type, type(item))
+            self.log_wrong_type(key, level, key_type, type(item), location=location)
         else:
             # get type of item in array and check that each item matches
-            item_type = typed_keys[key]['items']
-            # check complex object types 
-            if '$ref' in item_type:
-                location = item_type['$ref'].split('/')[1:]
-                ref_loc = api_yaml
-                for x in location:
-                    ref_loc = ref_loc[x]
-                for i in item:
-                    self.validate_object(i, ref_loc, key, level, typed_keys[key]['items']['$ref'], api_yaml)
+            item_type = array_node.items
+            # check complex object types; the item ref is resolved once for every element
+            if item_type.ref is not None:
+                for index, i in enumerate(item):
+                    self.validate_object(i, item_type.target, key, level, item_type.ref, location=location + (index,))
             # check basic types
-            elif 'type' in item_type:
-                expected = item_type['type']
+            elif item_type.type is not None:
+                expected = item_type.type
                 if expected in PRIMITIVE_TYPE_MAP:
-                    for i in item:
-                        self.validate_primitive(i, expected, key, level, item_type)
+                    for index, i in enumerate(item):
+                        self.validate_primitive(i, expected, key, level, item_type, location=location + (index,))
             else:
-                self.logger.log(LogLevel.FATAL, "API Error: Missing type definition or reference at level '" + level + "' for property '" + key + "'. Please contact TA3 for assistance.")
-                return
+                raise ValidationError("API Error: Missing type definition or reference at level '" + level + "' for property '" + key + "'. Please contact TA3 for assistance.")
     
 
-    def validate_primitive(self, item, expected_type, key, level, type_obj, override_required=False):
+    def validate_primitive(self, item, expected_type, key, level, type_node, override_required=False, location=()):
         '''
         Looks at an object against an expected primitive type to see if it matches
         '''
         is_valid = True 
         # first validate enums
-        if PRIMITIVE_TYPE_MAP[expected_type] == str and 'enum' in type_obj:
-            if not self.validate_enum(type_obj, key, level, item, override_required=override_required):
+        if PRIMITIVE_TYPE_MAP[expected_type] == str and type_node.enum is not None:
+            if not self.validate_enum(type_node, key, level, item, override_required=override_required, location=location):
                 is_valid = False
         # then validate the rest
         elif not self.do_types_match(item, PRIMITIVE_TYPE_MAP[expected_type]):
             if not(type(item) == type(None) and override_required):
-                self.log_wrong_type(key, level, expected_type, type(item))
+                self.log_wrong_type(key, level, expected_type, type(item), location=location)
                 is_valid = False
         if is_valid:
             # check for min/max only if type is valid
-            if 'minimum' in type_obj:
-                if item < type_obj['minimum']:
-                    self.logger.log(LogLevel.ERROR, "Key '" + key + "' at level '" + level + "' has a minimum of " + str(type_obj['minimum']) + " but is " + str(item) + ". (" + str(item) + " < " + str(type_obj['minimum']) + ")")
-                    self.out_of_range += 1
-            if 'maximum' in type_obj:
-                if item > type_obj['maximum']:
-                    self.logger.log(LogLevel.ERROR, "Key '" + key + "' at level '" + level + "' has a maximum of " + str(type_obj['maximum']) + " but is " + str(item) + ". (" + str(item) + " > " + str(type_obj['maximum']) + ")")
-                    self.out_of_range += 1
+            if type_node.minimum is not None:
+                if item < type_node.minimum:
+                    self.report('below-minimum', LogLevel.ERROR, OUT_OF_RANGE, "Key '{key}' at level '{level}' has a minimum of {minimum} but is {value}. ({value} < {minimum})", at=location, key=key, level=level, minimum=type_node.minimum, value=item)
+            if type_node.maximum is not None:
+                if item > type_node.maximum:
+                    self.report('above-maximum', LogLevel.ERROR, OUT_OF_RANGE, "Key '{key}' at level '{level}' has a maximum of {maximum} but is {value}. ({value} > {maximum})", at=location, key=key, level=level, maximum=type_node.maximum, value=item)
 
 
     def do_types_match(self, item, type):
@@ -502,12 +581,14 @@ class YamlValidator:
         return isinstance(item, type) or (type == float and isinstance(item, int)) or (type == str and (isinstance(item, float) or isinstance(item, int)))
 
 
-    def log_wrong_type(self, key, level, expected, actual):
+    def log_wrong_type(self, key, level, expected, actual, location=None):
         '''
         Logs when an incorrect type is found for a key
         '''
-        self.logger.log(LogLevel.ERROR, "Key '" + key + "' at level '" + level + "' should be type '" + expected + "' but is " + str(actual) + " instead.")
-        self.wrong_types += 1
+        if actual in (FrozenDict, FrozenList):
+            # report read-only containers as the plain types the author wrote
+            actual = actual.__base__
+        self.report('wrong-type', LogLevel.ERROR, WRONG_TYPES, "Key '{key}' at level '{level}' should be type '{expected}' but is {actual} instead.", at=location, key=key, level=level, expected=expected, actual=actual)
     
 
     def validate_file_location(self, filename):
@@ -516,44 +597,44 @@ class YamlValidator:
         and that the file is found. Returns the open binary file object.
         '''
         if not filename:
-            self.logger.log(LogLevel.FATAL, "No filename received. To run, please use 'python3 validator.py -f [filename]'")
+            raise ValidationError("No filename received. To run, please use 'python3 validator.py -f [filename]'")
         if not filename.strip().endswith('.yaml'):
-            self.logger.log(LogLevel.FATAL, "File must be a yaml file.")
+            raise ValidationError("File must be a yaml file.")
         try:
             f = open(filename, 'r', encoding='utf-8')
             return f
         except:
-            self.logger.log(LogLevel.FATAL, "Could not open file " + filename + ". Please make sure the path is valid and the file exists.")
+            raise ValidationError("Could not open file " + filename + ". Please make sure the path is valid and the file exists.")
 
 
-    def validate_dependencies(self):
+    def validate_dependencies(self, jobs=None):
         '''
         Checks the yaml file against the dependency requirements to check for 
-        additional required/ignored fields and specific value requirements
-        '''
-        self.simple_requirements()
-        self.conditional_requirements()
-        self.conditional_forbid()
-        self.simple_value_matching()
-        self.deep_links()
-        self.value_follows_list()
-        self.require_unstructured()
-        self.scenes_with_state()
-        self.validate_action_params()
-        self.validate_mission_importance()
-        self.character_matching()
-        self.verify_uniqueness()
-        self.verify_allowed_actions()
-        self.check_first_scene()
-        self.is_pulse_oximeter_configured()
-        self.check_scene_env_type()
-        self.validate_pretreated_injuries()
-        self.validate_unseen_character_actions()
-        self.validate_aid_ids()
-        self.validate_events()
-        self.validate_messages()
-        self.are_all_scenes_reachable()
-        self.validate_quantized_support()
+        additional required/ignored fields and specific value requirements.
+        If jobs is more than 1, the checks run concurrently over that many processes.
+        '''
+        # find the matches of every rule path in one walk; the checks below only read them
+        self.queries.prefetch(self.dependency_paths())
+        # with an error limit the checks run in order, so the ones after the limit are skipped
+        if jobs is not None and jobs > 1 and self.max_errors is None and scheduler.can_run_concurrently():
+            scheduler.run_checks(self, self.dependency_checks, jobs)
+            return
+        for check in self.dependency_checks:
+            getattr(self, check)()
+
+
+    def dependency_paths(self):
+        '''
+        Returns every path the dependency rules search the yaml file for
+        '''
+        paths = []
+        for rule in ['simpleRequired', 'conditionalRequired', 'conditionalForbid', 'simpleAllowedValues', 'deepLinks', 'valueMatch', 'unique']:
+            paths += list(self.dep_json[rule])
+        paths += list(self.dep_json['valueMatch'].values())
+        paths += [scope for scope in self.dep_json['unique'].values() if scope != ""]
+        paths += self.dep_json['characterMatching']
+        paths += [FIRST_SCENE_CHARACTERS, SCENE_CHARACTERS, REMOVED_CHARACTERS]
+        return paths
 
 
     def validate_quantized_support(self):
@@ -561,7 +642,7 @@ class YamlValidator:
         Flag if treatments_required > 1 for unsupported injures.
         In general, these are injuries that aren't successfully treated by hemostatic gauze or pressure bandage.
         '''
-        data = copy.deepcopy(self.loaded_yaml)
+        data = self.loaded_yaml
         self.validate_quantized_support_in_characters(data['state']['characters'])
 
         for scene in data['scenes']:
@@ -578,8 +659,7 @@ class YamlValidator:
                     location = injury['location']
                     # look for an injury type that doesn't support quantized injuries
                     if required > 1 and not self.supports_quantized_injury(type, location):
-                        self.logger.log(LogLevel.ERROR, f"Injuries requiring multiple treatments are only supported when the injury is treated by hemostatic gauze or pressure bandage, but not '{type}' injuries at '{location}' location in character '{character['id']}'.")
-                        self.invalid_values += 1
+                        self.report('unsupported-quantized-injury', LogLevel.ERROR, INVALID_VALUES, "Injuries requiring multiple treatments are only supported when the injury is treated by hemostatic gauze or pressure bandage, but not '{injury}' injuries at '{location}' location in character '{character}'.", injury=type, location=location, character=character['id'])
 
 
     def supports_quantized_injury(self, injury_type, location):
@@ -603,76 +683,32 @@ class YamlValidator:
         If field 1 is provided, then field2 is required
         '''
         for req in self.dep_json['simpleRequired']:
-            loc = req.split('.')
-            all_found = self.property_meets_conditions(loc, copy.deepcopy(self.loaded_yaml))
+            query = compile_path(req)
+            all_found = self.property_meets_conditions(req, self.loaded_yaml)
             for x in all_found:
-                found = x.split('.')
-                if found[len(found)-1] != loc[len(loc)-1]:
+                if not query.ends_at_key(x.location):
                     # possible that we thought we found a key but didn't. if so, skip
                     continue 
                 else:
                     # start searching for the key(s) that is/are required now that the first key has been found
-                    self.search_for_key(True, found, self.dep_json['simpleRequired'][req], "has been provided")
+                    self.search_for_key('simple-required', True, x.location, self.dep_json['simpleRequired'][req], "has been provided")
 
 
-    def property_meets_conditions(self, first_key_list, data, value='', length=-1, exists=True, loc=[]):
+    def property_meets_conditions(self, path, data, value='', length=-1, exists=True):
         '''
-        Accepts a list of deepening keys to search through, where
+        Accepts a dotted path (e.g. scenes[].state.characters[].id), where
         the last key is the key to find if it exists in data.
         Then checks if certain conditions are met.
-        Returns the paths of the found keys that meet conditions.
-        '''
-        if len(loc) == 0:
-            loc = first_key_list
-        found_indices = []
-        skip = False
-        for i in range(len(first_key_list)):
-            k = first_key_list[i]
-            # check through each element of the array for keys
-            if '[]' in k:
-                simple_k = k.split('[]')[0]
-                if data is not None and simple_k in data:
-                    data = data[simple_k]
-                    data = data if data is not None else []
-                    for j in range(len(data)):
-                        # add in indices where keys were found
-                        if (isinstance(data, object) and j in data) or isinstance(data, list):
-                            detailed_k = simple_k + '[' + str(j) + ']'
-                            found_indices += (self.property_meets_conditions(first_key_list[i+1:], data[j], value=value, length=length, exists=exists, loc='.'.join(loc).replace(k, detailed_k).split('.')))
-                else:
-                    # key is not here, don't keep searching
-                    skip = True
-                    break
-            else:
-                if data is not None and k in data:
-                    data = data[k]
-                else:
-                    # key is not here, don't keep searching
-                    skip = True
-                    break
-        if not skip and exists:
-            valid = True
-            # check for specific value
-            if value != '':
-                if str(data) != str(value):
-                    valid = False 
-            # check for array length
-            if length > -1:
-                if len(data) < length:
-                    valid = False
-            if valid:
-                found_indices.append('.'.join(loc))
-        elif skip and not exists:
-            # key did not exist and we didn't want it to
-            loc = '.'.join(loc)
-            if '[]'  not in loc:
-                found_indices.append(loc)
-        return found_indices
-
-
-    def search_for_key(self, should_find, found, expected_required, explanation, expected_val=[], log_level='error'):
+        Returns a Match (concrete location and node) for each found key that meets conditions.
+        '''
+        queries = self.queries if data is self.loaded_yaml else DocumentQueries(data)
+        return queries.find(path, value=value, length=length, exists=exists)
+
+
+    def search_for_key(self, rule, should_find, found, expected_required, explanation, expected_val=[], log_level='error'):
         '''
         Searches for a key that is either required or ignored based on the additional dependencies. 
+        @param rule is the id of the dependency rule reported with any finding
         @param should_find is a boolean of if we need this key or don't need this key
         @param found is the list of locations where the original key was found that
         forced this key to be required or not. 
@@ -681,65 +717,56 @@ class YamlValidator:
         @param explanation is a string explanation of why the key is expected (or not), in case of an error
         @param expected_val is a list of possible/allowed expected values for each key found, if applicable
         '''
+        found_path = format_location(found)
+        scene_id = self.scene_at(found)
+        # pair each key of the found location with its index, if it has one
+        found_keys = []
+        for part in found:
+            if isinstance(part, str):
+                found_keys.append([part, None])
+            else:
+                found_keys[-1][1] = part
         for required in expected_required:
             # go through the path to the location we found and the requirement
             # side-by-side as long as possible
-            required = required.split('.')
-            data = copy.deepcopy(self.loaded_yaml)
-            earlyExit = False
-            for i in range(min(len(found), len(required))):
-                if found[i].split('[')[0] == required[i].split('[')[0]:
-                    # they are the same!
-                    if '[]' in required[i]:
-                        # handle arrays
-                        ind = int(found[i].split('[')[1].replace(']', ''))
-                        data = data[required[i].split('[]')[0]][ind] 
-                    else:
-                        # handle non-arrays
-                        data = data[required[i]]
-                else:
-                    # difference found, break
-                    required = required[i:]
-                    earlyExit = True
-                    break
-            if not earlyExit:
-                required = required[i+1:]
+            steps = compile_path(required).steps
+            data = self.loaded_yaml
+            i = 0
+            while i < min(len(found_keys), len(steps)) and found_keys[i][0] == steps[i][0]:
+                # they are the same!
+                key, is_array = steps[i]
+                # arrays use the index from the found location
+                data = data[key][found_keys[i][1]] if is_array else data[key]
+                i += 1
             # look through data for required
             found_key = True
-            for k in required:
-                if '[]' in k:
-                    self.logger.log(LogLevel.FATAL, "No index provided for required key '" + k + "'. Cannot proceed.")
-                    return
+            for k, is_array in steps[i:]:
+                if is_array:
+                    raise ValidationError("No index provided for required key '" + k + "[]'. Cannot proceed.")
                 if k in data:
                     data = data[k]
                 else:
                     if should_find:
                         # we expected to find this key, error
                         if log_level == 'error':
-                            self.logger.log(LogLevel.ERROR, "Key '" + k + "' is required because '" + '.'.join(found) + "' " + explanation + ", but it is missing.")
-                            self.missing_keys += 1
+                            self.report(rule, LogLevel.ERROR, MISSING_KEYS, "Key '{key}' is required because '{found}' {explanation}, but it is missing.", scene=scene_id, path=found_path, key=k, found=found_path, explanation=explanation)
                         else:
-                            self.logger.log(LogLevel.WARN, "Key '" + k + "' is recommended because '" + '.'.join(found) + "' " + explanation + ", but it is missing.")
-                            self.warning_count += 1    
+                            self.report(rule, LogLevel.WARN, WARNINGS, "Key '{key}' is recommended because '{found}' {explanation}, but it is missing.", scene=scene_id, path=found_path, key=k, found=found_path, explanation=explanation)
                     else:
                         # otherwise, we did not want to find the key, so we're good here
                         found_key = False
                         break
             if should_find is not None and not should_find and found_key:
                 if log_level == 'error':
-                    self.logger.log(LogLevel.ERROR, "Key '" + k + "' is not allowed because '" + '.'.join(found) + "' " + explanation + ".")
-                    self.invalid_keys += 1
+                    self.report(rule, LogLevel.ERROR, INVALID_KEYS, "Key '{key}' is not allowed because '{found}' {explanation}.", scene=scene_id, path=found_path, key=k, found=found_path, explanation=explanation)
                 else:
-                    self.logger.log(LogLevel.WARN, "Key '" + k + "' is not expected because '" + '.'.join(found) + "' " + explanation + ".")
-                    self.warning_count += 1
+                    self.report(rule, LogLevel.WARN, WARNINGS, "Key '{key}' is not expected because '{found}' {explanation}.", scene=scene_id, path=found_path, key=k, found=found_path, explanation=explanation)
             elif found_key and len(expected_val) > 0:
                 if data not in expected_val:
                     if log_level == 'error':
-                        self.logger.log(LogLevel.ERROR, "Key '" + k + "' must have one of the following values " + str(expected_val) + " because '" + '.'.join(found) + "' " + explanation + ", but instead value is '" + str(data) + "'")
-                        self.invalid_values += 1
+                        self.report(rule, LogLevel.ERROR, INVALID_VALUES, "Key '{key}' must have one of the following values {allowed} because '{found}' {explanation}, but instead value is '{value}'", scene=scene_id, path=found_path, key=k, allowed=expected_val, found=found_path, explanation=explanation, value=data)
                     else:
-                        self.logger.log(LogLevel.WARN, "Key '" + k + "' was expected have one of the following values " + str(expected_val) + " because '" + '.'.join(found) + "' " + explanation + ", but instead value is '" + str(data) + "'")
-                        self.warning_count += 1
+                        self.report(rule, LogLevel.WARN, WARNINGS, "Key '{key}' was expected have one of the following values {allowed} because '{found}' {explanation}, but instead value is '{value}'", scene=scene_id, path=found_path, key=k, allowed=expected_val, found=found_path, explanation=explanation, value=data)
                     
 
     def conditional_requirements(self):
@@ -748,22 +775,21 @@ class YamlValidator:
         If field 1 is provided and meets a set of conditions, then field 2 is required
         '''
         for req in self.dep_json['conditionalRequired']:
-            loc = req.split('.')
+            query = compile_path(req)
             # there may be more than one if-else for each key, look through each
             for entry in self.dep_json['conditionalRequired'][req]:
                 value = entry['conditions']['value'] if 'value' in entry['conditions'] else ''
                 length = entry['conditions']['length'] if 'length' in entry['conditions'] else -1
                 exists = bool(entry['conditions']['exists']) if 'exists' in entry['conditions'] else True
                 log_level = entry.get('logLevel', 'error')
-                all_found = self.property_meets_conditions(loc, copy.deepcopy(self.loaded_yaml), value=value, exists=exists, length=length)
+                all_found = self.property_meets_conditions(req, self.loaded_yaml, value=value, exists=exists, length=length)
                 for x in all_found:
-                    found = x.split('.')
-                    if found[len(found)-1] != loc[len(loc)-1]:
+                    if not query.ends_at_key(x.location):
                         # possible that we thought we found a key but didn't. if so, skip
                         continue 
                     else:
                         # start searching for the key(s) that is/are required now that the first key has been found
-                        self.search_for_key(True, found, entry['required'], "meets conditions " + str(entry['conditions']), log_level=log_level)
+                        self.search_for_key('conditional-required', True, x.location, entry['required'], "meets conditions " + str(entry['conditions']), log_level=log_level)
 
 
     def conditional_forbid(self):
@@ -772,22 +798,21 @@ class YamlValidator:
         If field 1 is provided and meets a set of conditions, then field 2 should not be provided
         '''
         for req in self.dep_json['conditionalForbid']:
-            loc = req.split('.')
+            query = compile_path(req)
             # there may be more than one if-else for each key, look through each
             for entry in self.dep_json['conditionalForbid'][req]:
                 value = entry['conditions']['value'] if 'value' in entry['conditions'] else ''
                 length = entry['conditions']['length'] if 'length' in entry['conditions'] else -1
                 exists = bool(entry['conditions']['exists']) if 'exists' in entry['conditions'] else True
                 log_level = entry.get('logLevel', 'error')
-                all_found = self.property_meets_conditions(loc, copy.deepcopy(self.loaded_yaml), value=value, length=length, exists=exists)
+                all_found = self.property_meets_conditions(req, self.loaded_yaml, value=value, length=length, exists=exists)
                 for x in all_found:
-                    found = x.split('.')
-                    if found[len(found)-1] != loc[len(loc)-1]:
+                    if not query.ends_at_key(x.location):
                         # possible that we thought we found a key but didn't. if so, skip
                         continue 
                     else:
                         # start searching for the key(s) that is/are required now that the first key has been found
-                        self.search_for_key(False, found, entry['forbid'], "meets conditions " + str(entry['conditions']), log_level=log_level)
+                        self.search_for_key('conditional-forbid', False, x.location, entry['forbid'], "meets conditions " + str(entry['conditions']), log_level=log_level)
 
 
     def simple_value_matching(self):
@@ -796,27 +821,26 @@ class YamlValidator:
         If field1 equals value1, then field2 must be one of [...values]
         '''
         for field in self.dep_json['simpleAllowedValues']:
-            loc = field.split('.')
+            query = compile_path(field)
             # there may be more than one value for each key, look through each
             for val in self.dep_json['simpleAllowedValues'][field]:
                 # find every place where the field matches the value
-                all_found = self.property_meets_conditions(loc, copy.deepcopy(self.loaded_yaml), value=val)
+                all_found = self.property_meets_conditions(field, self.loaded_yaml, value=val)
                 for x in all_found:
-                    found = x.split('.')
-                    if found[len(found)-1] != loc[len(loc)-1]:
+                    if not query.ends_at_key(x.location):
                         # possible that we thought we found a key but didn't. if so, skip
                         continue 
                     else:
                         # start searching for the key(s) that need to match one of the provided values
                         for key in self.dep_json['simpleAllowedValues'][field][val]:
-                            self.search_for_key(None, found, [key], "is '" + val + "'", self.dep_json['simpleAllowedValues'][field][val][key])
+                            self.search_for_key('simple-allowed-values', None, x.location, [key], "is '" + val + "'", self.dep_json['simpleAllowedValues'][field][val][key])
 
 
     def require_unstructured(self):
         '''
         Within every scenes[].state, at least one unstructured field must be provided.
         '''
-        data = copy.deepcopy(self.loaded_yaml)
+        data = self.loaded_yaml
         i = 0
         for scene in data['scenes']:
             if 'state' in scene:
@@ -825,8 +849,7 @@ class YamlValidator:
                 found = self.find_unstructured(state)
                 if not found:
                     # unstructured not found - error
-                    self.logger.log(LogLevel.ERROR, "At least one 'unstructured' key must be provided within each scenes[].state but is missing at scene[" + scene['id'] + "]")
-                    self.missing_keys += 1
+                    self.report('unstructured-required', LogLevel.ERROR, MISSING_KEYS, "At least one 'unstructured' key must be provided within each scenes[].state but is missing at scene[{scene_id}]", scene=scene['id'], scene_id=scene['id'])
             i += 1
 
 
@@ -852,9 +875,9 @@ class YamlValidator:
         '''
         for parent_key in self.dep_json['deepLinks']:
             # get all possible parents for the keys
-            possible_parents = self.property_meets_conditions(parent_key.split('.'), copy.deepcopy(self.loaded_yaml))
+            possible_parents = self.property_meets_conditions(parent_key, self.loaded_yaml)
             for p in possible_parents:
-                if '[]' in p:
+                if not p.is_indexed:
                     # no index given for an array, skip this key
                     continue
                 # look for matching keys using possibleParents
@@ -868,7 +891,7 @@ class YamlValidator:
                         if not isinstance(values, list):
                             values = [values]
                         for v in values:
-                            singleCondition = singleCondition or self.does_key_have_value(p.split('.')+c.split('.'), v, copy.deepcopy(self.loaded_yaml))
+                            singleCondition = singleCondition or self.does_key_have_value(c, v, p.node)
                             if singleCondition:
                                 explanation += "('" + c + "': '" + str(v) + "'); "
                                 break
@@ -878,7 +901,7 @@ class YamlValidator:
                     if conditions:
                         # if the conditions match at this parent level, check if the required keys also match
                         for x in req_set['requirement']:  
-                            self.search_for_key(None, p.split('.'), [parent_key+'.'+x], 'has ' + explanation, expected_val=req_set['requirement'][x])
+                            self.search_for_key('deep-links', None, p.location, [parent_key+'.'+x], 'has ' + explanation, expected_val=req_set['requirement'][x])
             
 
     def does_key_have_value(self, key, value, yaml):
@@ -894,27 +917,11 @@ class YamlValidator:
 
     def get_value_at_key(self, key, yaml):
         '''
-        Given a key, returns the value matching
-        '''
-        data = yaml
-        for k in key:
-            if '[' in k:
-                loc = k.split('[')[0]
-                inside_brackets = k.split('[')[1].split(']')[0]
-                if inside_brackets is not None and inside_brackets != '':
-                    ind = int(k.split('[')[1].split(']')[0])
-                    if loc in data:
-                        data = data[loc]
-                        if len(data) > ind:
-                            data = data[ind]
-                else:
-                    return None
-            elif k in data:
-                data = data[k]
-            else:
-                # key not found
-                return None
-        return data
+        Given a key (a concrete dotted path or a location tuple), returns the value matching
+        '''
+        if isinstance(key, str):
+            key = parse_location(key)
+        return lookup(yaml, key)
 
 
     def value_follows_list(self):
@@ -923,39 +930,39 @@ class YamlValidator:
         '''
         for key in self.dep_json['valueMatch']:
             # start by compiling a list of all allowed values by using the value of the k-v pair
-            allowed_loc = self.dep_json['valueMatch'][key].split('.')
-            locations = self.property_meets_conditions(allowed_loc, copy.deepcopy(self.loaded_yaml))
+            allowed_loc = self.dep_json['valueMatch'][key]
+            locations = self.property_meets_conditions(allowed_loc, self.loaded_yaml)
             # gather allowed values
             allowed_values = []
             for l in locations:
-                loc = l.split('.')
-                val = self.get_value_at_key(loc, copy.deepcopy(self.loaded_yaml))
-                if val is not None:
-                    allowed_values.append(val)
+                if l.value is not None:
+                    allowed_values.append(l.value)
             # check if the location matches one of the allowed values
-            locations = self.property_meets_conditions(key.split('.'), copy.deepcopy(self.loaded_yaml))
-            for loc in locations:
-                if loc[-2:] == '[]':
+            locations = self.property_meets_conditions(key, self.loaded_yaml)
+            for match in locations:
+                if not match.is_indexed:
                     continue
-                v = self.get_value_at_key(loc.split('.'), copy.deepcopy(self.loaded_yaml))
+                loc = match.path
+                v = match.node
                 if not isinstance(v, list):
                     v = [v]
                 for v_element in v:
                     if v_element not in allowed_values:
-                        self.logger.log(LogLevel.ERROR, "Key '" + loc.split('.')[-1] + "' at '" + str(loc) + "' must have one of the following values " + str(allowed_values) + " to match one of " + str('.'.join(allowed_loc)) + ", but instead value is '" + str(v_element) + "'")
-                        self.invalid_values += 1
+                        self.report('value-match', LogLevel.ERROR, INVALID_VALUES, "Key '{key}' at '{location}' must have one of the following values {allowed} to match one of {allowed_loc}, but instead value is '{value}'", scene=self.scene_at(match.location), path=loc, key=loc.split('.')[-1], location=loc, allowed=allowed_values, allowed_loc=allowed_loc, value=v_element)
 
 
-    def character_matching(self):
+    def character_matching(self, scenes=None):
         '''
         Checks the yaml file for character matches: "characters at scene level 0 must match state characters. 
-        characters at other scene levels must match the characters within that scene"
+        characters at other scene levels must match the characters within that scene".
+        Only the scenes at the given indices are checked, if any are given.
         '''
+        only_scenes = scenes
         # get all locations that have character ids 
-        allowed_loc_0 = "state.characters[].id".split('.') # general location of character ids that are allowed in scene 0
-        allowed_loc_other = "scenes[].state.characters[].id".split('.') # general location of characters listed in all other scenes
-        removed_chars_loc = "scenes[].removed_characters[]".split('.') # general location of removed characters throughout the yaml
-        data = copy.deepcopy(self.loaded_yaml)
+        allowed_loc_0 = FIRST_SCENE_CHARACTERS # general location of character ids that are allowed in scene 0
+        allowed_loc_other = SCENE_CHARACTERS # general location of characters listed in all other scenes
+        removed_chars_loc = REMOVED_CHARACTERS # general location of removed characters throughout the yaml
+        data = self.loaded_yaml
         locations_0 = self.property_meets_conditions(allowed_loc_0, data) # specific locations of character ids that are allowed in scene 0
         locations_other = self.property_meets_conditions(allowed_loc_other, data) # specific locations of character ids that are listed in other scenes
         locations_removed = self.property_meets_conditions(removed_chars_loc, data) # specific locations of removed characters
@@ -969,26 +976,24 @@ class YamlValidator:
         # get all allowed values, organizing by the scene index where those values will be allowed
         for l in locations_0:
             # getting allowed characters for the first scene
-            loc = l.split('.')
-            val = self.get_value_at_key(loc, data)
+            val = l.value
             if val is not None:
                 allowed_vals[first_scene_id].append(val)   
                 all_chars.append(val)
 
         for l in locations_other:
             # getting characters listed in all the other scenes
-            ind = int(l.split('cenes[')[1].split(']')[0])
+            ind = l.location[1]
             if ind not in allowed_vals:
                 allowed_vals[ind] = []
-            loc = l.split('.')
-            val = self.get_value_at_key(loc, data)
+            val = l.value
             if val is not None:
                 allowed_vals[ind].append(val)   
                 all_chars.append(val)
 
         for l in locations_removed:
             # get all characters removed at some point in the yaml
-            val = self.get_value_at_key(l.split('.'), data)
+            val = l.value
             if val is not None:
                 removed_chars.append(val)
 
@@ -996,37 +1001,36 @@ class YamlValidator:
         missing_locs = []
 
         for loc in self.dep_json['characterMatching']:
-            loc = loc.split('.')
             # find all locations where the property exists
             locations = self.property_meets_conditions(loc, data)
             for l in locations:
                 # get the scene index
-                ind = int(l.split('cenes[')[1].split(']')[0])
+                ind = l.location[1]
+                if only_scenes is not None and ind not in only_scenes:
+                    continue
                 s = scenes[ind]
                 # check non-persistent-character scenes
                 if (not s.get('persist_characters', False)) and ('characters' in s or s['id'] == first_scene_id):
                     # make sure the index exists in the allowed values dict
                     if ind not in allowed_vals and s['id'] != first_scene_id:
                         # path does not exist where we are checking for characters. Error (optionally, we don't want to send a duplicate!) and short circuit this run
-                        where_vals_found = '.'.join(allowed_loc_0) if ind==0 else '.'.join(allowed_loc_other).replace('scenes[]', f'scenes[{ind}]')
-                        if where_vals_found not in missing_locs and not self.get_value_at_key(where_vals_found.split('.')[:1], data):
+                        where_vals_found = allowed_loc_0 if ind==0 else allowed_loc_other.replace('scenes[]', f'scenes[{ind}]')
+                        if where_vals_found not in missing_locs and not self.get_value_at_key(where_vals_found.split('.')[0], data):
                             missing_locs.append(where_vals_found)
-                            self.logger.log(LogLevel.ERROR, "Path '" + str(where_vals_found) + "' does not exist.")
-                            self.missing_keys += 1
+                            self.report('character-match', LogLevel.ERROR, MISSING_KEYS, "Path '{location}' does not exist.", scene=s['id'], path=where_vals_found, location=where_vals_found)
                         continue
                     # all paths are available to continue; check that the value at the given location matches what we expect
-                    loc = l.split('.')
-                    val = self.get_value_at_key(loc, data)
+                    loc = l.path
+                    val = l.value
                     # get the specific character ids allowed in this scene
                     this_allowed_vals = (allowed_vals[ind] if ind in allowed_vals else allowed_vals[first_scene_id])
                     if val is not None and val not in this_allowed_vals:
-                        where_vals_found = '.'.join(allowed_loc_0) if s['id'] != first_scene_id else '.'.join(allowed_loc_other).replace('scenes[]', f'scenes[{ind}]')
-                        self.logger.log(LogLevel.ERROR, "Key '" + loc[-1] + "' at '" + str('.'.join(loc)) + "' must have one of the following values " + str(this_allowed_vals) + " to match '" + str(where_vals_found) + "', but instead value is '" + str(val) + "'")
-                        self.invalid_values += 1
+                        where_vals_found = allowed_loc_0 if s['id'] != first_scene_id else allowed_loc_other.replace('scenes[]', f'scenes[{ind}]')
+                        self.report('character-match', LogLevel.ERROR, INVALID_VALUES, "Key '{key}' at '{location}' must have one of the following values {allowed} to match '{match}', but instead value is '{value}'", scene=s['id'], path=loc, key=loc.split('.')[-1], location=loc, allowed=this_allowed_vals, match=where_vals_found, value=val)
                 # check persist character scenes
                 elif s.get('persist_characters', False):
-                    scene_chars = self.get_characters_in_scene(data, s['id'])
-                    loc = l.split('.')
+                    scene_sets = self.scene_states.character_sets(s['id'])
+                    loc = l.path
                     removed_this_scene = s.get('removed_characters', [])
                     if s['id'] != first_scene_id:
                         this_scene_characters = s.get('state', {}).get('characters', [])
@@ -1038,37 +1042,22 @@ class YamlValidator:
                         this_scene_char_ids = []
                         for x in this_scene_characters:
                             this_scene_char_ids.append(x['id'])
-                    val = self.get_value_at_key(loc, data)
-                    if type(val) == type({}):
+                    val = l.value
+                    if isinstance(val, dict):
                         val = list(val.keys())[0]
                     if val is not None:
                         if val not in all_chars:
-                            self.logger.log(LogLevel.ERROR, "Key '" + loc[-1] + "' at '" + str('.'.join(loc)) + f"' (scene '{s['id']}') has value '" + str(val) + "', but that character id is never defined within the scenario yaml file.")
-                            self.invalid_values += 1
-                        elif not any('removed_characters' in el for el in loc) and val in removed_this_scene:
-                            self.logger.log(LogLevel.ERROR, f"Character ID '{val}' appears in '{str('.').join(loc)}' (scene '{s['id']}'), but is removed during this scene, so cannot be used.")
-                            self.invalid_values += 1
-                        elif val in scene_chars['removed'] and val not in this_scene_char_ids:
-                            still_possible = False
-                            for group in scene_chars['possible']:
-                                if val in group:
-                                    still_possible = True
-                                    break
-                            if still_possible:
-                                self.logger.log(LogLevel.WARN, f"Character ID '{val}' appears in '{str('.').join(loc)}' (scene '{s['id']}'), but in some branches is removed prior to this scene. Ensure this character exists in every branch leading up to this scene.")
-                                self.warning_count += 1    
+                            self.report('character-match', LogLevel.ERROR, INVALID_VALUES, "Key '{key}' at '{location}' (scene '{scene_id}') has value '{value}', but that character id is never defined within the scenario yaml file.", scene=s['id'], path=loc, key=loc.split('.')[-1], location=loc, scene_id=s['id'], value=val)
+                        elif 'removed_characters' not in l.location and val in removed_this_scene:
+                            self.report('character-match', LogLevel.ERROR, INVALID_VALUES, "Character ID '{character}' appears in '{location}' (scene '{scene_id}'), but is removed during this scene, so cannot be used.", scene=s['id'], path=loc, character=val, location=loc, scene_id=s['id'])
+                        elif self.scene_states.character_bit(val) & scene_sets.removed and val not in this_scene_char_ids:
+                            if self.scene_states.character_bit(val) & scene_sets.any:
+                                self.report('character-match', LogLevel.WARN, WARNINGS, "Character ID '{character}' appears in '{location}' (scene '{scene_id}'), but in some branches is removed prior to this scene. Ensure this character exists in every branch leading up to this scene.", scene=s['id'], path=loc, character=val, location=loc, scene_id=s['id'])
                             else:
-                                self.logger.log(LogLevel.ERROR, f"Character ID '{val}' appears in '{str('.').join(loc)}' (scene '{s['id']}') but is never available to this scene.")
-                                self.invalid_values += 1
+                                self.report('character-match', LogLevel.ERROR, INVALID_VALUES, "Character ID '{character}' appears in '{location}' (scene '{scene_id}') but is never available to this scene.", scene=s['id'], path=loc, character=val, location=loc, scene_id=s['id'])
                         else:
-                            is_possible = False
-                            for group in scene_chars['possible']:
-                                if val in group:
-                                    is_possible = True
-                                    break
-                            if not is_possible:
-                                self.logger.log(LogLevel.ERROR, f"Character ID '{val}' appears in '{str('.').join(loc)}' (scene '{s['id']}') but is never available to this scene.")
-                                self.invalid_values += 1
+                            if not self.scene_states.character_bit(val) & scene_sets.any:
+                                self.report('character-match', LogLevel.ERROR, INVALID_VALUES, "Character ID '{character}' appears in '{location}' (scene '{scene_id}') but is never available to this scene.", scene=s['id'], path=loc, character=val, location=loc, scene_id=s['id'])
 
 
     def verify_uniqueness(self):
@@ -1076,27 +1065,37 @@ class YamlValidator:
         Ensure that all values at a certain level are unique
         '''
         for k in self.dep_json['unique']:
-            loc = k.split('.')
             scope = self.dep_json['unique'][k]
             # find all locations where the property exists
-            locations = self.property_meets_conditions(loc, copy.deepcopy(self.loaded_yaml))
-            scope_locs = self.property_meets_conditions(scope.split('.'), copy.deepcopy(self.loaded_yaml))
+            locations = self.property_meets_conditions(k, self.loaded_yaml)
             if scope == "":
-                scope_locs = [""]
+                # the scope is the whole file
+                scope_locs = [Match((), self.loaded_yaml)]
+            else:
+                scope_locs = self.property_meets_conditions(scope, self.loaded_yaml)
+            # group the locations by the scope they are in, in one pass (a whole array is not an actual path)
+            in_scope = {scope.location: [] for scope in scope_locs if scope.is_indexed}
+            depths = {len(location) for location in in_scope}
+            for loc in locations:
+                for depth in depths:
+                    if loc.location[:depth] in in_scope:
+                        in_scope[loc.location[:depth]].append(loc)
             for scope in scope_locs:
-                vals_found = []
-                if scope[-2:] == '[]':
-                    # not an actual path
+                if not scope.is_indexed:
                     continue
-                else:
-                    for loc in locations:
-                        if scope in loc or scope == "":
-                            val = self.get_value_at_key(loc.split('.'), copy.deepcopy(self.loaded_yaml))
-                            if val in vals_found:
-                                self.logger.log(LogLevel.ERROR, f"Values from key '{k}' must be unique within scope '{scope if scope != '' else '[whole file]'}', but value '{val}' was found more than once.")
-                                self.invalid_values += 1    
-                            else:
-                                vals_found.append(val)
+                vals_found = set()
+                # mappings and lists can't go in a set, but are never equal to the values that can
+                unhashable_found = []
+                for loc in in_scope[scope.location]:
+                    val = loc.value
+                    try:
+                        found = val in vals_found
+                        vals_found.add(val)
+                    except TypeError:
+                        found = val in unhashable_found
+                        unhashable_found.append(val)
+                    if found:
+                        self.report('unique', LogLevel.ERROR, INVALID_VALUES, "Values from key '{key}' must be unique within scope '{scope}', but value '{value}' was found more than once.", scene=self.scene_at(loc.location), path=loc.path, key=k, scope=scope.path if scope.path != '' else '[whole file]', value=val)
 
 
     def scenes_with_state(self):
@@ -1104,15 +1103,14 @@ class YamlValidator:
         Looks through the yaml file to make sure that every scene except the first has 
         a state field
         '''
-        data = copy.deepcopy(self.loaded_yaml)
+        data = self.loaded_yaml
         scenes = data['scenes']
         first_scene_id = self.determine_first_scene(data)['id']
         for s in scenes:
             if s['id'] == first_scene_id:
                 continue
             if 'state' not in s:
-                self.logger.log(LogLevel.ERROR, "Key 'state' must be provided within all but the first entry in 'scenes' but is missing at scenes[" + s['id'] + "]")
-                self.missing_keys += 1
+                self.report('scene-state-required', LogLevel.ERROR, MISSING_KEYS, "Key 'state' must be provided within all but the first entry in 'scenes' but is missing at scenes[{scene_id}]", scene=s['id'], scene_id=s['id'])
 
 
     def verify_allowed_actions(self):
@@ -1120,14 +1118,13 @@ class YamlValidator:
         Ensures that any action found in action_mapping is not in
         restricted_actions
         '''
-        data = copy.deepcopy(self.loaded_yaml)
+        data = self.loaded_yaml
         scenes = data['scenes']
         for i in range(0, len(scenes)):
             if 'restricted_actions' in scenes[i] and 'action_mapping' in scenes[i]:
                 for x in scenes[i]['action_mapping']:
                     if x['action_type'] in scenes[i]['restricted_actions']:
-                        self.logger.log(LogLevel.ERROR, f"{x['action_type']} is a restricted action at scene with id '{scenes[i]['id']}', but appears in the action_mapping within that scene.")
-                        self.invalid_values += 1
+                        self.report('restricted-action', LogLevel.ERROR, INVALID_VALUES, "{action_type} is a restricted action at scene with id '{scene_id}', but appears in the action_mapping within that scene.", scene=scenes[i]['id'], action_type=x['action_type'], scene_id=scenes[i]['id'])
 
 
     def is_pulse_oximeter_configured(self): 
@@ -1135,7 +1132,7 @@ class YamlValidator:
         Checks if Pulse Oximeter is configured in the supplies.
         '''
         # inital variables for getting specific data 
-        data = copy.deepcopy(self.loaded_yaml)
+        data = self.loaded_yaml
         scenes = data['scenes']
 
         for scene in scenes:
@@ -1153,12 +1150,10 @@ class YamlValidator:
                 if not_found:
                     if found:
                         # found in at least one path, but not found in at least one path - warning
-                        self.warning_count += 1
-                        self.logger.log(LogLevel.WARN, f"There might be an invalid action in scene '{scene['id']}'. A pulse oximeter must be available in order to have 'action type' equal to 'CHECK_BLOOD_OXYGEN' OR 'CHECK_ALL_VITALS', but in at least one branching path, the pulse oximeter is missing. Please ensure that a pulse oximeter is always available for this scene.")
+                        self.report('pulse-oximeter', LogLevel.WARN, WARNINGS, "There might be an invalid action in scene '{scene_id}'. A pulse oximeter must be available in order to have 'action type' equal to 'CHECK_BLOOD_OXYGEN' OR 'CHECK_ALL_VITALS', but in at least one branching path, the pulse oximeter is missing. Please ensure that a pulse oximeter is always available for this scene.", scene=scene['id'], scene_id=scene['id'])
                     else:
                         # not found in any paths
-                        self.invalid_values += 1
-                        self.logger.log(LogLevel.ERROR, f"There is an invalid action in scene '{scene['id']}'. A pulse oximeter must be available in order to have 'action type' equal to 'CHECK_BLOOD_OXYGEN' OR 'CHECK_ALL_VITALS' but is never available through any branching path. Please ensure that a pulse oximeter is always available for this scene.")
+                        self.report('pulse-oximeter', LogLevel.ERROR, INVALID_VALUES, "There is an invalid action in scene '{scene_id}'. A pulse oximeter must be available in order to have 'action type' equal to 'CHECK_BLOOD_OXYGEN' OR 'CHECK_ALL_VITALS' but is never available through any branching path. Please ensure that a pulse oximeter is always available for this scene.", scene=scene['id'], scene_id=scene['id'])
                     break
 
 
@@ -1166,11 +1161,12 @@ class YamlValidator:
         '''
         Ensure that action parameters have valid values
         '''
-        data = copy.deepcopy(self.loaded_yaml)
-        api = copy.deepcopy(self.api_yaml)
+        data = self.loaded_yaml
         allowed_supplies = self.allowed_supplies
-        allowed_locations = api['components']['schemas']['InjuryLocationEnum']['enum']
-        allowed_categories = api['components']['schemas']['CharacterTagEnum']['enum']
+        locations = self.api_schema.enums['InjuryLocationEnum']
+        categories = self.api_schema.enums['CharacterTagEnum']
+        allowed_locations = locations.enum
+        allowed_categories = categories.enum
 
         scenes = data['scenes']
         i = 0
@@ -1182,23 +1178,19 @@ class YamlValidator:
                     if 'parameters' in action:
                         params = action['parameters']
                         if 'treatment' in params:
-                            if params['treatment'] not in allowed_supplies:
-                                self.logger.log(LogLevel.ERROR, "Key 'scenes[" + scene['id'] + "].action_mapping[" + str(j) + "].parameters.treatment' must be one of the following values: " + str(allowed_supplies) + " but is '" + params['treatment'] + "' instead.")
-                                self.invalid_values += 1                        
+                            if not contains(self.allowed_supply_values, params['treatment']):
+                                self.report('action-parameters', LogLevel.ERROR, INVALID_VALUES, "Key 'scenes[{scene_id}].action_mapping[{index}].parameters.treatment' must be one of the following values: {allowed} but is '{value}' instead.", scene=scene['id'], path=f"scenes[{i}].action_mapping[{j}].parameters.treatment", scene_id=scene['id'], index=j, allowed=allowed_supplies, value=params['treatment'])
                         if 'location' in params:
-                            if params['location'] not in allowed_locations:
-                                self.logger.log(LogLevel.ERROR, "Key 'scenes[" + scene['id'] + "].action_mapping[" + str(j) + "].parameters.location' must be one of the following values: " + str(allowed_locations) + " but is '" + params['location'] + "' instead.")
-                                self.invalid_values += 1 
+                            if not locations.allows(params['location']):
+                                self.report('action-parameters', LogLevel.ERROR, INVALID_VALUES, "Key 'scenes[{scene_id}].action_mapping[{index}].parameters.location' must be one of the following values: {allowed} but is '{value}' instead.", scene=scene['id'], path=f"scenes[{i}].action_mapping[{j}].parameters.location", scene_id=scene['id'], index=j, allowed=allowed_locations, value=params['location'])
                         if 'category' in params:
-                            if params['category'] not in allowed_categories:
-                                self.logger.log(LogLevel.ERROR, "Key 'scenes[" + scene['id'] + "].action_mapping[" + str(j) + "].parameters.category' must be one of the following values: " + str(allowed_categories) + " but is '" + params['category'] + "' instead.")
-                                self.invalid_values += 1 
+                            if not categories.allows(params['category']):
+                                self.report('action-parameters', LogLevel.ERROR, INVALID_VALUES, "Key 'scenes[{scene_id}].action_mapping[{index}].parameters.category' must be one of the following values: {allowed} but is '{value}' instead.", scene=scene['id'], path=f"scenes[{i}].action_mapping[{j}].parameters.category", scene_id=scene['id'], index=j, allowed=allowed_categories, value=params['category'])
                         # validate params only includes expected values
                         for key in params:
                             allowed_params = ['treatment', 'location', 'category', 'aid_id', 'type', 'object', 'action_type', 'relevant_state', 'recipient', 'character_id']
                             if key not in allowed_params:
-                                self.logger.log(LogLevel.ERROR, "'scenes[" + scene['id'] + "].action_mapping[" + str(j) + "].parameters' may only include the following keys: " + str(allowed_params) + " but has key '" + key + "'.")
-                                self.invalid_keys += 1 
+                                self.report('action-parameters', LogLevel.ERROR, INVALID_KEYS, "'scenes[{scene_id}].action_mapping[{index}].parameters' may only include the following keys: {allowed} but has key '{key}'.", scene=scene['id'], path=f"scenes[{i}].action_mapping[{j}].parameters.{key}", scene_id=scene['id'], index=j, allowed=allowed_params, key=key)
                     j += 1
             i += 1
 
@@ -1208,10 +1200,11 @@ class YamlValidator:
         Verifies that all characters with their mission importance appear
         in the critical_ids list.
         '''
-        data = copy.deepcopy(self.loaded_yaml)
+        data = self.loaded_yaml
         # get all id/mission-importance pairs that appear throughout the entire scenario
-        characters = data['state']['characters']
-        character_importance = data.get('state', {}).get('mission', {}).get('character_importance', [])
+        # copy the top-level lists since scene values are appended to them below
+        characters = list(data['state']['characters'])
+        character_importance = list(data.get('state', {}).get('mission', {}).get('character_importance', []))
         pairs = {}
         for scene in data['scenes']:
             characters += scene.get('state', {}).get('characters', [])
@@ -1224,7 +1217,8 @@ class YamlValidator:
             else:
                 pairs[cid] = 'normal'  
 
-        allowed_importance = copy.deepcopy(self.api_yaml)['components']['schemas']['MissionImportanceEnum']['enum']
+        importance = self.api_schema.enums['MissionImportanceEnum']
+        allowed_importance = importance.enum
 
         # verify that all pairs appear in character_importance
         critical_dict = {}
@@ -1233,18 +1227,15 @@ class YamlValidator:
         for k in critical_dict:
             if k in pairs:
                 if pairs[k] != critical_dict[k]:
-                    self.logger.log(LogLevel.ERROR, "Value of 'mission.character_importance['" + k + "']' is '" + str(critical_dict[k]) + "', but the character's mission_importance is '" + str(pairs[k]) + "'")
-                    self.invalid_values += 1     
+                    self.report('character-importance', LogLevel.ERROR, INVALID_VALUES, "Value of 'mission.character_importance['{character}']' is '{value}', but the character's mission_importance is '{importance}'", character=k, value=critical_dict[k], importance=pairs[k])
             else:
                 # will be handled by character_matching. Do not double count error!
                 pass  
-            if critical_dict[k] not in allowed_importance:
-                self.logger.log(LogLevel.ERROR, "Value of 'mission.character_importance['" + k + "']' must be one of " + str(allowed_importance) + "', but instead it is '" + critical_dict[k] + "'")
-                self.invalid_values += 1              
+            if not importance.allows(critical_dict[k]):
+                self.report('character-importance', LogLevel.ERROR, INVALID_VALUES, "Value of 'mission.character_importance['{character}']' must be one of {allowed}', but instead it is '{value}'", character=k, allowed=allowed_importance, value=critical_dict[k])
         for k in pairs:
             if k not in critical_dict and pairs[k] != 'normal':
-                self.logger.log(LogLevel.ERROR, "Value of 'mission.character_importance' is missing pair ('" + k + "', '" + str(pairs[k]) + "')")
-                self.missing_keys += 1         
+                self.report('character-importance', LogLevel.ERROR, MISSING_KEYS, "Value of 'mission.character_importance' is missing pair ('{character}', '{importance}')", character=k, importance=pairs[k])
 
 
     def check_first_scene(self):
@@ -1252,14 +1243,13 @@ class YamlValidator:
         Makes sure the first scene is compliant with all the rules we give it:
         1. Must not contain state
         '''
-        data = copy.deepcopy(self.loaded_yaml)
+        data = self.loaded_yaml
 
         # Use determine_first_scene to get the first scene
         first_scene = self.determine_first_scene(data)
 
         if 'state' in first_scene: 
-            self.logger.log(LogLevel.ERROR, "Key 'state' is not allowed in the first scene.")
-            self.invalid_keys += 1
+            self.report('first-scene-state', LogLevel.ERROR, INVALID_KEYS, "Key 'state' is not allowed in the first scene.", scene=first_scene.get('id'))
 
 
     def check_scene_env_type(self):
@@ -1267,270 +1257,35 @@ class YamlValidator:
         Checks to make sure if a scene state defines sim_environment, the type is not 
         different from the type defined in scenario.sim_environment
         '''
-        data = copy.deepcopy(self.loaded_yaml)
+        data = self.loaded_yaml
         orig_type = data['state']['environment']['sim_environment']['type']
         scenes = data['scenes']
         for scene in scenes:
             if 'state' in scene and 'environment' in scene['state'] and 'sim_environment' in scene['state']['environment']:
                 new_type = scene['state']['environment']['sim_environment'].get('type', None)
                 if new_type is not None and new_type != orig_type:
-                    self.warning_count += 1
-                    self.logger.log(LogLevel.WARN, f"Key 'type' should not be redefined in scene states, but changes from '{orig_type}' to '{new_type}' in scene '{scene['id']}'. This redefinition will be ignored.")
-
-
-    def get_branch_segments_for_scene(self, scene_id):
-        segments = []
-        for branch in self.branches:
-            if scene_id in branch:
-                # get every occurrence (not just the first) of scene_id in the branch
-                for i in range(len(branch)):
-                    if branch[i] == scene_id:
-                        segments.append(branch[:i+1]) 
-        segments = sorted(self.remove_duplicate_sublists(segments), key=len)
-
-        # get segments that appear at the beginning of every path for this branch
-        critical_segments = []
-        for i in range(len(segments)):
-            s1 = segments[i]
-            if len(s1) > len(segments[0]):
-                break
-            is_in_all = True
-            for s2 in segments:
-                if len(self.remove_duplicate_sublists([s1, s2[:len(s1)]])) != 1:
-                    is_in_all = False
-                    break
-            if is_in_all:
-                critical_segments.append(s1)
-
-        return {'segments': segments, 'critical': critical_segments}
+                    self.report('sim-environment-type', LogLevel.WARN, WARNINGS, "Key 'type' should not be redefined in scene states, but changes from '{original}' to '{new}' in scene '{scene_id}'. This redefinition will be ignored.", scene=scene['id'], original=orig_type, new=new_type, scene_id=scene['id'])
 
 
     def get_characters_in_scene(self, data, scene_id):
         '''
         Gets all characters that could possibly be allowed in a scene
         '''
-        def get_basic_chars(scene):
-            characters = []
-            for c in scene.get('state', {}).get('characters', []):
-                characters.append({'id': c['id'], 'unseen': c.get('unseen', False)})
-            return characters
-        
-        def get_removed_chars(scene):
-            characters = []
-            for c in scene.get('removed_characters', []):
-                characters.append(c)
-            return characters
-
-        first_scene_id = self.determine_first_scene(data)['id']
-        this_scene = self.get_scene_by_id(scene_id)
-        chars = {'possible': [], 'removed': [], 'seen': [], 'unseen': []}
-        if this_scene.get('persist_characters', False):
-            all_segs = self.get_branch_segments_for_scene(scene_id)
-            segments = all_segs['segments']
-            critical_segments = all_segs['critical']
-            for segment in segments:
-                tmp_chars = []
-                tmp_removed = []
-                tmp_seen = []
-                tmp_unseen = []
-                for sid in segment:
-                    if sid == first_scene_id and len(tmp_chars) == 0:
-                        # get scenario characters from first scene
-                        for x in get_basic_chars(data):
-                            tmp_chars.append(x['id'])
-                            if x['unseen']:
-                                if x['id'] in tmp_seen:
-                                    tmp_seen.remove(x['id'])
-                                if x['id'] not in tmp_unseen:
-                                    tmp_unseen.append(x['id'])
-                            else:
-                                if x['id'] in tmp_unseen:
-                                    tmp_unseen.remove(x['id'])
-                                if x['id'] not in tmp_seen:
-                                    tmp_seen.append(x['id'])
-                    else:
-                        scene = self.get_scene_by_id(sid)
-                        if scene.get('persist_characters', False):
-                            # modify allowed characters up to this point
-                            for x in get_basic_chars(scene):
-                                tmp_chars.append(x['id'])
-                                if x['unseen']:
-                                    if x['id'] in tmp_seen:
-                                        tmp_seen.remove(x['id'])
-                                    if x['id'] not in tmp_unseen:
-                                        tmp_unseen.append(x['id'])
-                                else:
-                                    if x['id'] in tmp_unseen:
-                                        tmp_unseen.remove(x['id'])
-                                    if x['id'] not in tmp_seen:
-                                        tmp_seen.append(x['id'])
-                            tmp_chars = list(set(tmp_chars))
-                            for c in get_removed_chars(scene):
-                                if sid != segment[-1]:
-                                    if c in tmp_chars:
-                                        tmp_chars.remove(c)
-                                    if c not in tmp_removed:
-                                        tmp_removed.append(c)
-                        else:
-                            # if persist characters is false at any point in the path, start fresh!
-                            tmp_chars = []
-                            tmp_seen = []
-                            tmp_unseen = []
-                            for x in get_basic_chars(scene):
-                                tmp_chars.append(x['id'])
-                                if x['unseen']:
-                                    if x['id'] in tmp_seen:
-                                        tmp_seen.remove(x['id'])
-                                    if x['id'] not in tmp_unseen:
-                                        tmp_unseen.append(x['id'])
-                                else:
-                                    if x['id'] in tmp_unseen:
-                                        tmp_unseen.remove(x['id'])
-                                    if x['id'] not in tmp_seen:
-                                        tmp_seen.append(x['id'])
-                if len(tmp_chars) > 0:
-                    if segment in critical_segments:
-                        chars['possible'].append(tmp_chars)
-                    elif len(critical_segments) == 0:
-                        chars['possible'].append(tmp_chars)
-                chars['removed'] += tmp_removed
-                chars['unseen'] += tmp_unseen
-                chars['seen'] += tmp_seen
-        elif this_scene['id'] != first_scene_id:
-            chars['possible'] = []
-            for x in get_basic_chars(this_scene):
-                chars['possible'].append(x['id'])
-                if x['unseen']:
-                    if x['id'] in chars['seen']:
-                        chars['seen'].remove(x['id'])
-                    if x['id'] not in chars['unseen']:
-                        chars['unseen'].append(x['id'])
-                else:
-                    if x['id'] in chars['unseen']:
-                        chars['unseen'].remove(x['id'])
-                    if x['id'] not in chars['seen']:
-                        chars['seen'].append(x['id'])
-            chars['possible'] = [chars['possible']]
-        elif this_scene['id'] == first_scene_id:
-            chars['possible'] = []
-            for x in get_basic_chars(data):
-                chars['possible'].append(x['id'])
-                if x['unseen']:
-                    if x['id'] in chars['seen']:
-                        chars['seen'].remove(x['id'])
-                    if x['id'] not in chars['unseen']:
-                        chars['unseen'].append(x['id'])
-                else:
-                    if x['id'] in chars['unseen']:
-                        chars['unseen'].remove(x['id'])
-                    if x['id'] not in chars['seen']:
-                        chars['seen'].append(x['id'])
-            chars['possible'] = [chars['possible']]
-        return chars
+        return self.scene_states.characters_in_scene(scene_id)
 
 
     def get_supplies_in_scene(self, data, scene_id):
         '''
         Gets the supplies that could be allowed in a scene
         '''
-        def get_supplies(scene):
-            return scene.get('state', {}).get('supplies', [])
-        
-        def override_supplies(cur, new):
-            '''
-            Only supplies defined in the supplies array are overwritten.
-            All supplies left undefined are left unchanged
-            '''
-            cur = copy.deepcopy(cur)
-            if len(cur) == 0:
-                return new
-            for x in new:
-                matching = [s for s in cur if s['type'] == x['type']]
-                if len(matching) > 0:
-                    cur[cur.index(matching[0])] = x
-                else:
-                    cur.append(x)
-            return cur
-
-        first_scene_id = self.determine_first_scene(data)['id']
-        this_scene = self.get_scene_by_id(scene_id)
-        possible_supplies = []
-        if this_scene.get('supplies', None) is None:
-            all_segs = self.get_branch_segments_for_scene(scene_id)
-            segments = all_segs['segments']
-            critical_segments = all_segs['critical']
-
-            for segment in segments:
-                tmp_possible = []
-                for sid in segment:
-                    if sid == first_scene_id and len(tmp_possible) == 0:
-                        # get scenario supplies for first scene
-                        tmp_possible = override_supplies(tmp_possible, get_supplies(data))
-                    else:
-                        # new supplies always overwrites previous supplies
-                        scene = self.get_scene_by_id(sid)
-                        tmp_supplies = override_supplies(tmp_possible, get_supplies(scene))
-                        if len(tmp_supplies) > 0:
-                            tmp_possible = override_supplies(tmp_possible, get_supplies(scene))
-                if len(tmp_possible) > 0:
-                    if segment in critical_segments:
-                        possible_supplies.append(tmp_possible)
-                    elif len(critical_segments) == 0:
-                        possible_supplies.append(tmp_possible)
-        elif this_scene['id'] != first_scene_id:
-            possible_supplies = [get_supplies(scene)]
-        elif this_scene['id'] == first_scene_id:
-            possible_supplies = [get_supplies(data)]
-        return possible_supplies
+        return self.scene_states.supplies_in_scene(scene_id)
     
     
     def get_aid_ids_in_scene(self, data, scene_id):
         '''
         Gets the aid_ids that could be allowed in a scene
         '''
-        def get_aid_ids(scene):
-            dec_env = scene.get('state', {}).get('environment', {}).get('decision_environment', {}).get('aid', None)
-            if dec_env is not None:
-                delay_ids = []
-                for x in dec_env:
-                    delay_ids.append(x['id'])
-                return delay_ids
-            else:
-                return None
-
-        first_scene_id = self.determine_first_scene(data)['id']
-        this_scene = self.get_scene_by_id(scene_id)
-        possible_ids = []
-        if this_scene.get('state', {}).get('environment', {}).get('decision_environment', {}).get('aid', None) is None:
-            all_segs = self.get_branch_segments_for_scene(scene_id)
-            segments = all_segs['segments']
-            critical_segments = all_segs['critical']
-
-            for segment in segments:
-                tmp_possible = []
-                for sid in segment:
-                    if sid == first_scene_id and len(tmp_possible) == 0:
-                        # get evac ids for the first scene from scenario state
-                        tmp_tmp = get_aid_ids(data)
-                        tmp_possible = tmp_tmp if tmp_tmp is not None else []
-                    else:
-                        # new aid_delays always overwrites old aid_ids
-                        tmp_tmp = get_aid_ids(self.get_scene_by_id(sid))
-                        if tmp_tmp is not None:
-                            tmp_possible = tmp_tmp
-                if len(tmp_possible) > 0:
-                    if segment in critical_segments:
-                        possible_ids.append(tmp_possible)
-                    elif len(critical_segments) == 0:
-                        possible_ids.append(tmp_possible)
-        elif this_scene['id'] != first_scene_id:
-            tmp_tmp = get_aid_ids(this_scene)
-            possible_ids = [tmp_tmp] if tmp_tmp is not None else []
-        elif this_scene['id'] == first_scene_id:
-            tmp_tmp = get_aid_ids(data)
-            possible_ids = [tmp_tmp] if tmp_tmp is not None else []
-
-        return possible_ids
+        return self.scene_states.aid_ids_in_scene(scene_id)
 
 
     def validate_pretreated_injuries(self):
@@ -1540,19 +1295,17 @@ class YamlValidator:
         - status is "treated" iff treatments_applied == treatments_required
         '''
         def check_single_character(c, scene_name):
+            scene_id = scene_name if scene_name != 'scenario-level' else None
             for inj in c.get('injuries', []):
                 applied = inj.get('treatments_applied', 0)
                 if applied != 0 and applied != inj.get('treatments_required', 0):
-                    self.logger.log(LogLevel.ERROR, f"Value of 'treatments_applied' for character '{c['id']}' at scene '{scene_name}' must be equal to '0' or 'treatments_required', but instead is '{applied}'.")
-                    self.invalid_values += 1     
+                    self.report('pretreated-injury', LogLevel.ERROR, INVALID_VALUES, "Value of 'treatments_applied' for character '{character}' at scene '{scene_id}' must be equal to '0' or 'treatments_required', but instead is '{applied}'.", scene=scene_id, character=c['id'], scene_id=scene_name, applied=applied)
                 if applied == inj.get('treatments_required', 1) and inj.get('status', None) != 'treated':
-                    self.logger.log(LogLevel.ERROR, f"Value of injury 'status' for character '{c['id']}' at scene '{scene_name}' must be 'treated' since 'treatments_applied' == 'treatments_required'.")
-                    self.invalid_values += 1    
+                    self.report('pretreated-injury', LogLevel.ERROR, INVALID_VALUES, "Value of injury 'status' for character '{character}' at scene '{scene_id}' must be 'treated' since 'treatments_applied' == 'treatments_required'.", scene=scene_id, character=c['id'], scene_id=scene_name)
                 if inj.get('status', None) == 'treated' and applied != inj.get('treatments_required', 0):
-                    self.logger.log(LogLevel.ERROR, f"Value of injury 'status' for character '{c['id']}' at scene '{scene_name}' is 'treated', but 'treatments_applied' != 'treatments_required'.")
-                    self.invalid_values += 1         
+                    self.report('pretreated-injury', LogLevel.ERROR, INVALID_VALUES, "Value of injury 'status' for character '{character}' at scene '{scene_id}' is 'treated', but 'treatments_applied' != 'treatments_required'.", scene=scene_id, character=c['id'], scene_id=scene_name)
 
-        data = copy.deepcopy(self.loaded_yaml)
+        data = self.loaded_yaml
         for c in data['state'].get('characters', []):
             check_single_character(c, 'scenario-level')
         for scene in data['scenes']:
@@ -1566,7 +1319,7 @@ class YamlValidator:
         - if a character is unseen, the action type is MOVE_TO or MOVE_TO_EVAC
         - if a character is not unseen, the action type is _not_ MOVE_TO
         '''
-        data = copy.deepcopy(self.loaded_yaml)
+        data = self.loaded_yaml
         for scene in data['scenes']:
             for action in scene.get('action_mapping', []):
                 char = action.get('character_id', None)
@@ -1577,26 +1330,20 @@ class YamlValidator:
                     if action.get('intent_action') == True and action_type != 'MOVE_TO':
                         continue # You can intend to do almost anything regardless of seen/unseen.
                     # get which characters are known to be seen or unseen in this scene
-                    char_details = self.get_characters_in_scene(data, scene['id'])
-                    unseen = list(set(char_details['unseen']))
-                    seen = list(set(char_details['seen']))   
-                    unknown = []
-                    for x in unseen:
-                        if x in seen:
-                            unknown.append(x)
-                            unseen.remove(x)
-                            seen.remove(x)
-                    if char in unseen:
+                    sets = self.scene_states.character_sets(scene['id'])
+                    bit = self.scene_states.character_bit(char)
+                    # a character that is seen on some ways into the scene and unseen on others is unknown
+                    unknown = sets.seen & sets.unseen
+                    unseen = sets.unseen & ~unknown
+                    seen = sets.seen & ~unknown
+                    if bit & unseen:
                         if action_type not in ['MOVE_TO', 'MOVE_TO_EVAC']:
-                            self.logger.log(LogLevel.WARN, f"Action types 'MOVE_TO' and 'MOVE_TO_EVAC' are the only actions allowed for unseen characters, but in scene '{scene['id']}', '{char}' may be unseen with unallowed action type '{action_type}'.")
-                            self.warning_count += 1       
-                    elif char in seen:
+                            self.report('unseen-character-action', LogLevel.WARN, WARNINGS, "Action types 'MOVE_TO' and 'MOVE_TO_EVAC' are the only actions allowed for unseen characters, but in scene '{scene_id}', '{character}' may be unseen with unallowed action type '{action_type}'.", scene=scene['id'], scene_id=scene['id'], character=char, action_type=action_type)
+                    elif bit & seen:
                         if action_type == 'MOVE_TO':
-                            self.logger.log(LogLevel.WARN, f"Action type 'MOVE_TO' is only allowed for unseen characters, but in scene '{scene['id']}', '{char}' may be not unseen and has action type '{action_type}'.")
-                            self.warning_count += 1     
-                    elif char in unknown:
-                        self.logger.log(LogLevel.WARN, f"Action types allowed are specific for unseen vs seen characters. Due to different branching paths, in scene '{scene['id']}', character '{char}' may either be seen or unseen, leading to ambiguous validity tests.")
-                        self.warning_count += 1     
+                            self.report('unseen-character-action', LogLevel.WARN, WARNINGS, "Action type 'MOVE_TO' is only allowed for unseen characters, but in scene '{scene_id}', '{character}' may be not unseen and has action type '{action_type}'.", scene=scene['id'], scene_id=scene['id'], character=char, action_type=action_type)
+                    elif bit & unknown:
+                        self.report('unseen-character-action', LogLevel.WARN, WARNINGS, "Action types allowed are specific for unseen vs seen characters. Due to different branching paths, in scene '{scene_id}', character '{character}' may either be seen or unseen, leading to ambiguous validity tests.", scene=scene['id'], scene_id=scene['id'], character=char)
                     
 
     def validate_aid_ids(self):
@@ -1604,7 +1351,7 @@ class YamlValidator:
         Makes sure that any aid_ids listed in action_mapping parameters
         are allowed in the scene.
         '''
-        data = copy.deepcopy(self.loaded_yaml)
+        data = self.loaded_yaml
         for scene in data['scenes']:
             used_aid_ids = set([])
             for action in scene.get('action_mapping', []):
@@ -1623,14 +1370,11 @@ class YamlValidator:
                             unallowed_count += 1
                     if unallowed_count > 0:
                         if allowed_count == 0:
-                            self.logger.log(LogLevel.ERROR, f"Value '{val}' for key 'aid_id' in scene '{scene['id']}'s action_mapping is never available to this scene.")
-                            self.invalid_values += 1
+                            self.report('aid-id', LogLevel.ERROR, INVALID_VALUES, "Value '{value}' for key 'aid_id' in scene '{scene_id}'s action_mapping is never available to this scene.", scene=scene['id'], value=val, scene_id=scene['id'])
                         else:
-                            self.logger.log(LogLevel.WARN, f"Value '{val}' for key 'aid_id' in scene '{scene['id']}'s action_mapping may not always be available to this scene due to some branching behvaiors. Please check to ensure that all branches will provide the correct aid_ids to the scene.")
-                            self.warning_count += 1 
+                            self.report('aid-id', LogLevel.WARN, WARNINGS, "Value '{value}' for key 'aid_id' in scene '{scene_id}'s action_mapping may not always be available to this scene due to some branching behvaiors. Please check to ensure that all branches will provide the correct aid_ids to the scene.", scene=scene['id'], value=val, scene_id=scene['id'])
                     if len(allowed) == 0:
-                        self.logger.log(LogLevel.ERROR, f"No 'aid_id's are available to scene '{scene['id']}', but its action_mapping uses aid_id (value='{val}').")
-                        self.invalid_values += 1
+                        self.report('aid-id', LogLevel.ERROR, INVALID_VALUES, "No 'aid_id's are available to scene '{scene_id}', but its action_mapping uses aid_id (value='{value}').", scene=scene['id'], scene_id=scene['id'], value=val)
 
 
     def validate_events(self):
@@ -1640,16 +1384,22 @@ class YamlValidator:
         2. 'source' and 'object' must be valid character ids or an EntityTypeEnum
         3. 'when' cannot be 0
         '''
-        data = copy.deepcopy(self.loaded_yaml)
-        entity_type_enum = ['ally', 'adversary', 'civilian', 'commander', 'everybody', 'medic']
+        data = self.loaded_yaml
+        entity_types = self.api_schema.enums['EntityTypeEnum']
+        entity_type_enum = entity_types.enum
         for scene in data['scenes'] + [data]:
             events = scene.get('state', {}).get('events', [])
             is_scenario_state = False
             if 'id' not in scene or scene['id'] == data['id']:
                 is_scenario_state = True
-                chars = self.get_characters_in_scene(data, self.determine_first_scene(data)['id'])
+                chars_scene_id = self.determine_first_scene(data)['id']
             else:
-                chars = self.get_characters_in_scene(data, scene['id'])
+                chars_scene_id = scene['id']
+            chars = self.get_characters_in_scene(data, chars_scene_id)
+            sets = self.scene_states.character_sets(chars_scene_id)
+            scene_id = scene['id'] if not is_scenario_state else None
+            # every character of any group, in the order the groups list them
+            char_list = list(dict.fromkeys(c for group in chars['possible'] for c in group))
             missing = 0
             for event in events:
                 source = event.get('source', None)
@@ -1657,56 +1407,28 @@ class YamlValidator:
                 when = event.get('when', None)
                 scene_name_for_errors =  "the scenario state" if is_scenario_state else f"scene \'{scene['id']}\'"
                 if when == 0:
-                    self.logger.log(LogLevel.ERROR, f"The 'when' parameter for an event in {scene_name_for_errors} cannot be 0.")
-                    self.invalid_values += 1 
+                    self.report('event-when', LogLevel.ERROR, INVALID_VALUES, "The 'when' parameter for an event in {where} cannot be 0.", scene=scene_id, where=scene_name_for_errors)
                 if source is None:
                     missing += 1
-                elif source not in entity_type_enum:
-                    in_any_group = False
-                    in_all_groups = True
-                    char_list = []
-                    for group in chars['possible']:
-                        for c in group:
-                            if c not in char_list:
-                                char_list.append(c)
-                        if source in group:
-                            in_any_group = True
-                        else:
-                            in_all_groups = False
-                    if not in_any_group:
-                        self.logger.log(LogLevel.ERROR, f"The 'source' parameter for an event in {scene_name_for_errors} is '{source}', but must be one of {entity_type_enum + char_list}.")
-                        self.invalid_values += 1 
-                    elif not in_all_groups:
-                        self.logger.log(LogLevel.WARN, f"The 'source' parameter for an event in {scene_name_for_errors} is '{source}', but that character might not be available in some branches.")
-                        self.warning_count += 1     
-                    elif source in chars['removed']:
-                        self.logger.log(LogLevel.WARN, f"The 'source' parameter for an event in {scene_name_for_errors} is '{source}', but that character might be removed in some branches.")
-                        self.warning_count += 1 
-
-                if obj is not None and obj not in entity_type_enum:
-                    in_any_group = False
-                    in_all_groups = True
-                    char_list = []
-                    for group in chars['possible']:
-                        for c in group:
-                            if c not in char_list:
-                                char_list.append(c)
-                        if obj in group:
-                            in_any_group = True
-                        else:
-                            in_all_groups = False
-                    if not in_any_group:
-                        self.logger.log(LogLevel.ERROR, f"The 'object' parameter for an event in {scene_name_for_errors} is '{obj}', but must be one of {entity_type_enum + char_list}.")
-                        self.invalid_values += 1 
-                    elif not in_all_groups:
-                        self.logger.log(LogLevel.WARN, f"The 'object' parameter for an event in {scene_name_for_errors} is '{obj}', but that character might not be available in some branches.")
-                        self.warning_count += 1     
-                    elif obj in chars['removed']:
-                        self.logger.log(LogLevel.WARN, f"The 'object' parameter for an event in {scene_name_for_errors} is '{obj}', but that character might be removed in some branches.")
-                        self.warning_count += 1 
+                elif not entity_types.allows(source):
+                    bit = self.scene_states.character_bit(source)
+                    if not bit & sets.any:
+                        self.report('event-source', LogLevel.ERROR, INVALID_VALUES, "The 'source' parameter for an event in {where} is '{source}', but must be one of {allowed}.", scene=scene_id, where=scene_name_for_errors, source=source, allowed=entity_type_enum + char_list)
+                    elif not bit & sets.all:
+                        self.report('event-source', LogLevel.WARN, WARNINGS, "The 'source' parameter for an event in {where} is '{source}', but that character might not be available in some branches.", scene=scene_id, where=scene_name_for_errors, source=source)
+                    elif bit & sets.removed:
+                        self.report('event-source', LogLevel.WARN, WARNINGS, "The 'source' parameter for an event in {where} is '{source}', but that character might be removed in some branches.", scene=scene_id, where=scene_name_for_errors, source=source)
+
+                if obj is not None and not entity_types.allows(obj):
+                    bit = self.scene_states.character_bit(obj)
+                    if not bit & sets.any:
+                        self.report('event-object', LogLevel.ERROR, INVALID_VALUES, "The 'object' parameter for an event in {where} is '{object}', but must be one of {allowed}.", scene=scene_id, where=scene_name_for_errors, object=obj, allowed=entity_type_enum + char_list)
+                    elif not bit & sets.all:
+                        self.report('event-object', LogLevel.WARN, WARNINGS, "The 'object' parameter for an event in {where} is '{object}', but that character might not be available in some branches.", scene=scene_id, where=scene_name_for_errors, object=obj)
+                    elif bit & sets.removed:
+                        self.report('event-object', LogLevel.WARN, WARNINGS, "The 'object' parameter for an event in {where} is '{object}', but that character might be removed in some branches.", scene=scene_id, where=scene_name_for_errors, object=obj)
             if missing > 0:
-                self.logger.log(LogLevel.WARN, f"The 'source' parameter is recommended for all events, but is missing for {missing} event{'s' if missing > 1 else ''} in {scene_name_for_errors}.")
-                self.warning_count += 1 
+                self.report('event-source', LogLevel.WARN, WARNINGS, "The 'source' parameter is recommended for all events, but is missing for {missing} event{plural} in {where}.", scene=scene_id, missing=missing, plural='s' if missing > 1 else '', where=scene_name_for_errors)
 
 
     def validate_messages(self):
@@ -1714,75 +1436,363 @@ class YamlValidator:
         Validates all messages:
         1. Object must be a valid character id or an EntityTypeEnum
         '''
-        data = copy.deepcopy(self.loaded_yaml)
-        entity_type_enum = ['ally', 'adversary', 'civilian', 'commander', 'everybody', 'medic']
+        data = self.loaded_yaml
+        entity_types = self.api_schema.enums['EntityTypeEnum']
+        entity_type_enum = entity_types.enum
         for scene in data['scenes']:
             for a in scene.get('action_mapping', []):
                 if a['action_type'] != 'MESSAGE':
                     continue
                 chars = self.get_characters_in_scene(data, scene['id'])
+                sets = self.scene_states.character_sets(scene['id'])
                 obj = a.get('parameters', {}).get('object', None)
-                if obj is not None and obj not in entity_type_enum:
-                    in_any_group = False
-                    in_all_groups = True
-                    for group in chars['possible']:
-                        if obj in group:
-                            in_any_group = True
-                        else:
-                            in_all_groups = False
-                    if not in_any_group:
-                        self.logger.log(LogLevel.ERROR, f"The 'object' parameter for the MESSAGE action '{a['action_id']}' in scene '{scene['id']}' is '{obj}', but must be one of {entity_type_enum + chars['possible']}.")
-                        self.invalid_values += 1 
-                    elif not in_all_groups:
-                        self.logger.log(LogLevel.WARN, f"The 'object' parameter for for the MESSAGE action '{a['action_id']}' in scene '{scene['id']}' is '{obj}', but that character might not be available in some branches.")
-                        self.warning_count += 1     
-                    elif obj in chars['removed']:
-                        self.logger.log(LogLevel.WARN, f"The 'object' parameter for for the MESSAGE action '{a['action_id']}' in scene '{scene['id']}' is '{obj}', but that character might be removed in some branches.")
-                        self.warning_count += 1 
-
-
-    def are_all_scenes_reachable(self):
-        data = copy.deepcopy(self.loaded_yaml)
-        for scene in data['scenes']:
-            all_scenes_hit = [branch for branch_set in self.branches for branch in branch_set]
-            if scene['id'] not in all_scenes_hit:
-                self.logger.log(LogLevel.WARN, f"Scene '{scene['id']}' is unreachable.")
-                self.warning_count += 1     
+                if obj is not None and not entity_types.allows(obj):
+                    bit = self.scene_states.character_bit(obj)
+                    if not bit & sets.any:
+                        self.report('message-object', LogLevel.ERROR, INVALID_VALUES, "The 'object' parameter for the MESSAGE action '{action_id}' in scene '{scene_id}' is '{object}', but must be one of {allowed}.", scene=scene['id'], action_id=a['action_id'], scene_id=scene['id'], object=obj, allowed=entity_type_enum + chars['possible'])
+                    elif not bit & sets.all:
+                        self.report('message-object', LogLevel.WARN, WARNINGS, "The 'object' parameter for for the MESSAGE action '{action_id}' in scene '{scene_id}' is '{object}', but that character might not be available in some branches.", scene=scene['id'], action_id=a['action_id'], scene_id=scene['id'], object=obj)
+                    elif bit & sets.removed:
+                        self.report('message-object', LogLevel.WARN, WARNINGS, "The 'object' parameter for for the MESSAGE action '{action_id}' in scene '{scene_id}' is '{object}', but that character might be removed in some branches.", scene=scene['id'], action_id=a['action_id'], scene_id=scene['id'], object=obj)
+
+
+    def are_all_scenes_reachable(self, scenes=None):
+        '''
+        Warns about scenes no walk from the first scene reaches. Only the scenes at the
+        given indices are checked, if any are given.
+        '''
+        reachable = self.scene_graph.reachable()
+        for ind, scene in enumerate(self.loaded_yaml['scenes']):
+            if scenes is not None and ind not in scenes:
+                continue
+            if scene['id'] not in reachable:
+                self.report('unreachable-scene', LogLevel.WARN, WARNINGS, "Scene '{scene_id}' is unreachable.", scene=scene['id'], scene_id=scene['id'])
+
+
+class StreamingValidator(YamlValidator):
+    '''
+    Validates a scenario file while reading it, for scenarios too large to load whole. Each
+    scene is checked against the schema as soon as it is read; only the parts of it that the
+    dependency checks read are kept (see streaming.py). The findings are the same as those of
+    YamlValidator, but the schema findings of the scenes come first, as the scenes are read.
+    A finding about a part of a scene that was not kept points at the nearest part that was.
+    '''
+    schema_checked = False
+    reading = False
+
+    def read_scenario(self, file):
+        '''
+        Reads the scenario scene by scene, checking each scene and then the top level against
+        the schema. Returns the scenario with only the projection of each scene.
+        '''
+        self.schema_checked = False
+        self.reading = True
+        scenario_node = self.api_schema.schema('Scenario')
+        scenes_node = scenario_node.properties.get('scenes') if scenario_node.properties is not None else None
+        # scenes are only read one by one if the schema checks them one by one
+        streamable = scenes_node is not None and scenes_node.type == 'array' and scenes_node.items.ref is not None
+        reader = ScenarioReader(file, UniqueKeyLoader, scene_projection(self.dep_json), key='scenes' if streamable else None)
+        scenes = reader.read()
+        try:
+            while True:
+                try:
+                    index, scene = next(scenes)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    raise loading_error(e) from e
+                # findings locate their scene through the projections read so far
+                self.loaded_yaml = reader.document
+                self.source = reader.source
+                self.validate_object(scene, scenes_node.items.target, 'scenes', 'top', scenes_node.items.ref, location=('scenes', index))
+            self.source = reader.source
+            if reader.streamed:
+                # every scene is checked; check the rest of the top level
+                self.loaded_yaml = reader.document
+                self.validate_one_level('top', {k: ([] if k == 'scenes' else v) for k, v in reader.document.items()}, scenario_node, location=())
+                self.schema_checked = True
+        except ErrorLimitReached:
+            # stopped is set; the rest of the scenario is not read
+            pass
+        finally:
+            self.reading = False
+            scenes.close()
+        return reader.document
+
+
+    def record(self, diagnostic):
+        if self.reading:
+            # place the finding now, while the whole scene it is about is still there
+            diagnostic.position
+        super().record(diagnostic)
+
+
+    def validate_field_names(self):
+        '''
+        Ensures all fields are supported by the API, unless that was done while reading the scenario
+        '''
+        if not self.schema_checked:
+            super().validate_field_names()
+
+
+def validate(scenario, train_mode=False, name='<scenario>', max_errors=None, jobs=None):
+    '''
+    Validates a scenario given as yaml text or as an already loaded mapping, without reading
+    or printing it. name identifies the scenario in diagnostics. If max_errors is given,
+    validation stops after that many errors. If jobs is more than 1, the dependency checks
+    run concurrently over that many processes. Returns a ValidationResult.
+    Raises ValidationError if the scenario can't be validated at all (it is not valid yaml,
+    has duplicate keys, or the api files are missing).
+    '''
+    source = None
+    if isinstance(scenario, (str, bytes)):
+        scenario, source = parse_scenario(scenario)
+    if not isinstance(scenario, dict):
+        raise ValidationError("A scenario must be a mapping of keys to values, but is " + str(type(scenario)) + ".")
+    sink = CollectingSink()
+    validator = YamlValidator(name, train_mode, sink, document=scenario, max_errors=max_errors, source=source)
+    try:
+        if not validator.stopped:
+            validator.validate_field_names()
+            validator.validate_dependencies(jobs)
+    except ErrorLimitReached:
+        pass
+    return ValidationResult(validator.counts(), sink.diagnostics, validator.stopped)
+
+
+OUTPUT_FORMATS = ['console', 'ndjson', 'json']
+
+
+def make_sink(output_format, stream=None):
+    '''
+    Returns the sink for an output format: colored console text, one JSON object per
+    finding (ndjson) or one JSON document per file (json)
+    '''
+    stream = stream if stream is not None else sys.stdout
+    if output_format == 'ndjson':
+        return NdjsonSink(stream)
+    if output_format == 'json':
+        return JsonSummarySink(stream)
+    return ConsoleSink(YamlValidator.logger)
+
+
+def validate_file(file, train_mode=False, sink=None, profile=False, max_errors=None, jobs=None, stream=False):
+    '''
+    Validates one scenario file, reporting its findings and then a summary to sink
+    (the console by default). Returns True if the file is valid. If profile is set,
+    what each check cost is printed (to stderr) after the summary. If max_errors is
+    given, the checks that remain once that many errors are found are skipped. If jobs
+    is more than 1, the dependency checks run concurrently over that many processes.
+    If stream is set, the file is read and checked one scene at a time (StreamingValidator).
+    '''
+    try:
+        validator = (StreamingValidator if stream else YamlValidator)(file, train_mode, sink, max_errors=max_errors)
+        if profile:
+            rows = Profiler(validator).run()
+        elif not validator.stopped:
+            # validate the field names in the yaml
+            validator.validate_field_names()
+            # validate additional depdencies between fields
+            validator.validate_dependencies(jobs)
+    except ErrorLimitReached:
+        # the remaining checks are skipped; the summary says so
+        pass
+    except ValidationError as e:
+        if sink is not None and not isinstance(sink, ConsoleSink):
+            # machine-readable output gets a fatal diagnostic and a summary instead of console text
+            report_failure(sink, file, 'fatal', str(e))
+            return False
+        YamlValidator.logger.log(LogLevel.FATAL, str(e))
+    # report the answer for validity
+    counts = validator.counts()
+    validator.sink.summary(file, counts, stopped=validator.stopped)
+    if profile:
+        print_profile(rows)
+    return sum(counts[c] for c in ERROR_CATEGORIES) == 0
+
+
+def find_scenario_files(paths):
+    '''
+    Expands the given files, glob patterns and directories (searched recursively for .yaml files)
+    into a sorted list of files without duplicates
+    '''
+    files = []
+    for path in paths:
+        matches = sorted(glob.glob(path, recursive=True)) if glob.has_magic(path) else [path]
+        for match in matches:
+            if os.path.isdir(match):
+                files += sorted(glob.glob(os.path.join(match, '**', '*.yaml'), recursive=True))
+            else:
+                files.append(match)
+    return list(dict.fromkeys(files))
+
+
+def fatal_message(text):
+    '''
+    Returns the message of a fatal error from the text printed for it, without the
+    color codes and the logger's prefix
+    '''
+    text = re.sub(r'\033\[[0-9;]*m', '', text).strip()
+    return re.sub(r'^Fatal Error \([^)]*\):\s*', '', text, flags=re.MULTILINE)
+
+
+def report_failure(sink, file, rule, message):
+    '''
+    Reports a file whose validation stopped early (on a fatal error or a crash)
+    as one diagnostic and a summary that is never valid
+    '''
+    sink.emit(Diagnostic(rule, LogLevel.FATAL, None, '{message}', {'message': message}, file=file))
+    sink.summary(file, dict.fromkeys(ERROR_CATEGORIES + [WARNINGS], 0), fatal=True)
+
+
+def validate_file_collected(file, train_mode=False, max_errors=None, stream=False):
+    '''
+    Validates one scenario file without printing anything, for watch mode.
+    Returns a CollectingSink with the file's findings and summary.
+    '''
+    sink = CollectingSink()
+    text = io.StringIO()
+    with contextlib.redirect_stdout(text):
+        try:
+            validate_file(file, train_mode, sink, max_errors=max_errors, stream=stream)
+        except SystemExit:
+            # a half-saved file must not end the watch
+            report_failure(sink, file, 'fatal', fatal_message(text.getvalue()))
+        except Exception:
+            report_failure(sink, file, 'crash', traceback.format_exc())
+    for diagnostic in sink.diagnostics:
+        # look up the positions now, so the findings kept between runs don't keep the parsed file
+        diagnostic.position
+    return sink
+
+
+def validate_file_captured(file, train_mode=False, output_format='console', max_errors=None, stream=False):
+    '''
+    Validates one scenario file in a batch. The file's output is captured rather than printed,
+    so that it can be printed in order no matter which worker finishes first.
+    Returns (output, is_valid).
+    '''
+    text = io.StringIO()
+    # machine-readable output is kept apart from any text printed along the way
+    records = io.StringIO() if output_format != 'console' else text
+    sink = make_sink(output_format, records)
+    with contextlib.redirect_stdout(text):
+        try:
+            is_valid = validate_file(file, train_mode, sink, max_errors=max_errors, stream=stream)
+        except SystemExit:
+            # a fatal error ends this file only, not the whole batch
+            is_valid = False
+            if records is not text:
+                report_failure(sink, file, 'fatal', fatal_message(text.getvalue()))
+        except Exception:
+            if records is not text:
+                report_failure(sink, file, 'crash', traceback.format_exc())
+            else:
+                YamlValidator.logger.log(LogLevel.ERROR, "Could not validate '" + file + "':\n" + traceback.format_exc())
+            is_valid = False
+    return records.getvalue(), is_valid
+
+
+def validate_files(files, train_mode=False, jobs=None, output_format='console', max_errors=None, stream=False):
+    '''
+    Validates many scenario files over a pool of worker processes, printing each file's
+    findings (in the order given) and then a summary. Returns the list of invalid files.
+    '''
+    # load the api files once; forked workers share them instead of loading them again
+    try:
+        YamlValidator.load_api_files()
+    except ValidationError as e:
+        if output_format == 'console':
+            YamlValidator.logger.log(LogLevel.FATAL, str(e))
+        # no file can be validated; each gets a fatal diagnostic and a summary, then the batch summary
+        sink = make_sink(output_format)
+        for file in files:
+            report_failure(sink, file, 'fatal', str(e))
+        print(json.dumps({'type': 'batch-summary', 'files': len(files), 'valid': 0, 'invalid': files}), flush=True)
+        return list(files)
+    jobs = jobs if jobs is not None else (os.cpu_count() or 1)
+    invalid = []
+    if jobs <= 1:
+        results = (validate_file_captured(f, train_mode, output_format, max_errors, stream) for f in files)
+        pool = None
+    else:
+        start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+        pool = multiprocessing.get_context(start_method).Pool(min(jobs, len(files)))
+        # imap yields results in submission order, regardless of completion order
+        results = pool.imap(functools.partial(validate_file_captured, train_mode=train_mode, output_format=output_format, max_errors=max_errors, stream=stream), files)
+    try:
+        for file, (output, is_valid) in zip(files, results):
+            if output_format == 'console':
+                print("\033[1m==> " + file + " <==\033[0m", flush=True)
+                print(output, end='', flush=True)
+                print("", flush=True)
+            else:
+                print(output, end='', flush=True)
+            if not is_valid:
+                invalid.append(file)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if output_format != 'console':
+        print(json.dumps({'type': 'batch-summary', 'files': len(files), 'valid': len(files) - len(invalid), 'invalid': invalid}), flush=True)
+        return invalid
+    print("\033[1mBatch Summary\033[0m")
+    for file in files:
+        print(("\033[91m  not valid: " if file in invalid else "\033[92m  valid:     ") + file + "\033[0m")
+    YamlValidator.logger.log(LogLevel.CRITICAL_INFO, ("\033[92m" if len(invalid) == 0 else "\033[91m") + str(len(files) - len(invalid)) + " of " + str(len(files)) + " files are valid.")
+    return invalid
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='ITM - YAML Validator')
 
-    parser.add_argument('-f', '--filepath', dest='path', type=str, help='The path to the yaml file. Required if -u is not specified.')
+    parser.add_argument('-f', '--filepath', dest='path', type=str, nargs='+', help='The path to the yaml file. Several files, glob patterns and directories may be given to validate them all. Required if -u is not specified.')
     parser.add_argument('-u', '--update', dest='update', action='store_true', help='Switch to update the api files or not. Required if -f is not specified.')
     parser.add_argument('-t', '--train', dest='train', action='store_true', help="Validate a training scenario yaml")
+    parser.add_argument('--format', dest='format', choices=OUTPUT_FORMATS, default='console', help="How findings are written: colored text (console), one JSON object per finding as it is found (ndjson), or one JSON document per file (json).")
+    parser.add_argument('-w', '--watch', dest='watch', action='store_true', help="Keep running and revalidate the files whenever they are saved, printing the findings that appeared or were resolved.")
+    parser.add_argument('--interval', dest='interval', type=float, default=0.5, help="Seconds between checks for changed files in watch mode. Defaults to 0.5.")
+    parser.add_argument('--profile', dest='profile', action='store_true', help="Print the time, scene and character lookups, deep copies and peak memory of each check (to stderr). Only one file can be profiled at a time.")
+    parser.add_argument('--fail-fast', dest='fail_fast', action='store_true', help="Stop validating a file at its first error, skipping the checks that remain.")
+    parser.add_argument('--max-errors', dest='max_errors', type=int, default=None, help="Stop validating a file once N errors are found, skipping the checks that remain. The summary says when the limit was hit.")
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=None, help="Number of worker processes used when validating several files (defaults to the number of CPUs), or to run the dependency checks of a single file concurrently (defaults to 1).")
+    parser.add_argument('--stream', dest='stream', action='store_true', help="Read and check each file one scene at a time, keeping only what the dependency checks need, so that very large scenarios fit in memory. Findings are the same, but the schema findings of the scenes come first.")
     args = parser.parse_args()
+    max_errors = 1 if args.fail_fast else args.max_errors
+    if max_errors is not None and max_errors < 1:
+        parser.error("--max-errors must be at least 1")
+    if args.profile and max_errors is not None:
+        parser.error("--profile can't be combined with --fail-fast or --max-errors")
+    if args.profile and args.stream:
+        parser.error("--profile can't be combined with --stream")
     if args.update:
-        generator = ApiGenerator()
-        generator.generate_new_api()
-        generator.generate_state_change_api()
+        ApiGenerator().update()
     if args.update and not args.path:
         exit(0)
-    file = args.path
-    validator = YamlValidator(file, args.train)
-    # validate the field names in the yaml
-    validator.validate_field_names()
-    # validate additional depdencies between fields
-    validator.validate_dependencies()
-    # print the answer for validity
-    print("")
-
-    validator.logger.log(LogLevel.CRITICAL_INFO, ("\033[92m" if validator.missing_keys == 0 else "\033[91m") + "Missing Required Keys: " + str(validator.missing_keys))
-    validator.logger.log(LogLevel.CRITICAL_INFO, ("\033[92m" if validator.wrong_types == 0 else "\033[91m") + "Incorrect Data Type: " + str(validator.wrong_types))
-    validator.logger.log(LogLevel.CRITICAL_INFO, ("\033[92m" if validator.invalid_keys == 0 else "\033[91m") + "Invalid Keys: " + str(validator.invalid_keys))
-    validator.logger.log(LogLevel.CRITICAL_INFO, ("\033[92m" if validator.invalid_values == 0 else "\033[91m") + "Invalid Values (mismatched enum or dependency): " + str(validator.invalid_values))
-    validator.logger.log(LogLevel.CRITICAL_INFO, ("\033[92m" if validator.out_of_range == 0 else "\033[91m") + "Invalid Values (out of range): " + str(validator.out_of_range))
-    validator.logger.log(LogLevel.CRITICAL_INFO, ("\033[92m" if validator.empty_levels == 0 else "\033[91m") + "Properties Missing Data (empty level): " + str(validator.empty_levels))
-    total_errors = validator.missing_keys + validator.wrong_types + validator.invalid_keys + validator.invalid_values + validator.empty_levels + validator.out_of_range
-    print()
-    validator.logger.log(LogLevel.CRITICAL_INFO, ("\033[92m" if total_errors == 0 else "\033[91m") + "Total Errors: " + str(total_errors))
-    validator.logger.log(LogLevel.CRITICAL_INFO, ("\033[92m" if validator.warning_count == 0 else "\033[35m") + "Warnings: " + str(validator.warning_count))
-    if total_errors == 0:
-        validator.logger.log(LogLevel.CRITICAL_INFO, "\033[92m" + file + " is valid!")
+    if args.watch:
+        if not args.path:
+            parser.error("--watch requires -f")
+        if args.format != 'console':
+            parser.error("--watch only supports the console format")
+        # the api files are loaded once and stay loaded while watching
+        try:
+            YamlValidator.load_api_files()
+        except ValidationError as e:
+            YamlValidator.logger.log(LogLevel.FATAL, str(e))
+        Watcher(lambda: find_scenario_files(args.path), lambda f: validate_file_collected(f, args.train, max_errors, args.stream)).run(args.interval)
+        exit(0)
+    single_file = not args.path or (len(args.path) == 1 and not glob.has_magic(args.path[0]) and not os.path.isdir(args.path[0]))
+    if args.profile and (args.watch or not single_file):
+        parser.error("--profile only profiles a single file")
+    if single_file:
+        # a single file is validated directly; the exit code is the same as for a batch of one
+        is_valid = validate_file(args.path[0] if args.path else None, args.train, make_sink(args.format), args.profile, max_errors, args.jobs, args.stream)
+        exit(0 if is_valid else 1)
     else:
-        validator.logger.log(LogLevel.CRITICAL_INFO, "\033[91m" + file + " is not valid.")
+        files = find_scenario_files(args.path)
+        if len(files) == 0:
+            YamlValidator.logger.log(LogLevel.FATAL, "No yaml files found in " + str(args.path) + ".")
+        invalid = validate_files(files, args.train, args.jobs, args.format, max_errors, args.stream)
+        exit(1 if len(invalid) > 0 else 0)
@@ -0,0 +1,137 @@
+'''
+Watch mode: revalidates scenario files as they are saved.
+
+The api schemas and dependency rules stay loaded for the whole session, so saving a file
+only costs validating that file. Files are polled for a new modification time or size
+(no platform file-event API is needed), and for each changed file only the findings that
+appeared or were resolved since its previous run are printed.
+'''
+
+import os, time
+from collections import Counter
+from logger import LogLevel, Logger
+from diagnostics import ERROR_CATEGORIES, WARNINGS
+
+# color of a finding by its severity, matching the Logger prefixes
+SEVERITY_COLORS = {LogLevel.WARN: "\033[35m", LogLevel.ERROR: "\033[93m", LogLevel.FATAL: "\033[91m"}
+SEVERITY_NAMES = {LogLevel.WARN: "Possible Error", LogLevel.ERROR: "Error", LogLevel.FATAL: "Fatal Error"}
+
+
+def stamp(file):
+    '''
+    Returns what identifies a version of a file (modification time and size), or None if it is gone
+    '''
+    try:
+        stat = os.stat(file)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def finding_key(diagnostic):
+    return (diagnostic.rule, diagnostic.scene, diagnostic.path, diagnostic.message)
+
+
+def diff_findings(old, new):
+    '''
+    Returns (appeared, resolved): the findings of new that were not in old, and those of old
+    that are not in new. A finding reported several times counts each time.
+    '''
+    return _subtract(new, old), _subtract(old, new)
+
+
+def _subtract(findings, others):
+    # the findings left once each of others has cancelled out one equal finding
+    remaining = Counter(finding_key(d) for d in others)
+    left = []
+    for d in findings:
+        key = finding_key(d)
+        if remaining[key] > 0:
+            remaining[key] -= 1
+        else:
+            left.append(d)
+    return left
+
+
+class Watcher:
+    '''
+    Revalidates the files found by find_files whenever they change. validate(file) returns
+    a CollectingSink holding the file's findings and summary.
+    '''
+    logger = Logger("watcher")
+    find_files = None
+    validate = None
+    stamps = None
+    findings = None
+
+    def __init__(self, find_files, validate):
+        self.find_files = find_files
+        self.validate = validate
+        self.stamps = {}
+        self.findings = {}
+
+
+    def run(self, interval=0.5):
+        '''
+        Validates every file, then polls for changes until interrupted
+        '''
+        self.logger.log(LogLevel.CRITICAL_INFO, "Watching " + str(len(self.find_files())) + " files for changes. Press Ctrl+C to stop.")
+        print("")
+        try:
+            while True:
+                self.poll()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("")
+
+
+    def poll(self):
+        '''
+        Revalidates files that are new or changed since the last poll and forgets removed ones.
+        Returns the files being watched.
+        '''
+        files = self.find_files()
+        for file in list(self.stamps):
+            if file not in files or stamp(file) is None:
+                del self.stamps[file]
+                self.findings.pop(file, None)
+                print("\033[1m==> " + file + " <==\033[0m removed", flush=True)
+        for file in files:
+            current = stamp(file)
+            if current is None or current == self.stamps.get(file):
+                continue
+            self.stamps[file] = current
+            start = time.perf_counter()
+            result = self.validate(file)
+            self.report(file, result, time.perf_counter() - start)
+        return files
+
+
+    def report(self, file, result, elapsed):
+        '''
+        Prints the findings of a file that appeared or were resolved since its previous run
+        '''
+        if result.fatal:
+            # the file could not be checked (often it is only half saved); keep comparing
+            # against its last complete run instead of calling every finding resolved
+            print("\033[1m==> " + file + " <==\033[0m \033[91mnot valid (stopped early)\033[0m (" + format(elapsed, '.2f') + "s)")
+            for d in result.diagnostics:
+                print(SEVERITY_COLORS[d.severity] + "  " + SEVERITY_NAMES[d.severity] + ": " + d.message + "\033[0m")
+            print("", flush=True)
+            return
+        first_run = file not in self.findings
+        appeared, resolved = diff_findings(self.findings.get(file, []), result.diagnostics)
+        self.findings[file] = result.diagnostics
+        errors = sum(result.counts[c] for c in ERROR_CATEGORIES)
+        status = ("\033[92mvalid" if errors == 0 else "\033[91mnot valid") + ", " + str(errors) + " errors, " + str(result.counts[WARNINGS]) + " warnings"
+        if result.stopped:
+            status += " (stopped at the error limit)"
+        print("\033[1m==> " + file + " <==\033[0m " + status + "\033[0m (" + format(elapsed, '.2f') + "s)", flush=True)
+        for d in resolved:
+            print("\033[92m  - " + SEVERITY_NAMES[d.severity] + ": " + d.message + "\033[0m")
+        for d in appeared:
+            where = d.where()
+            print(SEVERITY_COLORS[d.severity] + "  + " + SEVERITY_NAMES[d.severity] + ": " + d.message + (" (" + where + ")" if where is not None else "") + "\033[0m")
+        if not first_run and not appeared and not resolved:
+            print("  no change in findings")
+        print("", flush=True)